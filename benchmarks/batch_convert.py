@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+"""
+Capture conversion benchmark.
+
+Converts decoded Stratux Messages to CoT Events with `stratux_to_cot()` in a loop
+(with & without the identity cache) and with `stratux_to_cot_batch()`, and
+reports messages converted per second.
+
+Usage: PYTHONPATH=. python benchmarks/batch_convert.py [messages] [batch size]
+"""
+
+import random
+import sys
+import time
+
+import stratuxcot.classes
+import stratuxcot.functions
+
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+CRAFT = 300
+
+SAMPLE = {
+    "Icao_addr": 10698088,
+    "Reg": "N308DU",
+    "Tail": "DAL1352",
+    "Emitter_category": 3,
+    "OnGround": False,
+    "TargetType": 1,
+    "Squawk": 3105,
+    "Position_valid": True,
+    "Lat": 37.46306,
+    "Lng": -122.264626,
+    "Alt": 7325,
+    "NACp": 10,
+    "Track": 135.0,
+    "Speed": 262,
+    "Age": 0.5,
+}
+
+
+def make_crafts(messages: int) -> list:
+    """Generates decoded Stratux Messages of `CRAFT` craft."""
+    rand = random.Random(1)
+    return [
+        dict(
+            SAMPLE,
+            Icao_addr=SAMPLE["Icao_addr"] + i % CRAFT,
+            Lat=SAMPLE["Lat"] + rand.random() / 10,
+            Lng=SAMPLE["Lng"] + rand.random() / 10,
+            Track=float(rand.randrange(360)),
+        )
+        for i in range(messages)
+    ]
+
+
+def bench_loop(crafts: list, identity_cache_size: int) -> float:
+    """Returns messages/sec converted by `stratux_to_cot()` in a loop."""
+    identity_cache = (
+        stratuxcot.classes.IdentityCache(identity_cache_size)
+        if identity_cache_size
+        else None
+    )
+    stratux_to_cot = stratuxcot.functions.stratux_to_cot
+    start = time.perf_counter()
+    for craft in crafts:
+        stratux_to_cot(craft, None, None, identity_cache)
+    return len(crafts) / (time.perf_counter() - start)
+
+
+def bench_batch(crafts: list, batch_size: int) -> float:
+    """Returns messages/sec converted by `stratux_to_cot_batch()`."""
+    times = [1_640_995_200 + i / 100 for i in range(len(crafts))]
+    start = time.perf_counter()
+    for offset in range(0, len(crafts), batch_size):
+        stratuxcot.functions.stratux_to_cot_batch(
+            crafts[offset : offset + batch_size],
+            times=times[offset : offset + batch_size],
+        )
+    return len(crafts) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Runs the benchmark."""
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    crafts = make_crafts(messages)
+    baseline = bench_loop(crafts, 0)
+    print(f"{'conversion':>24} {'msg/s':>10} {'vs loop':>8}")
+    for name, rate in (
+        ("stratux_to_cot", baseline),
+        ("stratux_to_cot + cache", bench_loop(crafts, 4096)),
+        (f"batch of {batch_size}", bench_batch(crafts, batch_size)),
+    ):
+        print(f"{name:>24} {rate:>10.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
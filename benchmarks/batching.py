@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+"""
+CoT Event batching benchmark.
+
+Feeds a dense traffic picture through `StratuxWorker.handle_data()` while a TX
+task drains the queue onto a socket, one `send()` per queue item, and reports
+events/sec with and without COT_BATCH_WINDOW.
+
+Usage: python benchmarks/batching.py
+"""
+
+import asyncio
+import socket
+import threading
+import time
+
+from configparser import ConfigParser
+
+import stratuxcot.classes
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+EVENTS = 50_000
+AIRCRAFT = 500
+
+
+def make_messages() -> list:
+    """Generates `EVENTS` Stratux Messages from `AIRCRAFT` craft."""
+    return [
+        {
+            "Icao_addr": 10698088 + (i % AIRCRAFT),
+            "Tail": f"DAL{i % AIRCRAFT}",
+            "Emitter_category": 3,
+            "TargetType": 1,
+            "Lat": 37.46306 + i / 1e6,
+            "Lng": -122.264626,
+            "Alt": 7325,
+            "NACp": 10,
+            "Track": 135,
+            "Speed": 262,
+        }
+        for i in range(EVENTS)
+    ]
+
+
+def drain(sock: socket.socket) -> None:
+    """Reads & discards everything written to the other end of `sock`."""
+    while sock.recv(1 << 16):
+        pass
+
+
+async def bench(messages: list, **options) -> float:
+    """Returns CoT Events/sec through handle_data() & the TX socket."""
+    config = ConfigParser()
+    config.add_section("stratuxcot")
+    for key, value in options.items():
+        config.set("stratuxcot", key, value)
+
+    worker = stratuxcot.classes.StratuxWorker(asyncio.Queue(), config["stratuxcot"])
+    tx_sock, rx_sock = socket.socketpair()
+    reader = threading.Thread(target=drain, args=(rx_sock,), daemon=True)
+    reader.start()
+
+    sent = 0
+
+    async def transmit():
+        nonlocal sent
+        while 1:
+            data = await worker.queue.get()
+            tx_sock.sendall(data)
+            sent += data.count(b"<event ")
+
+    tx_task = asyncio.ensure_future(transmit())
+    start = time.perf_counter()
+    for message in messages:
+        await worker.handle_data(message)
+    await worker.flush_batch()
+    while sent < len(messages):
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+
+    tx_task.cancel()
+    tx_sock.close()
+    return len(messages) / elapsed
+
+
+async def main() -> None:
+    """Runs the benchmark with and without batching."""
+    messages = make_messages()
+    unbatched = await bench(messages)
+    print(f"{'unbatched':>24}: {unbatched:>9.0f} events/s")
+    for batch_size in ("10", "50", "200"):
+        batched = await bench(
+            messages, COT_BATCH_WINDOW="0.1", COT_BATCH_SIZE=batch_size
+        )
+        print(
+            f"{'batched, size ' + batch_size:>24}: {batched:>9.0f} events/s "
+            f"({batched / unbatched:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+"""
+CoT Event encoding benchmark.
+
+Converts traffic reports to CoT Events in each COT_FORMAT, with the identity
+cache, and reports the mean event size and conversions per second.
+
+Usage: python benchmarks/cot_format.py
+"""
+
+import random
+import time
+
+import stratuxcot.classes
+import stratuxcot.constants
+import stratuxcot.functions
+
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+MESSAGES = 20_000
+CRAFT = 300
+
+SAMPLE = {
+    "Icao_addr": 10698088,
+    "Reg": "N308DU",
+    "Tail": "DAL1352",
+    "Emitter_category": 3,
+    "OnGround": False,
+    "TargetType": 1,
+    "Squawk": 3105,
+    "Position_valid": True,
+    "Lat": 37.46306,
+    "Lng": -122.264626,
+    "Alt": 7325,
+    "NACp": 10,
+    "Track": 135,
+    "Speed": 262,
+    "Speed_valid": True,
+    "Age": 0.5,
+}
+
+
+def make_crafts() -> list:
+    """Generates traffic reports for `CRAFT` craft."""
+    rand = random.Random(1)
+    return [
+        stratuxcot.classes.TrafficRecord.from_dict(
+            dict(
+                SAMPLE,
+                Icao_addr=SAMPLE["Icao_addr"] + i % CRAFT,
+                Lat=SAMPLE["Lat"] + rand.random() / 10,
+                Lng=SAMPLE["Lng"] + rand.random() / 10,
+                Track=rand.randrange(360),
+            )
+        )
+        for i in range(MESSAGES)
+    ]
+
+
+def bench(crafts: list, cot_format: str) -> tuple:
+    """Returns the mean event size & events/sec in `cot_format`."""
+    config = {"COT_FORMAT": cot_format}
+    identity_cache = stratuxcot.classes.IdentityCache(4096)
+    stratux_to_cot = stratuxcot.functions.stratux_to_cot
+    size = 0
+    start = time.perf_counter()
+    for craft in crafts:
+        size += len(stratux_to_cot(craft, config, None, identity_cache))
+    elapsed = time.perf_counter() - start
+    return size / len(crafts), len(crafts) / elapsed
+
+
+def main() -> None:
+    """Runs the benchmark for each COT_FORMAT."""
+    crafts = make_crafts()
+    bench(crafts[:1000], "xml")  # Warm up.
+    results = {
+        cot_format: bench(crafts, cot_format)
+        for cot_format in stratuxcot.constants.COT_FORMATS
+    }
+    baseline_size, baseline_rate = results["xml"]
+    print(f"{'format':>16} {'bytes':>7} {'vs xml':>7} {'events/s':>9} {'vs xml':>7}")
+    for cot_format, (size, rate) in results.items():
+        print(
+            f"{cot_format:>16} {size:>7.0f} {size / baseline_size:>6.2f}x "
+            f"{rate:>9.0f} {rate / baseline_rate:>6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
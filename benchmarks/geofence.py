@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+"""
+Geofence lookup benchmark.
+
+Compares point lookups against a geofence of many polygons & circles, testing
+every shape in turn, against the grid index of `stratuxcot.classes.Geofence`.
+
+Usage: python benchmarks/geofence.py
+"""
+
+import math
+import random
+import time
+
+import stratuxcot.classes
+
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+SIZES = [10, 100, 1_000]
+
+
+def make_shapes(size: int, rand: random.Random) -> tuple:
+    """Generates `size` 24-sided polygons and `size` circles over the CONUS."""
+    polygons: list = []
+    circles: list = []
+    for _ in range(size):
+        lat, lon = rand.uniform(25, 49), rand.uniform(-125, -67)
+        radius = rand.uniform(0.05, 0.5)
+        polygons.append(
+            [
+                [
+                    (
+                        lon + radius * math.cos(i / 12 * 3.14159),
+                        lat + radius * math.sin(i / 12 * 3.14159),
+                    )
+                    for i in range(24)
+                ]
+            ]
+        )
+        circles.append(
+            (rand.uniform(25, 49), rand.uniform(-125, -67), rand.uniform(2e3, 5e4))
+        )
+    return polygons, circles
+
+
+def linear_contains(geofence, lat: float, lon: float) -> bool:
+    """Tests the point against every shape of `geofence`, without the grid."""
+    for kind, _, geometry in geofence.polygons + geofence.circles:
+        if kind == "circle":
+            if stratuxcot.classes._in_circle(lat, lon, *geometry):
+                return True
+        elif stratuxcot.classes._in_polygon(lon, lat, geometry):
+            return True
+    return False
+
+
+def bench(func, points: list, budget: float = 1.0) -> float:
+    """Returns lookups per second for `func` over `points`."""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < budget:
+        for lat, lon in points:
+            func(lat, lon)
+        count += len(points)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Runs the benchmark for each number of shapes."""
+    rand = random.Random(1)
+    points = [(rand.uniform(25, 49), rand.uniform(-125, -67)) for _ in range(1_000)]
+    print(f"{'shapes':>8} {'linear pt/s':>14} {'grid pt/s':>14} {'speedup':>9}")
+    for size in SIZES:
+        polygons, circles = make_shapes(size, rand)
+        start = time.perf_counter()
+        geofence = stratuxcot.classes.Geofence(polygons, circles)
+        build = time.perf_counter() - start
+
+        linear = bench(lambda lat, lon: linear_contains(geofence, lat, lon), points)
+        grid = bench(geofence.contains, points)
+        print(
+            f"{size * 2:>8} {linear:>14.0f} {grid:>14.0f} {grid / linear:>8.0f}x"
+            f"  (index built in {build * 1000:.0f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+"""
+Stratux Message JSON decoding benchmark.
+
+Decodes Stratux /traffic messages with each installed JSON_DECODER, with and
+without the `is_wanted_message()` pre-check. Messages are read from a capture
+written by RECORD_FILE if given, otherwise generated in Stratux's own format,
+with a share of Mode S messages without a valid position.
+
+Usage: python benchmarks/json_decode.py [capture.jsonl[.gz]]
+"""
+
+import json
+import random
+import sys
+import time
+
+import stratuxcot.constants
+import stratuxcot.functions
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+MESSAGES = 20_000
+NO_POSITION_SHARE = 0.3
+
+SAMPLE = {
+    "Icao_addr": 10698088,
+    "Reg": "N308DU",
+    "Tail": "DAL1352",
+    "Emitter_category": 3,
+    "OnGround": False,
+    "Addr_type": 0,
+    "TargetType": 1,
+    "SignalLevel": -35.5129368009492,
+    "Squawk": 3105,
+    "Position_valid": True,
+    "Lat": 37.46306,
+    "Lng": -122.264626,
+    "Alt": 7325,
+    "GnssDiffFromBaroAlt": 25,
+    "AltIsGNSS": False,
+    "NIC": 8,
+    "NACp": 10,
+    "Track": 135,
+    "Speed": 262,
+    "Speed_valid": True,
+    "Vvel": -1600,
+    "Timestamp": "2021-05-19T23:13:18.484Z",
+    "PriorityStatus": 0,
+    "Age": 29.85,
+    "AgeLastAlt": 29.83,
+    "Last_seen": "0001-01-01T16:43:24.75Z",
+    "Last_alt": "0001-01-01T16:43:24.77Z",
+    "Last_GnssDiff": "0001-01-01T16:43:24.54Z",
+    "Last_GnssDiffAlt": 7700,
+    "Last_speed": "0001-01-01T16:43:24.54Z",
+    "Last_source": 1,
+    "ExtrapolatedPosition": False,
+    "BearingDist_valid": True,
+    "Bearing": 148.05441175901748,
+    "Distance": 38889.68863349082,
+    "LastSent": "0001-01-01T16:43:22.85Z",
+}
+
+
+def make_messages() -> list:
+    """Generates raw Stratux Messages, formatted like Stratux (Go) does."""
+    rand = random.Random(1)
+    messages = []
+    for i in range(MESSAGES):
+        craft = dict(
+            SAMPLE,
+            Icao_addr=SAMPLE["Icao_addr"] + i % 300,
+            Lat=SAMPLE["Lat"] + rand.random() / 10,
+            Position_valid=rand.random() > NO_POSITION_SHARE,
+        )
+        messages.append(json.dumps(craft, separators=(",", ":")))
+    return messages
+
+
+def read_messages(capture: str) -> list:
+    """Reads raw Stratux Messages from a capture, see `read_capture()`."""
+    return [message for _, message in stratuxcot.functions.read_capture(capture)]
+
+
+def bench(decode, messages: list, precheck: bool) -> float:
+    """Returns messages/sec decoded by `decode`."""
+    is_wanted_message = stratuxcot.functions.is_wanted_message
+    start = time.perf_counter()
+    for message in messages:
+        if precheck and not is_wanted_message(message):
+            continue
+        decode(message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Runs the benchmark for each installed decoder."""
+    messages = read_messages(sys.argv[1]) if len(sys.argv) > 1 else make_messages()
+    baseline = bench(json.loads, messages, False)
+    print(f"{'decoder':>10} {'pre-check':>10} {'msg/s':>10} {'vs json':>8}")
+    for name in stratuxcot.constants.JSON_DECODERS:
+        try:
+            decode = stratuxcot.functions.get_json_decoder(name)
+        except ImportError:
+            print(f"{name:>10} not installed")
+            continue
+        for precheck in (False, True):
+            rate = bench(decode, messages, precheck)
+            print(
+                f"{name:>10} {str(precheck):>10} {rate:>10.0f} {rate / baseline:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
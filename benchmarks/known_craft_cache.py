@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+
+"""
+Known Craft cache benchmark.
+
+Compares loading a large Known Craft CSV (parsing every row into a `dict`, then
+indexing it) against opening its compiled, memory-mapped KNOWN_CRAFT_CACHE, and the
+memory & lookup speed of each.
+
+Usage: python benchmarks/known_craft_cache.py [--rows 100000]
+"""
+
+import argparse
+import csv
+import os
+import tempfile
+import time
+import tracemalloc
+
+import aircot
+
+import stratuxcot.classes
+import stratuxcot.functions
+
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+def read_csv(known_craft: str) -> list:
+    """Reads Known Craft rows with `csv.DictReader`, as `aircot.read_known_craft`."""
+    with open(known_craft, encoding="UTF-8") as csv_fd:
+        return list(csv.DictReader(csv_fd))
+
+
+def make_known_craft(path: str, rows: int) -> None:
+    """Writes a Known Craft CSV of `rows` rows, in example-known_craft.csv's layout."""
+    with open(path, "w", encoding="UTF-8") as csv_fd:
+        csv_fd.write("DOMAIN,AGENCY,REG,CALLSIGN,TYPE,MODEL,HEX,COT,TYPE,,\n")
+        for i in range(rows):
+            csv_fd.write(
+                f"EMS,AGENCY {i % 100},N{i},C{i},HELICOPTER,,{i:06X},"
+                "a-f-A-C-H,HELICOPTER,,\n"
+            )
+
+
+def measure(func) -> tuple:
+    """Returns the result, seconds & peak traced MB of calling `func`."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / (1 << 20)
+
+
+def lookups_per_sec(index, keys: list, budget: float = 1.0) -> float:
+    """Returns lookups per second of `keys` in `index`, over at least one pass."""
+    count = 0
+    start = time.perf_counter()
+    while not count or time.perf_counter() - start < budget:
+        for key in keys:
+            index.get(key)
+        count += len(keys)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+    aircot.read_known_craft = read_csv
+
+    with tempfile.TemporaryDirectory() as temp:
+        known_craft = os.path.join(temp, "known_craft.csv")
+        cache_path = f"{known_craft}.cache"
+        make_known_craft(known_craft, args.rows)
+        # Half hits, half misses:
+        keys = [f"{i:06X}" for i in range(0, args.rows * 2, max(args.rows // 500, 1))]
+
+        index, csv_time, csv_mb = measure(
+            lambda: stratuxcot.functions.index_known_craft(read_csv(known_craft), "HEX")
+        )
+        start = time.perf_counter()
+        stratuxcot.functions.compile_known_craft(known_craft, cache_path)
+        compile_time = time.perf_counter() - start
+        cache, cache_time, cache_mb = measure(
+            lambda: stratuxcot.classes.KnownCraftCache.load(
+                known_craft, cache_path
+            ).index("HEX")
+        )
+
+        print(f"rows:              {args.rows}")
+        print(f"CSV size:          {os.path.getsize(known_craft) / (1 << 20):.1f} MB")
+        print(f"cache size:        {os.path.getsize(cache_path) / (1 << 20):.1f} MB")
+        print(f"compile:           {compile_time:.3f} s")
+        print(f"{'':19}{'load s':>10} {'peak MB':>10} {'lookups/s':>12}")
+        print(
+            f"{'CSV + index':<19}{csv_time:>10.3f} {csv_mb:>10.1f} "
+            f"{lookups_per_sec(index, keys):>12.0f}"
+        )
+        print(
+            f"{'cache (cold)':<19}{cache_time:>10.3f} {cache_mb:>10.1f} "
+            f"{lookups_per_sec(cache, keys, budget=0):>12.0f}"
+        )
+        print(
+            f"{'cache (warm)':<19}{'':>10} {'':>10} "
+            f"{lookups_per_sec(cache, keys):>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+"""
+Known Craft lookup benchmark.
+
+Compares per-message Known Craft lookup throughput of a linear scan of the
+Known Craft rows against the normalized index built by `index_known_craft()`.
+
+Usage: python benchmarks/known_craft_lookup.py
+"""
+
+import time
+
+import stratuxcot.functions
+
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+SIZES = [10, 1_000, 100_000]
+
+
+def make_known_craft(size: int) -> list:
+    """Generates `size` Known Craft rows with unique HEX addresses."""
+    return [
+        {"DOMAIN": "EMS", "REG": f"N{i}", "CALLSIGN": f"C{i}", "HEX": f" {i:06x} "}
+        for i in range(size)
+    ]
+
+
+def linear_lookup(known_craft_db: list, icao: str) -> dict:
+    """Known Craft lookup as originally done in `StratuxWorker.handle_data`."""
+    return (
+        list(filter(lambda x: x["HEX"].strip().upper() == icao, known_craft_db))
+        or [{}]
+    )[0]
+
+
+def bench(func, messages: list, budget: float = 1.0) -> float:
+    """Returns messages per second for `func` over `messages`."""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < budget:
+        for icao in messages:
+            func(icao)
+        count += len(messages)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Runs the benchmark for each Known Craft database size."""
+    print(f"{'rows':>8} {'linear msg/s':>14} {'index msg/s':>14} {'speedup':>9}")
+    for size in SIZES:
+        known_craft_db = make_known_craft(size)
+        index = stratuxcot.functions.index_known_craft(known_craft_db, "HEX")
+        # Half hits, half misses:
+        messages = [f"{i:06X}" for i in range(0, size * 2, max(size // 50, 1))][:100]
+        craft = {"Icao_addr": 0}
+
+        linear = bench(lambda icao: linear_lookup(known_craft_db, icao), messages)
+        indexed = bench(
+            lambda icao: index.get(stratuxcot.functions.get_craft_key(craft, icao)),
+            messages,
+        )
+        print(f"{size:>8} {linear:>14.0f} {indexed:>14.0f} {indexed / linear:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
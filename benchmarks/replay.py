@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+"""
+End-to-end replay benchmark.
+
+Replays a Stratux capture (see RECORD_FILE) from a local `ReplayServer` into
+`StratuxWorker.run()` and reports messages/sec, p50/p99 per-message handling
+latency and peak RSS. Messages dropped by the pre-decode check aren't counted.
+Without a capture, a synthetic one is generated. No
+network or Stratux hardware is needed.
+
+Usage: python benchmarks/replay.py [--capture FILE] [--speed N] [KEY=VALUE ...]
+
+KEY=VALUE pairs are passed to the worker as config, e.g. EMIT_MODE=snapshot.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from configparser import ConfigParser
+
+import stratuxcot.classes
+import stratuxcot.functions
+
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+MESSAGES = 20_000
+AIRCRAFT = 300
+
+
+def make_capture(capture: str) -> None:
+    """Writes a synthetic capture of `MESSAGES` messages from `AIRCRAFT` craft."""
+    rand = random.Random(1)
+    recorder = stratuxcot.classes.TrafficRecorder(capture)
+    for i in range(MESSAGES):
+        craft = {
+            "Icao_addr": 10698088 + i % AIRCRAFT,
+            "Reg": f"N{i % AIRCRAFT}",
+            "Tail": f"DAL{i % AIRCRAFT}",
+            "Emitter_category": 3,
+            "OnGround": False,
+            "TargetType": 1,
+            "SignalLevel": -35.5,
+            "Squawk": 3105,
+            "Position_valid": rand.random() > 0.2,
+            "Lat": 37.46306 + rand.random(),
+            "Lng": -122.264626 + rand.random(),
+            "Alt": 7325,
+            "NACp": 10,
+            "Track": 135,
+            "Speed": 262,
+            "Vvel": -1600,
+            "Timestamp": "2021-05-19T23:13:18.484Z",
+            "Age": 0.5,
+        }
+        recorder.write(json.dumps(craft, separators=(",", ":")), now=i / 100)
+    recorder.close()
+
+
+def percentile(values: list, percent: float) -> float:
+    """Returns the `percent` percentile of sorted `values`."""
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """Returns the peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, KB elsewhere.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+async def bench(capture: str, speed: float, options: dict) -> None:
+    """Replays `capture` into a StratuxWorker and prints the results."""
+    server = stratuxcot.classes.ReplayServer(capture, port=0, speed=speed)
+    await server.start()
+
+    config = ConfigParser()
+    config.add_section("stratuxcot")
+    config.set("stratuxcot", "STRATUX_WS", server.url)
+    for key, value in options.items():
+        config.set("stratuxcot", key, value)
+    worker = stratuxcot.classes.StratuxWorker(asyncio.Queue(), config["stratuxcot"])
+
+    latencies: list = []
+    handle_data = worker.handle_data
+
+    async def timed_handle_data(data, source=None):
+        start = time.perf_counter()
+        await handle_data(data, source)
+        latencies.append(time.perf_counter() - start)
+
+    worker.handle_data = timed_handle_data
+
+    async def drain():
+        while 1:
+            await worker.queue.get()
+
+    expected = sum(
+        1
+        for _, message in stratuxcot.functions.read_capture(capture)
+        if stratuxcot.functions.is_wanted_message(message)
+    )
+
+    drain_task = asyncio.ensure_future(drain())
+    worker_task = asyncio.ensure_future(worker.run())
+    while not latencies:
+        await asyncio.sleep(0.001)
+    start = time.perf_counter()
+    while len(latencies) < expected:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    worker_task.cancel()
+    drain_task.cancel()
+    await server.close()
+
+    latencies.sort()
+    print(f"messages handled:  {len(latencies)}")
+    print(f"messages/sec:      {len(latencies) / elapsed:.0f}")
+    if latencies:
+        print(f"p50 latency:       {percentile(latencies, 50) * 1e6:.1f} us")
+        print(f"p99 latency:       {percentile(latencies, 99) * 1e6:.1f} us")
+    print(f"peak RSS:          {peak_rss_mb():.1f} MB")
+
+
+def main() -> None:
+    """Parses arguments and runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--capture")
+    parser.add_argument("--speed", type=float, default=0)
+    parser.add_argument("options", nargs="*", default=[])
+    args = parser.parse_args()
+    options = dict(option.split("=", 1) for option in args.options)
+
+    capture = args.capture
+    if not capture:
+        capture = os.path.join(tempfile.mkdtemp(), "capture.jsonl.gz")
+        make_capture(capture)
+
+    asyncio.run(bench(capture, args.speed, options))
+
+
+if __name__ == "__main__":
+    main()
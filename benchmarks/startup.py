@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+
+"""
+Startup time benchmark.
+
+Measures the import time of stratuxcot's modules with `python -X importtime`, in
+fresh interpreters with warm bytecode caches, i.e. what a service restart costs.
+
+Usage: python benchmarks/startup.py [--runs 5] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+TARGETS = [
+    "stratuxcot",
+    "stratuxcot.commands",
+    "stratuxcot.functions",
+    "stratuxcot.classes",
+    "stratuxcot.classes, websockets",
+]
+
+
+def import_times(modules: str, env: dict) -> dict:
+    """Returns {module: (self us, cumulative us)} of importing `modules`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", f"import {modules}"],
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    times: dict = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        # Names are indented by two spaces per nesting level, after one space:
+        times[name[1:].rstrip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def total_us(times: dict, modules: str) -> int:
+    """
+    Returns the import time of `modules`: the sum of their top level imports, and
+    those of their parent packages, leaving out the interpreter's own startup.
+    """
+    names: set = set()
+    for module in modules.split(","):
+        parts = module.strip().split(".")
+        names.update(".".join(parts[: i + 1]) for i in range(len(parts)))
+    return sum(
+        cumulative
+        for name, (_, cumulative) in times.items()
+        if not name.startswith(" ") and name in names
+    )
+
+
+def main() -> None:
+    """Runs the benchmark for each target."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pycache:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+        print(f"{'import':<34} {'median ms':>10} {'min ms':>8}")
+        for target in TARGETS:
+            import_times(target, env)  # Warms the bytecode cache.
+            runs = [
+                total_us(import_times(target, env), target) for _ in range(args.runs)
+            ]
+            print(
+                f"{target:<34} {statistics.median(runs) / 1000:>10.1f} "
+                f"{min(runs) / 1000:>8.1f}"
+            )
+
+        print(f"\nSlowest imports of {TARGETS[-1]} (cumulative ms):")
+        times = import_times(TARGETS[-1], env)
+        slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (_, cumulative) in slowest[: args.top]:
+            print(f"  {cumulative / 1000:>8.1f}  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
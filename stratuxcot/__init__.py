@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+
+"""
+Stratux ADS-B to Cursor-On-Target Gateway.
+
+Functions & classes are imported on first use (PEP 562), so importing the package
+(e.g. by the PyTAK CLI, for its DEFAULT_COT_STALE) doesn't load websockets, aircot
+or ElementTree.
+"""
+
+import importlib
+
+import stratuxcot.constants
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+DEFAULT_COT_STALE: str = stratuxcot.constants.DEFAULT_COT_STALE
+DEFAULT_STRATUX_WS: str = stratuxcot.constants.DEFAULT_STRATUX_WS
+
+
+# Public name: submodule it's lazily imported from.
+_LAZY: dict = {
+    "create_tasks": "functions",
+    "stratux_to_cot": "functions",
+    "stratux_to_cot_fields": "functions",
+    "stratux_to_cot_xml": "functions",
+    "stratux_to_cot_batch": "functions",
+    "index_known_craft": "functions",
+    "read_filter_config": "functions",
+    "StratuxWorker": "classes",
+    "GDL90Worker": "classes",
+    "TrafficRecord": "classes",
+}
+
+__all__ = ["DEFAULT_COT_STALE", "DEFAULT_STRATUX_WS", *_LAZY]
+
+
+def __getattr__(name: str):
+    submodule = _LAZY.get(name)
+    if submodule is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f"{__name__}.{submodule}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(_LAZY))
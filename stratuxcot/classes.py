@@ -19,16 +19,26 @@
 """StratuxCOT Class Definitions."""
 
 import asyncio
+import bisect
+import concurrent.futures
 import json
+import logging
+import math
+import mmap
+import os
+import random
+import sys
+import time
 
+from collections import Counter, OrderedDict, deque
 from configparser import SectionProxy
-from typing import Union
-
-import websockets
+from typing import Callable, FrozenSet, Iterator, Pattern, Sequence, Tuple, Union
 
 import aircot
 import pytak
 import stratuxcot
+import stratuxcot.constants
+import stratuxcot.functions
 
 
 __author__ = "Greg Albrecht W2GMD <oss@undef.net>"
@@ -36,55 +46,1737 @@ __copyright__ = "Copyright 2022 Greg Albrecht"
 __license__ = "Apache License, Version 2.0"
 
 
+class TrafficRecord:  # pylint: disable=too-many-instance-attributes
+    """
+    A Stratux traffic report, parsed once from a Stratux Websocket Message.
+
+    Only the fields StratuxCOT uses are kept. Registration & callsign are
+    stripped & upper-cased, NACp is an `int` (0 if missing) and OnGround &
+    Position_valid are `bool`. The ICAO HEX address is computed when first used.
+    """
+
+    __slots__ = (
+        "icao_addr",
+        "tail",
+        "reg",
+        "emitter_category",
+        "target_type",
+        "squawk",
+        "position_valid",
+        "lat",
+        "lon",
+        "alt",
+        "nacp",
+        "on_ground",
+        "track",
+        "speed",
+        "vvel",
+        "signal_level",
+        "timestamp",
+        "age",
+        "extrapolated",
+        "_icao",
+    )
+
+    # Stratux Websocket Message field of each slot.
+    FIELDS: dict = {
+        "icao_addr": "Icao_addr",
+        "tail": "Tail",
+        "reg": "Reg",
+        "emitter_category": "Emitter_category",
+        "target_type": "TargetType",
+        "squawk": "Squawk",
+        "position_valid": "Position_valid",
+        "lat": "Lat",
+        "lon": "Lng",
+        "alt": "Alt",
+        "nacp": "NACp",
+        "on_ground": "OnGround",
+        "track": "Track",
+        "speed": "Speed",
+        "vvel": "Vvel",
+        "signal_level": "SignalLevel",
+        "timestamp": "Timestamp",
+        "age": "Age",
+    }
+
+    def __init__(self, **fields) -> None:
+        for slot in self.FIELDS:
+            setattr(self, slot, fields.get(slot))
+        self.tail = self.tail or ""
+        self.reg = self.reg or ""
+        self.nacp = self.nacp or 0
+        self.on_ground = bool(self.on_ground)
+        self.position_valid = self.position_valid is not False
+        # Seconds this record's position was extrapolated for, see extrapolate():
+        self.extrapolated: Union[float, None] = fields.get("extrapolated")
+        self._icao: Union[str, None] = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.icao!r}, {self.lat!r}, {self.lon!r})"
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TrafficRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.FIELDS)
+
+    def __getstate__(self) -> dict:
+        state = {slot: getattr(self, slot) for slot in self.FIELDS}
+        if self.extrapolated is not None:
+            state["extrapolated"] = self.extrapolated
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(**state)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TrafficRecord":
+        """
+        Parses a decoded Stratux Websocket Message.
+
+        Raises `ValueError` or `TypeError` if a field can't be normalized.
+        """
+        get = data.get
+        tail = get("Tail")
+        reg = get("Reg")
+        return cls(
+            icao_addr=get("Icao_addr"),
+            tail=tail.strip().upper() if tail else "",
+            reg=reg.strip().upper() if reg else "",
+            emitter_category=get("Emitter_category"),
+            target_type=get("TargetType"),
+            squawk=get("Squawk"),
+            position_valid=get("Position_valid", True),
+            lat=get("Lat"),
+            lon=get("Lng"),
+            alt=get("Alt"),
+            nacp=int(get("NACp") or 0),
+            on_ground=bool(get("OnGround")),
+            track=get("Track"),
+            speed=get("Speed"),
+            vvel=get("Vvel"),
+            signal_level=get("SignalLevel"),
+            timestamp=get("Timestamp"),
+            age=get("Age"),
+        )
+
+    @classmethod
+    def parse(cls, craft: Union[dict, "TrafficRecord"]) -> "TrafficRecord":
+        """Returns `craft` as a TrafficRecord, parsing it if it's a `dict`."""
+        if isinstance(craft, cls):
+            return craft
+        return cls.from_dict(craft)
+
+    def to_dict(self) -> dict:
+        """Returns this record as a Stratux Websocket Message `dict`."""
+        return {
+            field: getattr(self, slot)
+            for slot, field in self.FIELDS.items()
+            if getattr(self, slot) is not None
+        }
+
+    @property
+    def icao(self) -> str:
+        """ICAO HEX address, upper-cased, or an empty string if there is none."""
+        if self._icao is None:
+            self._icao = (
+                aircot.icao_int_to_hex(self.icao_addr).strip().upper()
+                if self.icao_addr
+                else ""
+            )
+        return self._icao
+
+    def extrapolate(self, seconds: float) -> "TrafficRecord":
+        """
+        Returns a copy of this record, dead-reckoned `seconds` forward along its
+        Track, Speed & Vvel, or this record if it has no track or speed.
+        """
+        if seconds <= 0 or None in (self.lat, self.lon, self.track, self.speed):
+            return self
+        state = self.__getstate__()
+        lat, lon = stratuxcot.functions.dead_reckon(
+            self.lat, self.lon, self.track, self.speed, seconds
+        )
+        state.update(lat=round(lat, 7), lon=round(lon, 7), extrapolated=seconds)
+        if self.alt is not None and self.vvel and not self.on_ground:
+            # Vvel is in feet per minute:
+            state["alt"] = round(self.alt + self.vvel * seconds / 60)
+        record = self.__class__(**state)
+        record._icao = self._icao  # pylint: disable=protected-access
+        return record
+
+    def identity_key(self) -> tuple:
+        """Returns the fields the identity of this craft's CoT Events derive from."""
+        return (
+            self.icao_addr,
+            self.tail,
+            self.reg,
+            self.emitter_category,
+            self.target_type,
+            self.squawk,
+        )
+
+
+class KnownCraftCache:
+    """
+    Memory-mapped Known Craft database, compiled from the Known Craft CSV by
+    `stratuxcot.functions.compile_known_craft()`.
+
+    Opening the cache parses nothing but its small header. Rows are decoded when
+    first looked up and kept, so a row is always the same `dict` (which
+    `IdentityCache` relies on), and only the pages of the file that lookups touch
+    are read into memory.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as cache_fd:
+            self._mmap = mmap.mmap(cache_fd.fileno(), 0, access=mmap.ACCESS_READ)
+        magic: bytes = stratuxcot.constants.KNOWN_CRAFT_CACHE_MAGIC
+        if self._mmap[: len(magic)] != magic:
+            raise ValueError(f"Not a Known Craft cache: {path}")
+        start: int = len(magic) + 4
+        header_length: int = int.from_bytes(self._mmap[len(magic) : start], "little")
+        header: dict = json.loads(self._mmap[start : start + header_length])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(
+                f"Known Craft cache {path} is {header['byteorder']}-endian"
+            )
+
+        self.sha256: bytes = bytes.fromhex(header["sha256"])
+        self.columns: tuple = tuple(header["columns"])
+        body: int = start + header_length
+        view = memoryview(self._mmap)
+        sections: list = [
+            view[body + offset : body + offset + length]
+            for offset, length in header["sections"]
+        ]
+        self._data = sections[0]
+        self._row_offsets = sections[1].cast("I")
+        self._rows: dict = {}
+        self.indexes: dict = {}
+        for number, key in enumerate(header["indexes"]):
+            keys, key_offsets, row_numbers = sections[2 + number * 3 : 5 + number * 3]
+            self.indexes[key] = KnownCraftIndex(
+                self, keys, key_offsets.cast("I"), row_numbers.cast("I")
+            )
+
+    @classmethod
+    def load(cls, known_craft: str, path: str) -> "KnownCraftCache":
+        """
+        Opens the cache of the Known Craft CSV `known_craft` at `path`, compiling it
+        first if it doesn't exist, or if the CSV changed since it was compiled.
+        """
+        if os.path.exists(path):
+            try:
+                cache = cls(path)
+                if cache.sha256 == stratuxcot.functions.file_sha256(known_craft):
+                    return cache
+            except (ValueError, KeyError):
+                pass
+        stratuxcot.functions.compile_known_craft(known_craft, path)
+        return cls(path)
+
+    def __reduce__(self) -> tuple:
+        return self.__class__, (self.path,)
+
+    def __len__(self) -> int:
+        return len(self._row_offsets) - 1
+
+    def __iter__(self) -> Iterator[dict]:
+        return (self[number] for number in range(len(self)))
+
+    def __getitem__(self, number: int) -> dict:
+        row = self._rows.get(number)
+        if row is None:
+            offsets = self._row_offsets
+            values = (
+                bytes(self._data[offsets[number] : offsets[number + 1]])
+                .decode("UTF-8")
+                .split(stratuxcot.constants.KNOWN_CRAFT_CACHE_SEPARATOR)
+            )
+            row = self._rows[number] = dict(zip(self.columns, values))
+        return row
+
+    def index(self, key: str) -> "KnownCraftIndex":
+        """Returns the index of the cache on the Known Craft column `key`."""
+        try:
+            return self.indexes[key]
+        except KeyError:
+            raise ValueError(
+                f"Known Craft cache {self.path} has no {key} index"
+            ) from None
+
+
+class KnownCraftIndex:
+    """
+    Index of a `KnownCraftCache` on one column, a drop-in for the `dict` built by
+    `stratuxcot.functions.index_known_craft()`.
+
+    Keys are binary searched in the cache's sorted key array. Lookups, hits and
+    misses alike, are remembered, so each craft is only searched for once.
+    """
+
+    # Remembered misses, before they are forgotten:
+    MAX_MISSES: int = 65_536
+
+    def __init__(self, cache: KnownCraftCache, keys, key_offsets, row_numbers) -> None:
+        self.cache = cache
+        self._keys = keys
+        self._key_offsets = key_offsets
+        self._row_numbers = row_numbers
+        self._found: dict = {}
+        self._misses: int = 0
+
+    def __reduce__(self) -> tuple:
+        key = next(key for key, index in self.cache.indexes.items() if index is self)
+        return KnownCraftCache.index, (self.cache, key)
+
+    def __len__(self) -> int:
+        return len(self._row_numbers)
+
+    def __contains__(self, value: str) -> bool:
+        return self.get(value) is not None
+
+    def __getitem__(self, value: str) -> dict:
+        row = self.get(value)
+        if row is None:
+            raise KeyError(value)
+        return row
+
+    def search(self, value: str) -> int:
+        """Returns the row number of the normalized `value`, or -1 if not found."""
+        target: bytes = value.encode("UTF-8")
+        keys, offsets = self._keys, self._key_offsets
+        low, high = 0, len(self._row_numbers)
+        while low < high:
+            middle = (low + high) // 2
+            probe = bytes(keys[offsets[middle] : offsets[middle + 1]])
+            if probe < target:
+                low = middle + 1
+            elif probe > target:
+                high = middle
+            else:
+                return self._row_numbers[middle]
+        return -1
+
+    def get(self, value: str, default=None) -> Union[dict, None]:
+        """Returns the Known Craft row of the normalized `value`, or `default`."""
+        try:
+            row = self._found[value]
+        except KeyError:
+            number = self.search(value) if value else -1
+            row = self.cache[number] if number >= 0 else None
+            if row is None:
+                self._misses += 1
+                if self._misses > self.MAX_MISSES:
+                    self._found = {
+                        key: found for key, found in self._found.items() if found
+                    }
+                    self._misses = 0
+            self._found[value] = row
+        return default if row is None else row
+
+
+class CraftFilter:
+    """
+    Include/exclude filter on one craft key (FLIGHT, HEX or REG).
+
+    Exact values are matched with frozenset lookups, glob values (e.g. `N12*`) are
+    compiled into a single regex per list.
+    """
+
+    __slots__ = ("key", "include", "exclude", "include_pattern", "exclude_pattern")
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        key: str,
+        include: FrozenSet[str] = frozenset(),
+        exclude: FrozenSet[str] = frozenset(),
+        include_pattern: Union[Pattern, None] = None,
+        exclude_pattern: Union[Pattern, None] = None,
+    ) -> None:
+        self.key = key
+        self.include = include
+        self.exclude = exclude
+        self.include_pattern = include_pattern
+        self.exclude_pattern = exclude_pattern
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}({self.key!r}, include={sorted(self.include)}, "
+            f"exclude={sorted(self.exclude)})"
+        )
+
+    def allows(self, value: str) -> bool:
+        """
+        Returns True if a craft with the normalized key `value` passes this filter.
+
+        Excludes take precedence over includes. If any includes are set, only
+        included values pass.
+        """
+        if value in self.exclude or (
+            self.exclude_pattern is not None and self.exclude_pattern.match(value)
+        ):
+            return False
+        if self.include or self.include_pattern is not None:
+            return value in self.include or (
+                self.include_pattern is not None
+                and self.include_pattern.match(value) is not None
+            )
+        return True
+
+
+class Geofence:
+    """
+    Geofence of polygons & circles, with a grid index for cheap point lookups.
+
+    Every shape is indexed on the grid cells its bounding box overlaps, so a lookup
+    only tests the few shapes near the point, however many shapes there are. Cells
+    that are entirely inside a circle are marked as such, and need no test at all.
+    Polygons are (lon, lat) rings, the first being the outer boundary and any
+    others holes, see `stratuxcot.functions.read_geofence()`. Shapes must not cross
+    the antimeridian.
+    """
+
+    def __init__(
+        self,
+        polygons: Union[list, None] = None,
+        circles: Union[list, None] = None,
+        cell: float = 0.25,
+    ) -> None:
+        self.cell = cell
+        self.polygons: list = []
+        self.circles: list = []
+        # (row, col): shapes overlapping the cell, or True if the cell is inside.
+        self.grid: dict = {}
+        for polygon in polygons or []:
+            self.add_polygon(polygon)
+        for lat, lon, radius in circles or []:
+            self.add_circle(lat, lon, radius)
+
+    def __len__(self) -> int:
+        return len(self.polygons) + len(self.circles)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(polygons={len(self.polygons)}, "
+            f"circles={len(self.circles)}, cells={len(self.grid)})"
+        )
+
+    def _cells(self, min_lat, min_lon, max_lat, max_lon) -> Iterator[tuple]:
+        """Yields the grid cells overlapping a bounding box."""
+        cell = self.cell
+        for row in range(math.floor(min_lat / cell), math.floor(max_lat / cell) + 1):
+            for col in range(
+                math.floor(min_lon / cell), math.floor(max_lon / cell) + 1
+            ):
+                yield row, col
+
+    def _index(self, shape: tuple, bbox: tuple) -> None:
+        for key in self._cells(*bbox):
+            shapes = self.grid.setdefault(key, [])
+            if shapes is not True:
+                shapes.append(shape)
+
+    def add_polygon(self, rings: list) -> None:
+        """Adds a polygon, given as (lon, lat) rings."""
+        edges: list = []
+        for ring in rings:
+            points = list(ring)
+            if points and points[0] != points[-1]:
+                points.append(points[0])
+            edges.append(
+                [
+                    (x_1, y_1, x_2, y_2)
+                    for (x_1, y_1), (x_2, y_2) in zip(points, points[1:])
+                    if y_1 != y_2
+                ]
+            )
+        lons = [lon for lon, _ in rings[0]]
+        lats = [lat for _, lat in rings[0]]
+        bbox = (min(lats), min(lons), max(lats), max(lons))
+        shape = ("polygon", bbox, edges)
+        self.polygons.append(shape)
+        self._index(shape, bbox)
+
+    def add_circle(self, lat: float, lon: float, radius: float) -> None:
+        """Adds a circle of `radius` meters around `lat`, `lon`."""
+        d_lat = radius / stratuxcot.constants.METERS_PER_DEGREE
+        d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+        bbox = (lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon)
+        shape = ("circle", bbox, (lat, lon, radius))
+        self.circles.append(shape)
+        cell = self.cell
+        for key in self._cells(*bbox):
+            row, col = key
+            corners = (
+                (row * cell, col * cell),
+                (row * cell, (col + 1) * cell),
+                ((row + 1) * cell, col * cell),
+                ((row + 1) * cell, (col + 1) * cell),
+            )
+            if all(
+                _in_circle(c_lat, c_lon, lat, lon, radius) for c_lat, c_lon in corners
+            ):
+                self.grid[key] = True
+            else:
+                shapes = self.grid.setdefault(key, [])
+                if shapes is not True:
+                    shapes.append(shape)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Returns True if `lat`, `lon` is inside any shape of this geofence."""
+        cell = self.cell
+        shapes = self.grid.get((math.floor(lat / cell), math.floor(lon / cell)))
+        if shapes is None:
+            return False
+        if shapes is True:
+            return True
+        for kind, (min_lat, min_lon, max_lat, max_lon), geometry in shapes:
+            if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                continue
+            if kind == "circle":
+                if _in_circle(lat, lon, *geometry):
+                    return True
+            elif _in_polygon(lon, lat, geometry):
+                return True
+        return False
+
+    @classmethod
+    def from_config(cls, config: SectionProxy) -> Union["Geofence", None]:
+        """Returns a Geofence of the GEOFENCE & GEOFENCE_CIRCLE shapes, if any."""
+        polygons: list = []
+        for path in stratuxcot.functions.split_config_list(config.get("GEOFENCE")):
+            polygons.extend(stratuxcot.functions.read_geofence(path))
+        circles: list = stratuxcot.functions.read_geofence_circles(
+            config.get("GEOFENCE_CIRCLE")
+        )
+        if not polygons and not circles:
+            return None
+        return cls(
+            polygons,
+            circles,
+            float(
+                config.get("GEOFENCE_CELL", stratuxcot.constants.DEFAULT_GEOFENCE_CELL)
+            ),
+        )
+
+
+class EmitThrottle:
+    """
+    Per-craft rate limiting & change detection of CoT Events.
+
+    Keeps the last emitted position, altitude, track & speed of each craft, and
+    suppresses updates that come sooner than `min_interval`, or that don't change
+    any of these by more than its dead-band. A refresh is always let through once
+    `refresh` seconds have passed, so craft don't go stale in ATAK.
+    """
+
+    _METERS_PER_DEGREE: float = stratuxcot.constants.METERS_PER_DEGREE
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        min_interval: float = 0,
+        refresh: float = 60,
+        position: Union[float, None] = None,
+        alt: Union[float, None] = None,
+        track: Union[float, None] = None,
+        speed: Union[float, None] = None,
+    ) -> None:
+        self.min_interval = min_interval
+        self.refresh = refresh
+        self.position = position
+        self.alt = alt
+        self.track = track
+        self.speed = speed
+        self.has_deadbands: bool = any(
+            band is not None for band in (position, alt, track, speed)
+        )
+        # icao: (emitted_at, lat, lon, alt, track, speed)
+        self.state: dict = {}
+        self.suppressed: int = 0
+        self._next_prune: float = 0
+
+    @classmethod
+    def from_config(cls, config: SectionProxy) -> Union["EmitThrottle", None]:
+        """Returns an EmitThrottle for `config`, or None if throttling isn't enabled."""
+
+        def _band(option: str) -> Union[float, None]:
+            value = config.get(
+                option, getattr(stratuxcot.constants, f"DEFAULT_{option}")
+            )
+            return float(value) if value not in (None, "") else None
+
+        min_interval = float(
+            config.get(
+                "COT_MIN_INTERVAL", stratuxcot.constants.DEFAULT_COT_MIN_INTERVAL
+            )
+        )
+        throttle = cls(
+            min_interval=min_interval,
+            position=_band("COT_DEADBAND_POSITION"),
+            alt=_band("COT_DEADBAND_ALT"),
+            track=_band("COT_DEADBAND_TRACK"),
+            speed=_band("COT_DEADBAND_SPEED"),
+        )
+        if not min_interval and not throttle.has_deadbands:
+            return None
+
+        cot_stale = float(config.get("COT_STALE", pytak.DEFAULT_COT_STALE))
+        throttle.refresh = float(config.get("COT_REFRESH") or cot_stale / 2)
+        return throttle
+
+    def should_emit(
+        self, icao: str, craft: TrafficRecord, now: Union[float, None] = None
+    ) -> bool:
+        """
+        Returns True if a CoT Event should be emitted for this craft update.
+
+        When True, the update is recorded as the last emitted state of the craft.
+        """
+        if now is None:
+            now = time.monotonic()
+        if now >= self._next_prune:
+            self.prune(now)
+
+        current = (
+            now,
+            craft.lat,
+            craft.lon,
+            craft.alt,
+            craft.track,
+            craft.speed,
+        )
+        last = self.state.get(icao)
+        if last is not None:
+            elapsed = now - last[0]
+            if elapsed < self.min_interval or (
+                elapsed < self.refresh and not self.changed(last, current)
+            ):
+                self.suppressed += 1
+                return False
+
+        self.state[icao] = current
+        return True
+
+    def changed(self, last: tuple, current: tuple) -> bool:
+        """Returns True if `current` differs from `last` by more than a dead-band."""
+        if not self.has_deadbands:
+            return True
+        _, lat, lon, alt, track, speed = current
+        _, last_lat, last_lon, last_alt, last_track, last_speed = last
+
+        if self.position is not None:
+            if None in (lat, lon, last_lat, last_lon):
+                if (lat, lon) != (last_lat, last_lon):
+                    return True
+            else:
+                d_y = (lat - last_lat) * self._METERS_PER_DEGREE
+                d_x = (
+                    (lon - last_lon)
+                    * self._METERS_PER_DEGREE
+                    * math.cos(math.radians(lat))
+                )
+                if math.hypot(d_x, d_y) > self.position:
+                    return True
+
+        if self.alt is not None and _delta(alt, last_alt) > self.alt:
+            return True
+
+        if self.track is not None:
+            d_track = _delta(track, last_track)
+            if d_track != math.inf:
+                d_track = min(d_track % 360, 360 - d_track % 360)
+            if d_track > self.track:
+                return True
+
+        if self.speed is not None and _delta(speed, last_speed) > self.speed:
+            return True
+
+        return False
+
+    def prune(self, now: float) -> None:
+        """Forgets craft whose last emitted CoT Event is older than `refresh`."""
+        self.state = {
+            icao: last
+            for icao, last in self.state.items()
+            if now - last[0] < self.refresh
+        }
+        self._next_prune = now + self.refresh
+
+
+class Deduplicator:
+    """
+    Per-craft deduplication of traffic reports from several Stratux receivers.
+
+    Each craft follows one receiver at a time: the receiver of its last accepted
+    report. Reports from other receivers within `window` seconds are duplicates,
+    unless they are more accurate (higher NACp, then stronger signal), in which case
+    the craft switches to that receiver. Reports older than the last accepted one,
+    by Stratux `Timestamp`, are always dropped. If the followed receiver goes quiet
+    for `window` seconds, the next report from any receiver is accepted.
+    """
+
+    def __init__(self, window: float = 1) -> None:
+        self.window = window
+        # icao: (accepted_at, source, timestamp, rank)
+        self.state: dict = {}
+        self.duplicates: int = 0
+        self._next_prune: float = 0
+
+    def accept(
+        self,
+        icao: str,
+        craft: TrafficRecord,
+        source: Union[str, None],
+        now: Union[float, None] = None,
+    ) -> bool:
+        """
+        Returns True if this report of the craft, received from `source`, should
+        be processed. When True, the report is recorded as the last accepted one.
+        """
+        if now is None:
+            now = time.monotonic()
+        if now >= self._next_prune:
+            self.prune(now)
+
+        timestamp = craft.timestamp
+        rank: tuple = (
+            -math.inf if craft.nacp is None else craft.nacp,
+            -math.inf if craft.signal_level is None else craft.signal_level,
+        )
+        last = self.state.get(icao)
+        if last is not None:
+            _, last_source, last_timestamp, last_rank = last
+            if timestamp and last_timestamp and timestamp < last_timestamp:
+                self.duplicates += 1
+                return False
+            if (
+                source != last_source
+                and now - last[0] < self.window
+                and rank <= last_rank
+            ):
+                self.duplicates += 1
+                return False
+
+        self.state[icao] = (now, source, timestamp, rank)
+        return True
+
+    def prune(self, now: float) -> None:
+        """Forgets craft whose last accepted report is older than `window`."""
+        self.state = {
+            icao: last
+            for icao, last in self.state.items()
+            if now - last[0] < self.window
+        }
+        self._next_prune = now + max(self.window, 1)
+
+
+class IdentityCache:
+    """
+    Bounded LRU cache of CoT Event identity fields, see `stratux_to_cot_identity()`.
+
+    Entries are keyed on the craft's `TrafficRecord.identity_key()` and the `id()`
+    of its Known Craft row, so a cache must only be used with a single config, and
+    cleared whenever Known Craft data is reloaded.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self._cache: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get_identity(
+        self,
+        craft: TrafficRecord,
+        config: Union[dict, None] = None,
+        known_craft: Union[dict, None] = None,
+    ) -> Union[dict, None]:
+        """Returns the cached identity fields of `craft`, computing them on a miss."""
+        key = (craft.identity_key(), id(known_craft))
+        cache = self._cache
+        try:
+            identity = cache[key]
+        except KeyError:
+            self.misses += 1
+            identity = stratuxcot.functions.stratux_to_cot_identity(
+                craft, config, known_craft
+            )
+            cache[key] = identity
+            if len(cache) > self.maxsize:
+                cache.popitem(last=False)
+            return identity
+
+        self.hits += 1
+        cache.move_to_end(key)
+        return identity
+
+    def clear(self) -> None:
+        """Empties the cache, e.g. when Known Craft data changes."""
+        self._cache.clear()
+
+
+class AircraftTable:
+    """
+    Live table of the latest traffic report of each craft, keyed by ICAO.
+
+    A craft's age is the Stratux `Age` of its report (seconds since its last
+    position fix) plus the time since the report was received. Craft older than
+    `max_age` are removed by `expire()`.
+    """
+
+    def __init__(self, max_age: float = 60) -> None:
+        self.max_age = max_age
+        # icao: (record, known_craft, received_at)
+        self.aircraft: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.aircraft)
+
+    def __contains__(self, icao: str) -> bool:
+        return icao in self.aircraft
+
+    def update(
+        self,
+        icao: str,
+        craft: TrafficRecord,
+        known_craft: Union[dict, None] = None,
+        now: Union[float, None] = None,
+    ) -> None:
+        """Replaces the report of a craft with `craft`."""
+        self.aircraft[icao] = (
+            craft,
+            known_craft,
+            time.monotonic() if now is None else now,
+        )
+
+    def age(self, icao: str, now: Union[float, None] = None) -> float:
+        """Returns the seconds since the last position fix of a craft."""
+        craft, _, received_at = self.aircraft[icao]
+        if now is None:
+            now = time.monotonic()
+        return (craft.age or 0) + now - received_at
+
+    def expire(self, now: Union[float, None] = None) -> int:
+        """Removes craft older than `max_age`, returns how many were removed."""
+        if now is None:
+            now = time.monotonic()
+        expired = [icao for icao in self.aircraft if self.age(icao, now) > self.max_age]
+        for icao in expired:
+            del self.aircraft[icao]
+        return len(expired)
+
+    def items(self) -> list:
+        """Returns a list of (icao, (record, known_craft, received_at))."""
+        return list(self.aircraft.items())
+
+
+class TrafficRecorder:
+    """
+    Records raw Stratux Websocket Messages, with the time each was received.
+
+    Messages are written as JSON lines of `{"time": ..., "message": ...}`, gzip
+    compressed if the file name ends in `.gz`. See `read_capture()`.
+    """
+
+    def __init__(self, capture: str) -> None:
+        self.capture = capture
+        self.count: int = 0
+        self._capture_fd = stratuxcot.functions.open_capture(capture, "at")
+
+    def write(self, message: Union[str, bytes], now: Union[float, None] = None) -> None:
+        """Records one raw message."""
+        if isinstance(message, bytes):
+            message = message.decode("UTF-8")
+        entry = {"time": time.time() if now is None else now, "message": message}
+        self._capture_fd.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        """Flushes & closes the capture file."""
+        self._capture_fd.close()
+
+
+class TrackStore:
+    """
+    Persistent history of traffic reports, in an SQLite database (WAL mode).
+
+    Reports are added in memory and written in batches by `flush()`, in a
+    dedicated thread, which also deletes reports older than `retention` seconds.
+    Times are UNIX times, so the history survives restarts.
+    """
+
+    SCHEMA: tuple = (
+        "CREATE TABLE IF NOT EXISTS tracks ("
+        "icao TEXT NOT NULL, time REAL NOT NULL, record TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS tracks_icao_time ON tracks (icao, time)",
+        "CREATE INDEX IF NOT EXISTS tracks_time ON tracks (time)",
+    )
+
+    def __init__(
+        self, path: str, retention: float = 600, max_pending: int = 10000
+    ) -> None:
+        self.path = path
+        self.retention = retention
+        self.max_pending = max_pending
+        self.dropped: int = 0
+        self.written: int = 0
+        self._pending: list = []
+        self._db = None
+        # SQLite is only used from this thread:
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            1, thread_name_prefix="stratuxcot-tracks"
+        )
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @classmethod
+    def from_config(cls, config: SectionProxy) -> Union["TrackStore", None]:
+        """Returns a TrackStore for the TRACK_STORE option, or None if it's unset."""
+        path: Union[str, None] = config.get("TRACK_STORE")
+        if not path:
+            return None
+        return cls(
+            path,
+            float(
+                config.get(
+                    "TRACK_STORE_RETENTION",
+                    stratuxcot.constants.DEFAULT_TRACK_STORE_RETENTION,
+                )
+            ),
+            int(
+                config.get(
+                    "TRACK_STORE_MAX_PENDING",
+                    stratuxcot.constants.DEFAULT_TRACK_STORE_MAX_PENDING,
+                )
+            ),
+        )
+
+    async def _run(self, func: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    def _open(self) -> None:
+        import sqlite3  # pylint: disable=import-outside-toplevel
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            self._db.execute(statement)
+        self._db.commit()
+
+    async def open(self) -> None:
+        """Opens (creating if needed) the database."""
+        await self._run(self._open)
+
+    def add(
+        self, icao: str, craft: TrafficRecord, now: Union[float, None] = None
+    ) -> None:
+        """Adds a traffic report, to be written by the next `flush()`."""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((icao, time.time() if now is None else now, craft))
+
+    def _write(self, rows: list, now: float) -> None:
+        self._db.executemany(
+            "INSERT INTO tracks (icao, time, record) VALUES (?, ?, ?)",
+            [
+                (icao, received, json.dumps(craft.to_dict(), separators=(",", ":")))
+                for icao, received, craft in rows
+            ],
+        )
+        self._db.execute("DELETE FROM tracks WHERE time < ?", (now - self.retention,))
+        self._db.commit()
+        self.written += len(rows)
+
+    async def flush(self, now: Union[float, None] = None) -> int:
+        """Writes the pending reports & evicts old ones, returns the number written."""
+        rows, self._pending = self._pending, []
+        await self._run(self._write, rows, time.time() if now is None else now)
+        return len(rows)
+
+    async def flush_every(self, interval: float) -> None:
+        """Flushes every `interval` seconds."""
+        while 1:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def _latest(self, since: float) -> list:
+        # SQLite returns the other columns of the row with the MAX():
+        cursor = self._db.execute(
+            "SELECT icao, MAX(time), record FROM tracks WHERE time >= ? GROUP BY icao",
+            (since,),
+        )
+        return [
+            (icao, received, TrafficRecord.from_dict(json.loads(record)))
+            for icao, received, record in cursor
+        ]
+
+    async def latest(self, since: float = 0) -> list:
+        """
+        Returns the latest report of each craft received since `since` (UNIX time),
+        as (icao, time received, `TrafficRecord`).
+        """
+        return await self._run(self._latest, since)
+
+    def _history(self, icao: str, since: float) -> list:
+        cursor = self._db.execute(
+            "SELECT time, record FROM tracks WHERE icao = ? AND time >= ? "
+            "ORDER BY time",
+            (icao, since),
+        )
+        return [
+            (received, TrafficRecord.from_dict(json.loads(record)))
+            for received, record in cursor
+        ]
+
+    async def history(self, icao: str, since: float = 0) -> list:
+        """Returns the reports of a craft since `since`, as (time, `TrafficRecord`)."""
+        return await self._run(self._history, icao, since)
+
+    def close(self) -> None:
+        """Writes the pending reports & closes the database."""
+        if self._db is not None:
+            rows, self._pending = self._pending, []
+            self._executor.submit(self._write, rows, time.time()).result()
+            self._executor.submit(self._db.close).result()
+            self._db = None
+        self._executor.shutdown()
+
+
+class ReplayServer:
+    """
+    Local WebSocket server replaying a Stratux capture to each client.
+
+    Messages are sent with their recorded spacing divided by `speed`, or as fast
+    as possible if `speed` is 0. Point STRATUX_WS at `url` to replay a capture
+    through StratuxCOT without a Stratux.
+    """
+
+    def __init__(
+        self,
+        capture: str,
+        host: str = stratuxcot.constants.DEFAULT_REPLAY_HOST,
+        port: int = stratuxcot.constants.DEFAULT_REPLAY_PORT,
+        speed: float = 1.0,
+    ) -> None:
+        self.capture = capture
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.sent: int = 0
+        self.done: asyncio.Event = asyncio.Event()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        """WebSocket URL of this server."""
+        return f"ws://{self.host}:{self.port}/traffic"
+
+    async def start(self) -> None:
+        """Starts serving. With `port` 0, `port` is set to the one picked."""
+        import websockets  # pylint: disable=import-outside-toplevel
+
+        self._server = await websockets.serve(self.replay, self.host, self.port)
+        self.port = list(self._server.sockets)[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """Stops serving."""
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def replay(self, websocket, *_) -> None:
+        """Sends the capture to one client, then closes the connection."""
+        first_time: Union[float, None] = None
+        start: float = time.monotonic()
+        for message_time, message in stratuxcot.functions.read_capture(self.capture):
+            if self.speed > 0:
+                if first_time is None:
+                    first_time = message_time
+                delay = (message_time - first_time) / self.speed - (
+                    time.monotonic() - start
+                )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await websocket.send(message)
+            self.sent += 1
+        self.done.set()
+        await websocket.close()
+
+
+class Histogram:
+    """Cumulative histogram of observed values, with fixed bucket upper bounds."""
+
+    __slots__ = ("bounds", "buckets", "count", "sum")
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds: tuple = tuple(sorted(bounds))
+        # One bucket per bound, plus +Inf:
+        self.buckets: list = [0] * (len(self.bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        """Records one value."""
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, quantile: float) -> float:
+        """Returns the upper bound of the bucket holding the `quantile`."""
+        rank = quantile * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+class Metrics:
+    """
+    Prometheus-style metrics of the StratuxCOT pipeline.
+
+    Counters and histograms are plain in-process values, cheap enough to always
+    collect. Gauges are callables, only evaluated when rendered.
+    """
+
+    def __init__(self, prefix: str = "stratuxcot") -> None:
+        self.prefix = prefix
+        self.counters: Counter = Counter()
+        self.dropped: Counter = Counter()
+        self.histograms: dict = {}
+        self.gauges: dict = {}
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """Increments the counter `name`."""
+        self.counters[name] += value
+
+    def drop(self, reason: str) -> None:
+        """Counts one message dropped for `reason`."""
+        self.dropped[reason] += 1
+
+    def histogram(self, name: str, bounds: Sequence[float]) -> Histogram:
+        """Returns the histogram `name`, creating it with `bounds` if needed."""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(bounds)
+        return histogram
+
+    def gauge(self, name: str, func: Callable[[], float]) -> None:
+        """Registers the gauge `name`, whose value is returned by `func`."""
+        self.gauges[name] = func
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        prefix = self.prefix
+        lines: list = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+
+        lines.append(f"# TYPE {prefix}_messages_dropped_total counter")
+        for reason, value in sorted(self.dropped.items()):
+            lines.append(
+                f'{prefix}_messages_dropped_total{{reason="{reason}"}} {value}'
+            )
+
+        for name, histogram in sorted(self.histograms.items()):
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + ("+Inf",), histogram.buckets):
+                cumulative += count
+                lines.append(f'{prefix}_{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{prefix}_{name}_sum {histogram.sum}")
+            lines.append(f"{prefix}_{name}_count {histogram.count}")
+
+        for name, func in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {func()}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Returns a one line summary of the metrics, for logging."""
+        parts: list = [
+            f"{name}={value}" for name, value in sorted(self.counters.items())
+        ]
+        parts.extend(
+            f"dropped_{reason}={value}"
+            for reason, value in sorted(self.dropped.items())
+        )
+        for name, histogram in sorted(self.histograms.items()):
+            parts.append(
+                f"{name}_p50={histogram.quantile(0.5)} "
+                f"{name}_p99={histogram.quantile(0.99)}"
+            )
+        parts.extend(f"{name}={func()}" for name, func in sorted(self.gauges.items()))
+        return " ".join(parts)
+
+    async def handle_http(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Responds to any HTTP request with the rendered metrics."""
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = self.render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(
+        self, host: str = stratuxcot.constants.DEFAULT_METRICS_HOST, port: int = 0
+    ) -> asyncio.AbstractServer:
+        """Starts serving metrics over HTTP on `host`:`port`."""
+        return await asyncio.start_server(self.handle_http, host, port)
+
+    async def log_every(self, interval: float, logger: logging.Logger) -> None:
+        """Logs a summary of the metrics every `interval` seconds."""
+        while 1:
+            await asyncio.sleep(interval)
+            logger.info("Metrics: %s", self.summary())
+
+
+class Backoff:
+    """
+    Jittered exponential backoff between reconnection attempts.
+
+    Each delay doubles the previous one, from `minimum` up to `maximum`, and is
+    randomized by up to half so receivers don't reconnect in lockstep.
+    """
+
+    def __init__(self, minimum: float = 0.5, maximum: float = 30) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.attempts: int = 0
+
+    def reset(self) -> None:
+        """Starts over from `minimum`, after a successful connection."""
+        self.attempts = 0
+
+    def delay(self) -> float:
+        """Returns the seconds to wait before the next attempt."""
+        delay = min(self.maximum, self.minimum * 2 ** min(self.attempts, 32))
+        self.attempts += 1
+        return delay * random.uniform(0.5, 1.0)
+
+
+class ConversionPool:
+    """
+    Offloads CoT conversion to a pool of worker processes or threads.
+
+    Traffic reports are sent to workers in batches, see
+    `stratuxcot.functions.convert_batch()`. Batch results are queued in the order
+    batches were sent and read back with `results()`, so CoT Events come out in the
+    same order as their traffic reports, for every ICAO.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        workers: int,
+        config: dict,
+        executor: str = stratuxcot.constants.DEFAULT_CONVERSION_EXECUTOR,
+        batch_size: int = 64,
+        identity_cache_size: int = 0,
+    ) -> None:
+        if executor not in stratuxcot.constants.CONVERSION_EXECUTORS:
+            raise ValueError(f"Unknown CONVERSION_EXECUTOR: {executor}")
+        if executor == "auto":
+            gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)
+            executor = "process" if gil_enabled() else "thread"
+        self.workers = workers
+        self.config = config
+        self.executor = executor
+        self.batch_size = batch_size
+        self.identity_cache_size = identity_cache_size
+        self._pool: Union[concurrent.futures.Executor, None] = None
+        self._pending: list = []
+        # Bounded, so message handling waits when the workers fall behind:
+        self._futures: asyncio.Queue = asyncio.Queue(workers * 2)
+
+    @classmethod
+    def from_config(cls, config: SectionProxy) -> Union["ConversionPool", None]:
+        """Returns a ConversionPool for `config`, or None if CONVERSION_WORKERS is 0."""
+        workers = int(
+            config.get(
+                "CONVERSION_WORKERS", stratuxcot.constants.DEFAULT_CONVERSION_WORKERS
+            )
+        )
+        if workers <= 0:
+            return None
+        return cls(
+            workers,
+            dict(config),
+            config.get(
+                "CONVERSION_EXECUTOR", stratuxcot.constants.DEFAULT_CONVERSION_EXECUTOR
+            )
+            .strip()
+            .lower(),
+            int(
+                config.get(
+                    "CONVERSION_BATCH_SIZE",
+                    stratuxcot.constants.DEFAULT_CONVERSION_BATCH_SIZE,
+                )
+            ),
+            int(
+                config.get(
+                    "IDENTITY_CACHE_SIZE",
+                    stratuxcot.constants.DEFAULT_IDENTITY_CACHE_SIZE,
+                )
+            ),
+        )
+
+    def start(self, known_craft_index: dict) -> None:
+        """
+        Starts the workers, sharing `known_craft_index` with them.
+
+        If already started, starts new workers for batches sent from now on, and
+        lets the old workers finish their batches before exiting.
+        """
+        executor_class = (
+            concurrent.futures.ProcessPoolExecutor
+            if self.executor == "process"
+            else concurrent.futures.ThreadPoolExecutor
+        )
+        pool, self._pool = self._pool, executor_class(
+            max_workers=self.workers,
+            initializer=stratuxcot.functions.init_conversion_worker,
+            initargs=(self.config, known_craft_index, self.identity_cache_size),
+        )
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def close(self) -> None:
+        """Stops the workers, without waiting for them."""
+        if self._pool is not None:
+            if sys.version_info >= (3, 9):
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            else:
+                # Batches already sent are still converted, their results unused.
+                self._pool.shutdown(wait=False)
+            self._pool = None
+
+    async def submit(self, craft: TrafficRecord, key: Union[str, None]) -> None:
+        """Adds a traffic report to the current batch, sending it if full."""
+        self._pending.append((craft, key))
+        if len(self._pending) >= self.batch_size:
+            await self.dispatch()
+
+    async def dispatch(self) -> None:
+        """Sends the current batch to the workers."""
+        if not self._pending:
+            return
+        items, self._pending = self._pending, []
+        future = asyncio.get_running_loop().run_in_executor(
+            self._pool, stratuxcot.functions.convert_batch, items
+        )
+        await self._futures.put(([craft.icao for craft, _ in items], future))
+
+    async def results(self) -> list:
+        """Returns the ICAOs & CoT Events of the oldest batch, once converted."""
+        icaos, future = await self._futures.get()
+        return list(zip(icaos, await future))
+
+
+class TxBuffer:
+    """
+    Puts CoT Events on the TX queue according to an overload `policy`.
+
+    * block: waits for room on the queue, slowing down message handling.
+    * drop_oldest: drops the oldest queued CoT Event to make room.
+    * coalesce: holds CoT Events that don't fit in a buffer keyed by craft, where
+      a newer CoT Event of a craft replaces its older one. `pump()` moves them to
+      the queue as room frees up, oldest first. Payloads without a craft, like
+      batches, can't be coalesced, so at most a queue's worth of them is held,
+      dropping the oldest.
+
+    With drop_oldest and coalesce, message handling never waits on the CoT
+    destination, so at most one queue's worth of CoT Events (plus one per craft,
+    or another queue's worth of batches) is ever waiting to be sent.
+    """
+
+    def __init__(
+        self,
+        queue: asyncio.Queue,
+        policy: str = stratuxcot.constants.DEFAULT_TX_QUEUE_POLICY,
+        metrics: Union[Metrics, None] = None,
+    ) -> None:
+        if policy not in stratuxcot.constants.TX_QUEUE_POLICIES:
+            raise ValueError(f"Unknown TX_QUEUE_POLICY: {policy}")
+        self.queue = queue
+        self.policy = policy
+        self.metrics = metrics if metrics is not None else Metrics()
+        # key: payload, of CoT Events waiting for room on the queue.
+        self.pending: OrderedDict = OrderedDict()
+        # Keys of the held back payloads without a key, oldest first.
+        self._unkeyed: deque = deque()
+        self._pending_event: asyncio.Event = asyncio.Event()
+        # Whether `pump()` is waiting to put a held back payload on the queue.
+        self._pumping: bool = False
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    async def put(self, payload: bytes, key=None) -> None:
+        """
+        Puts a CoT Event payload on the TX queue.
+
+        `key` identifies the craft of the CoT Event, for coalescing. Payloads without
+        a key, like batches, are never coalesced, but the oldest is dropped once a
+        queue's worth of them is held back.
+        """
+        queue = self.queue
+        if self.policy == "block":
+            await queue.put(payload)
+        elif self.policy == "drop_oldest":
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                    self.metrics.inc("tx_dropped")
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(payload)
+        elif not self.pending and not self._pumping and not queue.full():
+            queue.put_nowait(payload)
+        else:
+            if key is None:
+                if len(self._unkeyed) >= max(queue.maxsize, 1):
+                    del self.pending[self._unkeyed.popleft()]
+                    self.metrics.inc("tx_dropped")
+                key = object()
+                self._unkeyed.append(key)
+            elif key in self.pending:
+                self.metrics.inc("tx_coalesced")
+            # Replacing a value keeps its key's place in line:
+            self.pending[key] = payload
+            self._pending_event.set()
+
+    async def pump(self) -> None:
+        """Moves coalesced CoT Events to the TX queue as room frees up."""
+        while 1:
+            await self._pending_event.wait()
+            while self.pending:
+                key, payload = self.pending.popitem(last=False)
+                # Unkeyed payloads leave pending in the order they were held:
+                if self._unkeyed and key is self._unkeyed[0]:
+                    self._unkeyed.popleft()
+                # Newer payloads are held back until this one is queued, so a
+                # craft's CoT Events are never reordered:
+                self._pumping = True
+                try:
+                    await self.queue.put(payload)
+                finally:
+                    self._pumping = False
+            self._pending_event.clear()
+
+
 class StratuxWorker(pytak.QueueWorker):
     """Connects to Stratux ADS-B WebSocket."""
 
     def __init__(self, queue: asyncio.Queue, config: SectionProxy) -> None:
         super().__init__(queue, config)
-        self.known_craft_db: Union[dict, None] = None
+        self.known_craft_db: Union[list, None] = None
+        self.known_craft_index: dict = {}
+        self.known_craft_key: str = (
+            self.config.get(
+                "KNOWN_CRAFT_KEY", stratuxcot.constants.DEFAULT_KNOWN_CRAFT_KEY
+            )
+            .strip()
+            .upper()
+        )
+        self._tasks: list = []
+        self.filters: list = []
+        self.geofence: Union[Geofence, None] = None
+        self.predicates: list = stratuxcot.functions.compile_craft_predicates(
+            self.config
+        )
+        self.throttle: Union[EmitThrottle, None] = EmitThrottle.from_config(self.config)
+
+        identity_cache_size: int = int(
+            self.config.get(
+                "IDENTITY_CACHE_SIZE", stratuxcot.constants.DEFAULT_IDENTITY_CACHE_SIZE
+            )
+        )
+        self.identity_cache: Union[IdentityCache, None] = (
+            IdentityCache(identity_cache_size) if identity_cache_size > 0 else None
+        )
+
+        self.batch_window: float = float(
+            self.config.get(
+                "COT_BATCH_WINDOW", stratuxcot.constants.DEFAULT_COT_BATCH_WINDOW
+            )
+        )
+        self.batch_size: int = int(
+            self.config.get(
+                "COT_BATCH_SIZE", stratuxcot.constants.DEFAULT_COT_BATCH_SIZE
+            )
+        )
+        self._batch: list = []
+
+        self.cot_format: str = (
+            self.config.get("COT_FORMAT", stratuxcot.constants.DEFAULT_COT_FORMAT)
+            .strip()
+            .lower()
+        )
+        if self.cot_format not in stratuxcot.constants.COT_FORMATS:
+            raise ValueError(f"Unknown COT_FORMAT: {self.cot_format}")
+        # TAK Protocol messages are self-delimiting, XML events are newline separated:
+        self.batch_separator: bytes = b"\n" if self.cot_format == "xml" else b""
+
+        self.emit_mode: str = (
+            self.config.get("EMIT_MODE", stratuxcot.constants.DEFAULT_EMIT_MODE)
+            .strip()
+            .lower()
+        )
+        if self.emit_mode not in stratuxcot.constants.EMIT_MODES:
+            raise ValueError(f"Unknown EMIT_MODE: {self.emit_mode}")
+        self.snapshot_interval: float = float(
+            self.config.get(
+                "SNAPSHOT_INTERVAL", stratuxcot.constants.DEFAULT_SNAPSHOT_INTERVAL
+            )
+        )
+        self.metrics: Metrics = Metrics()
+        self._conversion_time: Histogram = self.metrics.histogram(
+            "conversion_seconds", stratuxcot.constants.CONVERSION_BUCKETS
+        )
+        self.metrics.gauge("queue_depth", self.queue.qsize)
+        self.connected: int = 0
+        self.metrics.gauge("connected", lambda: self.connected)
+        self._connect_time: Histogram = self.metrics.histogram(
+            "connect_seconds", stratuxcot.constants.CONNECT_BUCKETS
+        )
+        self._recovery_time: Histogram = self.metrics.histogram(
+            "recovery_seconds", stratuxcot.constants.CONNECT_BUCKETS
+        )
+        if self.identity_cache is not None:
+            cache = self.identity_cache
+            self.metrics.gauge("identity_cache_hits", lambda: cache.hits)
+            self.metrics.gauge("identity_cache_misses", lambda: cache.misses)
+
+        self.aircraft: AircraftTable = AircraftTable(
+            float(
+                self.config.get(
+                    "SNAPSHOT_MAX_AGE", stratuxcot.constants.DEFAULT_SNAPSHOT_MAX_AGE
+                )
+            )
+        )
+        self.metrics.gauge("aircraft", self.aircraft.__len__)
+        self.extrapolate_horizon: float = 0
+        if stratuxcot.functions.config_boolean(self.config, "EXTRAPOLATE"):
+            self.extrapolate_horizon = float(
+                self.config.get(
+                    "EXTRAPOLATE_HORIZON",
+                    stratuxcot.constants.DEFAULT_EXTRAPOLATE_HORIZON,
+                )
+            )
+
+        self.tx: TxBuffer = TxBuffer(
+            self.queue,
+            self.config.get(
+                "TX_QUEUE_POLICY", stratuxcot.constants.DEFAULT_TX_QUEUE_POLICY
+            )
+            .strip()
+            .lower(),
+            self.metrics,
+        )
+        self.metrics.gauge("tx_pending", self.tx.__len__)
+
+        self.deduplicator: Union[Deduplicator, None] = None
+
+        self.track_store: Union[TrackStore, None] = TrackStore.from_config(self.config)
+        self.track_store_replay: bool = stratuxcot.functions.config_boolean(
+            self.config, "TRACK_STORE_REPLAY", True
+        )
+        if self.track_store is not None:
+            store = self.track_store
+            self.metrics.gauge("track_store_pending", store.__len__)
+            self.metrics.gauge("track_store_written", lambda: store.written)
+            self.metrics.gauge("track_store_dropped", lambda: store.dropped)
+
+        self.conversion_pool: Union[ConversionPool, None] = ConversionPool.from_config(
+            self.config
+        )
+        self.conversion_window: float = float(
+            self.config.get(
+                "CONVERSION_BATCH_WINDOW",
+                stratuxcot.constants.DEFAULT_CONVERSION_BATCH_WINDOW,
+            )
+        )
+
+    def load_known_craft(self, known_craft: str) -> Tuple:
+        """
+        Reads & indexes a Known Craft file.
+
+        With KNOWN_CRAFT_CACHE set, the file is compiled to (or, if unchanged,
+        opened from) a `KnownCraftCache` instead of being parsed.
+
+        This blocks on file I/O & parsing, so when called from the event loop it
+        should be run in an executor.
+
+        Parameters
+        ----------
+        known_craft : `str`
+            Path to the Known Craft CSV.
+
+        Returns
+        -------
+        `tuple`
+            Known Craft rows (a `list` or `KnownCraftCache`) and their index on
+            `known_craft_key`.
+        """
+        cache: Union[str, None] = self.config.get("KNOWN_CRAFT_CACHE")
+        if cache:
+            known_craft_cache = KnownCraftCache.load(known_craft, cache)
+            return known_craft_cache, known_craft_cache.index(self.known_craft_key)
+
+        known_craft_db: list = stratuxcot.functions.known_craft_rows(
+            aircot.read_known_craft(known_craft)
+        )
+        known_craft_index: dict = stratuxcot.functions.index_known_craft(
+            known_craft_db, self.known_craft_key
+        )
+        return known_craft_db, known_craft_index
+
+    async def reload_known_craft(self, known_craft: str) -> bool:
+        """
+        Re-reads the Known Craft file in a thread and swaps in its new index.
+
+        Message handling keeps using the previous Known Craft data until the new
+        data is completely loaded. If the file can't be parsed, or comes back empty,
+        the previous data is kept.
+
+        Returns
+        -------
+        `bool`
+            True if the new Known Craft data was swapped in.
+        """
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            known_craft_db, known_craft_index = await loop.run_in_executor(
+                None, self.load_known_craft, known_craft
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            self._logger.error(
+                "Unable to reload KNOWN_CRAFT %s, keeping previous: %s",
+                known_craft,
+                exc,
+            )
+            return False
+
+        if not known_craft_db and self.known_craft_db:
+            self._logger.warning(
+                "KNOWN_CRAFT %s has no rows, keeping previous.", known_craft
+            )
+            return False
+
+        # Swapped together with no await between, so handle_data() never sees
+        # the rows of one load with the index of another.
+        self.known_craft_db, self.known_craft_index = known_craft_db, known_craft_index
+        if self.identity_cache is not None:
+            self.identity_cache.clear()
+        if self.conversion_pool is not None:
+            self.conversion_pool.start(known_craft_index)
+        self._logger.info(
+            "Reloaded KNOWN_CRAFT %s in %.3fs: %s rows, %s %s keys",
+            known_craft,
+            time.perf_counter() - start,
+            len(known_craft_db),
+            len(known_craft_index),
+            self.known_craft_key,
+        )
+        return True
+
+    async def watch_known_craft(self, known_craft: str, interval: float) -> None:
+        """Polls the Known Craft file every `interval` seconds, reloads on change."""
+        last_stat = _file_signature(known_craft)
+        while 1:
+            await asyncio.sleep(interval)
+            stat = _file_signature(known_craft)
+            if stat is None or stat == last_stat:
+                continue
+            last_stat = stat
+            await self.reload_known_craft(known_craft)
 
     async def handle_data(  # pylint: disable=too-many-return-statements
-        self, data: dict
+        self, data: Union[dict, TrafficRecord], source: Union[str, None] = None
     ) -> None:
-        """Processes Stratux Message"""
-        if not isinstance(data, dict):
-            self._logger.warning("Invalid aircraft data, should be a Python `dict`.")
+        """Processes Stratux Message, received from the Stratux at `source`."""
+        if isinstance(data, dict):
+            if not data:
+                self._logger.warning("Empty aircraft `dict`")
+                self.metrics.drop("invalid")
+                return
+            try:
+                data = TrafficRecord.from_dict(data)
+            except (TypeError, ValueError) as exc:
+                self._logger.warning("Invalid aircraft data: %s", exc)
+                self.metrics.drop("invalid")
+                return
+        elif not isinstance(data, TrafficRecord):
+            self._logger.warning(
+                "Invalid aircraft data, should be a Python `dict` or `TrafficRecord`."
+            )
+            self.metrics.drop("invalid")
             return
 
-        if not data:
-            self._logger.warning("Empty aircraft `dict`")
+        if not data.position_valid:
+            self.metrics.drop("no_position")
             return
 
-        if not data.get("Position_valid", True):
-            return
+        for reason, predicate in self.predicates:
+            if not predicate(data):
+                self.metrics.drop(reason)
+                return
 
-        icao: Union[str, None] = None
-        icao_int: str = data.get("Icao_addr", "")
-        if icao_int:
-            icao = aircot.icao_int_to_hex(icao_int)
-        else:
+        if self.geofence is not None and (
+            data.lat is None
+            or data.lon is None
+            or not self.geofence.contains(data.lat, data.lon)
+        ):
+            self.metrics.drop("geofence")
             return
 
-        if icao:
-            icao = icao.strip().upper()
-        else:
+        icao: str = data.icao
+        if not icao:
+            self.metrics.drop("invalid")
             return
 
         if "~" in icao and not self.config.getboolean("INCLUDE_TISB"):
+            self.metrics.drop("tisb")
             return
 
+        for craft_filter in self.filters:
+            if not craft_filter.allows(
+                stratuxcot.functions.get_craft_key(data, icao, craft_filter.key)
+            ):
+                self.metrics.drop("filtered")
+                return
+
         known_craft: Union[dict, None] = None
 
         if self.known_craft_db:
-            known_craft = (
-                list(
-                    filter(
-                        lambda x: x["HEX"].strip().upper() == icao,
-                        self.known_craft_db,
-                    )
-                )
-                or [{}]
-            )[0]
+            known_craft = self.known_craft_index.get(
+                stratuxcot.functions.get_craft_key(data, icao, self.known_craft_key)
+            )
             # self._logger.debug("known_craft='%s'", known_craft)
 
         # Skip if we're using known_craft CSV and this Craft isn't found:
@@ -93,41 +1785,580 @@ class StratuxWorker(pytak.QueueWorker):
             and not known_craft
             and not self.config.getboolean("INCLUDE_ALL_CRAFT")
         ):
+            self.metrics.drop("unknown_craft")
             return
 
-        event: Union[str, None] = stratuxcot.stratux_to_cot(
-            data, config=self.config, known_craft=known_craft
+        if self.deduplicator is not None and not self.deduplicator.accept(
+            icao, data, source
+        ):
+            self.metrics.drop("duplicate")
+            return
+
+        if self.track_store is not None:
+            self.track_store.add(icao, data)
+
+        if self.emit_mode == "snapshot":
+            self.aircraft.update(icao, data, known_craft)
+            return
+
+        if self.throttle is not None and not self.throttle.should_emit(icao, data):
+            self.metrics.drop("throttled")
+            return
+
+        self._logger.debug("Handling ICAO: %s", icao)
+        await self.emit_craft(data, known_craft)
+
+    async def emit_craft(
+        self, craft: TrafficRecord, known_craft: Union[dict, None] = None
+    ) -> None:
+        """Converts a traffic report to a CoT Event and emits it."""
+        if self.conversion_pool is not None:
+            key: Union[str, None] = None
+            if known_craft is not None:
+                key = stratuxcot.functions.get_craft_key(
+                    craft, craft.icao, self.known_craft_key
+                )
+            await self.conversion_pool.submit(craft, key)
+            return
+
+        start: float = time.perf_counter()
+        event: Union[bytes, None] = stratuxcot.functions.stratux_to_cot(
+            craft,
+            config=self.config,
+            known_craft=known_craft,
+            identity_cache=self.identity_cache,
         )
+        self._conversion_time.observe(time.perf_counter() - start)
 
         if not event:
             self._logger.debug("Empty COT Event")
+            self.metrics.drop("no_position")
             return
 
-        self._logger.debug("Handling ICAO: %s", icao)
-        await self.put_queue(event)
+        self.metrics.inc("events")
+
+        await self.emit(event, craft.icao)
+
+    async def emit_snapshot(self, now: Union[float, None] = None) -> None:
+        """
+        Emits a CoT Event for every live craft, after expiring old ones.
+
+        With EXTRAPOLATE, the positions of craft whose last fix is less than
+        `extrapolate_horizon` seconds old are dead-reckoned to now. Older craft are
+        sent at their last known position until they expire.
+        """
+        if now is None:
+            now = time.monotonic()
+        expired: int = self.aircraft.expire(now)
+        aircraft: list = self.aircraft.items()
+        self._logger.debug("Snapshot of %s craft (%s expired)", len(aircraft), expired)
+        horizon: float = self.extrapolate_horizon
+        for icao, (craft, known_craft, _) in aircraft:
+            if horizon > 0:
+                age: float = self.aircraft.age(icao, now)
+                if 0 < age <= horizon:
+                    craft = craft.extrapolate(age)
+                    if craft.extrapolated is not None:
+                        self.metrics.inc("extrapolated")
+            await self.emit_craft(craft, known_craft)
+        if self.conversion_pool is not None:
+            await self.conversion_pool.dispatch()
+        else:
+            await self.flush_batch()
+
+    def known_craft_of(self, craft: TrafficRecord) -> Union[dict, None]:
+        """Returns the Known Craft row of a craft, if any."""
+        if not self.known_craft_db:
+            return None
+        return self.known_craft_index.get(
+            stratuxcot.functions.get_craft_key(craft, craft.icao, self.known_craft_key)
+        )
+
+    async def warm_aircraft(self, now: Union[float, None] = None) -> int:
+        """
+        Fills the live aircraft table with the latest report of each craft in the
+        track store, received within the table's `max_age`. Returns how many.
+        """
+        if now is None:
+            now = time.time()
+        latest: list = await self.track_store.latest(now - self.aircraft.max_age)
+        monotonic: float = time.monotonic()
+        for icao, received, craft in latest:
+            self.aircraft.update(
+                icao, craft, self.known_craft_of(craft), monotonic - (now - received)
+            )
+        return len(latest)
+
+    async def replay_latest(self, now: Union[float, None] = None) -> int:
+        """
+        Emits the latest position of each craft in the track store, received within
+        the aircraft table's `max_age`, e.g. after reconnecting. Returns how many.
+
+        Craft received COT_STALE or more seconds ago are skipped, as their CoT Events
+        would already have gone stale.
+        """
+        if now is None:
+            now = time.time()
+        cot_stale = float(self.config.get("COT_STALE", pytak.DEFAULT_COT_STALE))
+        await self.track_store.flush(now)
+        latest: list = [
+            row
+            for row in await self.track_store.latest(now - self.aircraft.max_age)
+            if now - row[1] < cot_stale
+        ]
+        for _, _, craft in latest:
+            await self.emit_craft(craft, self.known_craft_of(craft))
+        if self.conversion_pool is not None:
+            await self.conversion_pool.dispatch()
+        else:
+            await self.flush_batch()
+        self.metrics.inc("replayed", len(latest))
+        return len(latest)
+
+    async def emit_snapshots(self) -> None:
+        """Emits a snapshot every `snapshot_interval` seconds."""
+        while 1:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.emit_snapshot()
+
+    async def dispatch_conversions(self) -> None:
+        """Sends the pending conversion batch every `conversion_window` seconds."""
+        while 1:
+            await asyncio.sleep(self.conversion_window)
+            await self.conversion_pool.dispatch()
+
+    async def emit_conversions(self) -> None:
+        """Emits the CoT Events converted by the conversion pool, in order."""
+        while 1:
+            events: list = await self.conversion_pool.results()
+            for icao, event in events:
+                if not event:
+                    self.metrics.drop("no_position")
+                    continue
+                self.metrics.inc("events")
+                await self.emit(event, icao)
+
+    async def emit(self, event: bytes, icao: Union[str, None] = None) -> None:
+        """
+        Puts a CoT Event on the TX queue, or into the current batch if batching.
+
+        The TX queue is written to according to TX_QUEUE_POLICY, see `TxBuffer`.
+
+        A batch is put on the queue as one payload, so it is written to the CoT
+        destination at once. As each event keeps its XML declaration (or TAK Protocol
+        header), batching is meant for stream (TCP/TLS) destinations, which parse
+        events one by one.
+        """
+        if self.batch_window <= 0:
+            await self.tx.put(event, icao)
+            return
+
+        self._batch.append(event)
+        if len(self._batch) >= self.batch_size:
+            await self.flush_batch()
+
+    async def flush_batch(self) -> None:
+        """Puts the CoT Events of the current batch on the TX queue as one payload."""
+        if not self._batch:
+            return
+        events, self._batch = self._batch, []
+        await self.tx.put(self.batch_separator.join(events))
+
+    async def flush_batches(self) -> None:
+        """Flushes the current batch every `batch_window` seconds."""
+        while 1:
+            await asyncio.sleep(self.batch_window)
+            await self.flush_batch()
+
+    def sources(self) -> list:
+        """Returns the Stratux WebSocket URLs to receive from, see `receive()`."""
+        return stratuxcot.functions.split_config_list(
+            self.config.get("STRATUX_WS", stratuxcot.constants.DEFAULT_STRATUX_WS)
+        )
 
     async def run(self, number_of_iterations=-1) -> None:
-        url: str = self.config.get("STRATUX_WS", stratuxcot.DEFAULT_STRATUX_WS)
+        urls: list = self.sources()
+
+        if not urls:
+            raise Exception(f"No Stratux specified for {self.__class__.__name__}.")
+
+        self._logger.info("Running %s for: %s", self.__class__, ", ".join(urls))
+
+        if len(urls) > 1:
+            dedup_window: float = float(
+                self.config.get(
+                    "DEDUP_WINDOW", stratuxcot.constants.DEFAULT_DEDUP_WINDOW
+                )
+            )
+            if dedup_window > 0:
+                self._logger.info(
+                    "Deduplicating reports of %s receivers within %ss",
+                    len(urls),
+                    dedup_window,
+                )
+                self.deduplicator = Deduplicator(dedup_window)
 
-        if not url or url == "":
-            raise Exception("No STRATUX_WS specified.")
+        filter_config: Union[str, None] = self.config.get("FILTER_CONFIG")
+        if filter_config:
+            self.filters = stratuxcot.functions.read_filter_config(filter_config)
+            self._logger.info("Using FILTER_CONFIG: %s %s", filter_config, self.filters)
 
-        self._logger.info("Running %s for: %s", self.__class__, url)
+        self.geofence = Geofence.from_config(self.config)
+        if self.geofence is not None:
+            self._logger.info("Using GEOFENCE: %s", self.geofence)
 
         known_craft: Union[str, None] = self.config.get("KNOWN_CRAFT")
         if known_craft:
-            self._logger.info("Using KNOWN_CRAFT: %s", known_craft)
-            self.known_craft_db = aircot.read_known_craft(known_craft)
+            self._logger.info(
+                "Using KNOWN_CRAFT: %s (KNOWN_CRAFT_KEY: %s)",
+                known_craft,
+                self.known_craft_key,
+            )
+            self.known_craft_db, self.known_craft_index = self.load_known_craft(
+                known_craft
+            )
+
+            reload_interval: float = float(
+                self.config.get(
+                    "KNOWN_CRAFT_RELOAD",
+                    stratuxcot.constants.DEFAULT_KNOWN_CRAFT_RELOAD,
+                )
+            )
+            if reload_interval > 0:
+                self._tasks.append(
+                    asyncio.ensure_future(
+                        self.watch_known_craft(known_craft, reload_interval)
+                    )
+                )
+
+        if self.tx.policy == "coalesce":
+            self._tasks.append(asyncio.ensure_future(self.tx.pump()))
+
+        if self.track_store is not None:
+            await self.track_store.open()
+            warmed: int = 0
+            if self.emit_mode == "snapshot":
+                warmed = await self.warm_aircraft()
+            self._logger.info(
+                "Using TRACK_STORE: %s, %s craft restored",
+                self.track_store.path,
+                warmed,
+            )
+            self._tasks.append(
+                asyncio.ensure_future(
+                    self.track_store.flush_every(
+                        float(
+                            self.config.get(
+                                "TRACK_STORE_INTERVAL",
+                                stratuxcot.constants.DEFAULT_TRACK_STORE_INTERVAL,
+                            )
+                        )
+                    )
+                )
+            )
+
+        if self.conversion_pool is not None:
+            self._logger.info(
+                "Converting with %s %s workers, in batches of up to %s",
+                self.conversion_pool.workers,
+                self.conversion_pool.executor,
+                self.conversion_pool.batch_size,
+            )
+            self.conversion_pool.start(self.known_craft_index)
+            self._tasks.append(asyncio.ensure_future(self.dispatch_conversions()))
+            self._tasks.append(asyncio.ensure_future(self.emit_conversions()))
+
+        if self.batch_window > 0:
+            self._logger.info(
+                "Batching up to %s CoT Events every %ss",
+                self.batch_size,
+                self.batch_window,
+            )
+            self._tasks.append(asyncio.ensure_future(self.flush_batches()))
+
+        if self.emit_mode == "snapshot":
+            self._logger.info(
+                "Emitting snapshots every %ss, of craft seen in the last %ss",
+                self.snapshot_interval,
+                self.aircraft.max_age,
+            )
+            if self.extrapolate_horizon > 0:
+                self._logger.info(
+                    "Extrapolating positions up to %ss", self.extrapolate_horizon
+                )
+            self._tasks.append(asyncio.ensure_future(self.emit_snapshots()))
+        elif self.extrapolate_horizon > 0:
+            self._logger.warning("EXTRAPOLATE needs EMIT_MODE = snapshot, ignoring.")
+
+        recorder: Union[TrafficRecorder, None] = None
+        record_file: Union[str, None] = self.config.get("RECORD_FILE")
+        if record_file:
+            self._logger.info("Recording Stratux messages to: %s", record_file)
+            recorder = TrafficRecorder(record_file)
+
+        decoder: str = self.config.get(
+            "JSON_DECODER", stratuxcot.constants.DEFAULT_JSON_DECODER
+        )
+        decode = stratuxcot.functions.get_json_decoder(decoder)
+        self._logger.info("Using JSON_DECODER: %s", decoder)
+
+        metrics_port: Union[str, None] = self.config.get("METRICS_PORT")
+        if metrics_port:
+            metrics_host: str = self.config.get(
+                "METRICS_HOST", stratuxcot.constants.DEFAULT_METRICS_HOST
+            )
+            await self.metrics.serve(metrics_host, int(metrics_port))
+            self._logger.info(
+                "Serving metrics on: http://%s:%s/metrics", metrics_host, metrics_port
+            )
+
+        metrics_interval: float = float(self.config.get("METRICS_INTERVAL") or 0)
+        if metrics_interval > 0:
+            self._tasks.append(
+                asyncio.ensure_future(
+                    self.metrics.log_every(metrics_interval, self._logger)
+                )
+            )
+
+        if self.track_store is not None and self.track_store_replay:
+            replayed: int = await self.replay_latest()
+            self._logger.info("Replayed the latest position of %s craft", replayed)
+
+        try:
+            await asyncio.gather(*(self.receive(url, decode, recorder) for url in urls))
+        finally:
+            if recorder is not None:
+                recorder.close()
+            if self.conversion_pool is not None:
+                self.conversion_pool.close()
+            if self.track_store is not None:
+                self.track_store.close()
+
+    async def receive(  # pylint: disable=too-many-locals
+        self,
+        url: str,
+        decode: Callable[[Union[str, bytes]], dict],
+        recorder: Union[TrafficRecorder, None] = None,
+    ) -> None:
+        """
+        Receives Stratux Messages from the Stratux WebSocket at `url`.
+
+        Reconnects on any connection failure, waiting a jittered exponential
+        backoff between attempts, which is reset once a message is received. With
+        WS_IDLE_TIMEOUT, also reconnects if no message arrives for that long, in
+        case the connection went half-open.
+        """
+        import websockets  # pylint: disable=import-outside-toplevel
+
+        def _option(option: str) -> float:
+            return float(
+                self.config.get(
+                    option, getattr(stratuxcot.constants, f"DEFAULT_{option}")
+                )
+            )
+
+        backoff = Backoff(_option("WS_BACKOFF_MIN"), _option("WS_BACKOFF_MAX"))
+        idle_timeout: Union[float, None] = _option("WS_IDLE_TIMEOUT") or None
+        open_timeout: float = _option("WS_OPEN_TIMEOUT")
+
+        # Checked once, so frames aren't passed to the logger unless debugging:
+        debug: bool = self._logger.isEnabledFor(logging.DEBUG)
+        metrics: Metrics = self.metrics
+        is_wanted_message = stratuxcot.functions.is_wanted_message
+        disconnected_at: Union[float, None] = None
 
         while 1:
+            start: float = time.perf_counter()
             try:
-                async with websockets.connect(url) as websocket:
+                async with websockets.connect(
+                    url, open_timeout=open_timeout
+                ) as websocket:
+                    connected_at: float = time.perf_counter()
+                    self._connect_time.observe(connected_at - start)
+                    if disconnected_at is not None:
+                        self._recovery_time.observe(connected_at - disconnected_at)
+                        disconnected_at = None
+                        if self.track_store is not None and self.track_store_replay:
+                            await self.replay_latest()
                     self._logger.info("Connected to: %s", url)
-                    async for message in websocket:
-                        self._logger.debug("message=%s", message)
-                        if message:
-                            j_event = json.loads(message)
-                            await self.handle_data(j_event)
-            except websockets.exceptions.ConnectionClosedError:
-                self._logger.warning("Websocket closed, reconnecting...")
-                await asyncio.sleep(2)
+                    self.connected += 1
+                    try:
+                        while 1:
+                            try:
+                                message = await asyncio.wait_for(
+                                    websocket.recv(), idle_timeout
+                                )
+                            except asyncio.TimeoutError:
+                                self._logger.warning(
+                                    "No messages from %s in %ss, reconnecting...",
+                                    url,
+                                    idle_timeout,
+                                )
+                                metrics.inc("idle_timeouts")
+                                break
+                            backoff.reset()
+                            if debug:
+                                self._logger.debug("message=%s", message)
+                            metrics.counters["messages_received"] += 1
+                            if recorder is not None:
+                                recorder.write(message)
+                            if not message or not is_wanted_message(message):
+                                metrics.drop("precheck")
+                                continue
+                            try:
+                                j_event = decode(message)
+                            except ValueError as exc:
+                                self._logger.debug(
+                                    "Invalid message from %s: %s", url, exc
+                                )
+                                metrics.drop("invalid")
+                                continue
+                            await self.handle_data(j_event, url)
+                    finally:
+                        self.connected -= 1
+            except (
+                websockets.exceptions.WebSocketException,
+                OSError,
+                asyncio.TimeoutError,
+            ) as exc:
+                delay: float = backoff.delay()
+                self._logger.warning(
+                    "Websocket %s failed (%s), reconnecting in %.1fs...",
+                    url,
+                    exc.__class__.__name__ if not str(exc) else exc,
+                    delay,
+                )
+                metrics.inc("reconnects")
+                if disconnected_at is None:
+                    disconnected_at = time.perf_counter()
+                await asyncio.sleep(delay)
+                continue
+
+            # Idle timeout, reconnect right away:
+            metrics.inc("reconnects")
+            disconnected_at = time.perf_counter()
+
+
+class GDL90Protocol(asyncio.DatagramProtocol):
+    """Puts received GDL90 datagrams on a queue, dropping them when it's full."""
+
+    def __init__(self, queue: asyncio.Queue, metrics: Metrics) -> None:
+        self.queue: asyncio.Queue = queue
+        self.metrics: Metrics = metrics
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            self.metrics.drop("overflow")
+
+
+class GDL90Worker(StratuxWorker):
+    """
+    Receives traffic from Stratux GDL90 over UDP, instead of the /traffic WebSocket.
+
+    GDL90 Traffic Reports are decoded straight into `TrafficRecord`s, and processed
+    like Stratux Websocket Messages.
+    """
+
+    def sources(self) -> list:
+        """Returns the host:port addresses to receive GDL90 on, see `receive()`."""
+        return stratuxcot.functions.split_config_list(
+            self.config.get("STRATUX_GDL90", stratuxcot.constants.DEFAULT_STRATUX_GDL90)
+        )
+
+    async def receive(
+        self,
+        url: str,
+        decode: Callable[[Union[str, bytes]], dict],
+        recorder: Union[TrafficRecorder, None] = None,
+    ) -> None:
+        """
+        Receives GDL90 datagrams on the host:port address `url`.
+
+        Only Traffic Reports are processed, frames failing their CRC check are
+        dropped. Recorded traffic reports are written as Stratux Websocket Messages,
+        so they can be replayed. `decode` is unused, GDL90 isn't JSON.
+        """
+        host, _, port = url.rpartition(":")
+        queue_size: int = int(
+            self.config.get(
+                "GDL90_QUEUE_SIZE", stratuxcot.constants.DEFAULT_GDL90_QUEUE_SIZE
+            )
+        )
+        queue: asyncio.Queue = asyncio.Queue(queue_size)
+        metrics: Metrics = self.metrics
+        gdl90_messages = stratuxcot.functions.gdl90_messages
+        gdl90_to_traffic_record = stratuxcot.functions.gdl90_to_traffic_record
+
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: GDL90Protocol(queue, metrics),
+            local_addr=(host or "0.0.0.0", int(port)),
+        )
+        self._logger.info("Receiving GDL90 on: %s", url)
+        self.connected += 1
+        try:
+            while 1:
+                datagram: bytes = await queue.get()
+                for message in gdl90_messages(datagram):
+                    if message is None:
+                        metrics.drop("crc")
+                        continue
+                    metrics.counters["messages_received"] += 1
+                    craft = gdl90_to_traffic_record(message)
+                    if craft is None:
+                        metrics.drop("precheck")
+                        continue
+                    if recorder is not None:
+                        recorder.write(json.dumps(craft.to_dict()))
+                    await self.handle_data(craft, url)
+        finally:
+            transport.close()
+            self.connected -= 1
+
+
+def _delta(value, last) -> float:
+    """Returns the absolute difference of two values, infinite if only one is None."""
+    if value is None or last is None:
+        return 0 if value is last else math.inf
+    return abs(value - last)
+
+
+def _in_circle(lat: float, lon: float, c_lat: float, c_lon: float, radius) -> bool:
+    """Returns True if `lat`, `lon` is within `radius` meters of `c_lat`, `c_lon`."""
+    d_y = (lat - c_lat) * stratuxcot.constants.METERS_PER_DEGREE
+    d_x = (
+        (lon - c_lon)
+        * stratuxcot.constants.METERS_PER_DEGREE
+        * math.cos(math.radians(c_lat))
+    )
+    return d_x * d_x + d_y * d_y <= radius * radius
+
+
+def _in_polygon(x: float, y: float, rings: list) -> bool:
+    """Returns True if `x`, `y` is inside the outer ring and outside any holes."""
+    inside = False
+    for ring_number, edges in enumerate(rings):
+        # Even-odd ray casting:
+        crossings = False
+        for x_1, y_1, x_2, y_2 in edges:
+            if (y_1 > y) != (y_2 > y) and x < x_1 + (y - y_1) * (x_2 - x_1) / (
+                y_2 - y_1
+            ):
+                crossings = not crossings
+        if ring_number == 0:
+            if not crossings:
+                return False
+            inside = True
+        elif crossings:
+            return False
+    return inside
+
+
+def _file_signature(path: str) -> Union[Tuple[int, int], None]:
+    """Returns the mtime & size of `path`, or None if it can't be stat'd."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
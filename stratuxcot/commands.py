@@ -18,15 +18,198 @@
 
 """PyTAK Command Line."""
 
-import pytak
+import sys
+
+from typing import List, Union
 
 __author__ = "Greg Albrecht W2GMD <oss@undef.net>"
 __copyright__ = "Copyright 2022 Greg Albrecht"
 __license__ = "Apache License, Version 2.0"
 
 
+def replay(argv: Union[List[str], None] = None) -> None:
+    """Serves a Stratux capture (see RECORD_FILE) on a local WebSocket."""
+    import argparse  # pylint: disable=import-outside-toplevel
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    import stratuxcot.classes  # pylint: disable=import-outside-toplevel
+    import stratuxcot.constants  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(
+        prog="stratuxcot replay",
+        description="Replays a Stratux capture, point STRATUX_WS at it.",
+    )
+    parser.add_argument("capture", help="Capture file, see RECORD_FILE")
+    parser.add_argument("--host", default=stratuxcot.constants.DEFAULT_REPLAY_HOST)
+    parser.add_argument(
+        "--port", type=int, default=stratuxcot.constants.DEFAULT_REPLAY_PORT
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Replay speed multiplier, 0 replays as fast as possible",
+    )
+    args = parser.parse_args(argv)
+
+    async def _serve() -> None:
+        server = stratuxcot.classes.ReplayServer(
+            args.capture, args.host, args.port, args.speed
+        )
+        await server.start()
+        print(f"Replaying {args.capture} on {server.url}")
+        await asyncio.Future()
+
+    asyncio.run(_serve())
+
+
+def compile_known_craft(argv: Union[List[str], None] = None) -> None:
+    """Compiles a Known Craft CSV into a KNOWN_CRAFT_CACHE file."""
+    import argparse  # pylint: disable=import-outside-toplevel
+    import time  # pylint: disable=import-outside-toplevel
+
+    import stratuxcot.functions  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(
+        prog="stratuxcot compile-known-craft",
+        description="Compiles a Known Craft CSV, point KNOWN_CRAFT_CACHE at it.",
+    )
+    parser.add_argument("known_craft", help="Known Craft CSV, see KNOWN_CRAFT")
+    parser.add_argument(
+        "-o", "--output", help="Cache file, defaults to the CSV's name plus .cache"
+    )
+    args = parser.parse_args(argv)
+    output: str = args.output or f"{args.known_craft}.cache"
+
+    start = time.perf_counter()
+    rows = stratuxcot.functions.compile_known_craft(args.known_craft, output)
+    print(
+        f"Compiled {rows} rows of {args.known_craft} to {output} "
+        f"in {time.perf_counter() - start:.3f}s"
+    )
+
+
+def convert(argv: Union[List[str], None] = None) -> None:
+    """Converts a Stratux capture (see RECORD_FILE) to a file of CoT Events."""
+    import argparse  # pylint: disable=import-outside-toplevel
+    import configparser  # pylint: disable=import-outside-toplevel
+    import time  # pylint: disable=import-outside-toplevel
+
+    import aircot  # pylint: disable=import-outside-toplevel
+
+    import stratuxcot.constants  # pylint: disable=import-outside-toplevel
+    import stratuxcot.functions  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(
+        prog="stratuxcot convert",
+        description="Converts a Stratux capture to a file of CoT Events.",
+        epilog='Requires NumPy 2 or later: python3 -m pip install "numpy>=2"',
+    )
+    parser.add_argument("capture", help="Capture file, see RECORD_FILE")
+    parser.add_argument(
+        "-o", "--output", default="-", help="CoT Events file, defaults to stdout"
+    )
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="Config file, for COT_STALE, COT_HOST_ID, UID_KEY & KNOWN_CRAFT",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=int(stratuxcot.constants.DEFAULT_CONVERT_BATCH_SIZE),
+        help="Messages converted at once",
+    )
+    args = parser.parse_args(argv)
+
+    config: dict = {}
+    if args.config:
+        config_parser = configparser.ConfigParser()
+        config_parser.optionxform = str
+        if not config_parser.read(args.config):
+            parser.error(f"Unable to read {args.config}")
+        if not config_parser.has_section("stratuxcot"):
+            parser.error(f"{args.config} has no [stratuxcot] section")
+        config = dict(config_parser["stratuxcot"])
+
+    known_craft_index: dict = {}
+    if config.get("KNOWN_CRAFT"):
+        known_craft_key: str = config.get(
+            "KNOWN_CRAFT_KEY", stratuxcot.constants.DEFAULT_KNOWN_CRAFT_KEY
+        )
+        known_craft_index = stratuxcot.functions.index_known_craft(
+            aircot.read_known_craft(config["KNOWN_CRAFT"]),
+            known_craft_key.strip().upper(),
+        )
+
+    decode = stratuxcot.functions.get_json_decoder()
+    output = (
+        sys.stdout.buffer
+        if args.output == "-"
+        else open(args.output, "wb")  # pylint: disable=consider-using-with
+    )
+    start = time.perf_counter()
+    messages = events = 0
+    try:
+        crafts: list = []
+        times: list = []
+        for received, message in stratuxcot.functions.read_capture(
+            args.capture, decode
+        ):
+            crafts.append(decode(message))
+            times.append(received)
+            if len(crafts) < args.batch_size:
+                continue
+            events += _write_events(output, crafts, config, known_craft_index, times)
+            messages += len(crafts)
+            crafts, times = [], []
+        if crafts:
+            events += _write_events(output, crafts, config, known_craft_index, times)
+            messages += len(crafts)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    print(
+        f"Converted {messages} messages of {args.capture} to {events} CoT Events "
+        f"in {time.perf_counter() - start:.3f}s",
+        file=sys.stderr,
+    )
+
+
+def _write_events(output, crafts: list, config: dict, known_craft_index, times) -> int:
+    """Converts a batch of Stratux Messages & writes their CoT Events, one per line."""
+    import stratuxcot.functions  # pylint: disable=import-outside-toplevel
+
+    events: list = [
+        event
+        for event in stratuxcot.functions.stratux_to_cot_batch(
+            crafts, config, known_craft_index, times
+        )
+        if event
+    ]
+    if events:
+        # Newline separated, each event after its XML declaration:
+        output.write(b"\n".join(events) + b"\n")
+    return len(events)
+
+
+# Subcommands of the stratuxcot command, anything else is handled by PyTAK.
+COMMANDS: dict = {
+    "replay": replay,
+    "compile-known-craft": compile_known_craft,
+    "convert": convert,
+}
+
+
 def main() -> None:
     """Main function."""
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
+    import pytak  # pylint: disable=import-outside-toplevel
+
     # PyTAK CLI tool boilerplate:
     pytak.cli(__name__.split(".")[0])
 
@@ -28,3 +28,174 @@ DEFAULT_COT_STALE: str = "120"
 
 # Default stratux Websocket URL
 DEFAULT_STRATUX_WS: str = "ws://stratux.local/traffic"
+
+# Seconds to wait before reconnecting to a Stratux, doubled (with jitter) after each
+# failed attempt, up to the maximum.
+DEFAULT_WS_BACKOFF_MIN: str = "0.5"
+DEFAULT_WS_BACKOFF_MAX: str = "30"
+
+# Seconds without a Stratux Message after which the WebSocket is reconnected, 0 to
+# disable. Stratux only sends traffic reports while there is traffic.
+DEFAULT_WS_IDLE_TIMEOUT: str = "0"
+
+# Seconds to wait for a Stratux WebSocket connection to open.
+DEFAULT_WS_OPEN_TIMEOUT: str = "10"
+
+# Upper bounds, in seconds, of the connect & recovery time histogram buckets.
+CONNECT_BUCKETS: tuple = (0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Seconds within which reports of a craft from different Stratux receivers are
+# deduplicated, when STRATUX_WS lists more than one.
+DEFAULT_DEDUP_WINDOW: str = "1"
+
+# Known Craft CSV columns indexed in a compiled Known Craft cache, see
+# KNOWN_CRAFT_CACHE.
+KNOWN_CRAFT_CACHE_KEYS: tuple = ("HEX", "REG", "FLIGHT")
+
+# Compiled Known Craft cache file signature & format version, and the separator of
+# a row's values.
+KNOWN_CRAFT_CACHE_MAGIC: bytes = b"STRXKC01"
+KNOWN_CRAFT_CACHE_SEPARATOR: str = "\x1f"
+
+# Default column of the KNOWN_CRAFT CSV used to look up craft.
+DEFAULT_KNOWN_CRAFT_KEY: str = "HEX"
+
+# TrafficRecord fields matched against each KNOWN_CRAFT_KEY column.
+# HEX is matched against the ICAO address, converted from `Icao_addr`.
+KNOWN_CRAFT_KEY_FIELDS: dict = {"REG": "reg", "FLIGHT": "tail"}
+
+# Seconds between checks of the KNOWN_CRAFT file for changes, 0 disables reloading.
+DEFAULT_KNOWN_CRAFT_RELOAD: str = "10"
+
+# FILTER_CONFIG sections, each is the Known Craft key its values are matched against.
+FILTER_KEYS: tuple = ("FLIGHT", "HEX", "REG")
+
+# Minimum seconds between CoT Events for the same craft, 0 disables rate limiting.
+DEFAULT_COT_MIN_INTERVAL: str = "0"
+
+# Dead-bands below which a change isn't considered visible in ATAK. Units are
+# meters, feet, degrees and knots. An empty value ignores that field.
+DEFAULT_COT_DEADBAND_POSITION: str = ""
+DEFAULT_COT_DEADBAND_ALT: str = ""
+DEFAULT_COT_DEADBAND_TRACK: str = ""
+DEFAULT_COT_DEADBAND_SPEED: str = ""
+
+# Maximum number of craft identities to cache, 0 disables the cache.
+DEFAULT_IDENTITY_CACHE_SIZE: str = "4096"
+
+# Seconds to collect CoT Events into one queue put, 0 disables batching.
+DEFAULT_COT_BATCH_WINDOW: str = "0"
+
+# Maximum number of CoT Events in one batch.
+DEFAULT_COT_BATCH_SIZE: str = "50"
+
+# Encoding of CoT Events: xml, or TAK Protocol Version 1 (protobuf) with mesh (UDP)
+# or stream (TCP/TLS) framing.
+DEFAULT_COT_FORMAT: str = "xml"
+COT_FORMATS: tuple = ("xml", "takproto-mesh", "takproto-stream")
+
+# TAK Protocol Version 1 headers: mesh messages start with magic, version & magic,
+# stream messages with magic & the varint length of the message.
+TAKPROTO_MAGIC: bytes = b"\xbf"
+TAKPROTO_MESH_HEADER: bytes = b"\xbf\x01\xbf"
+
+# JSON decoder for Stratux Messages: auto, orjson, msgspec or json (stdlib).
+# auto uses the fastest one installed.
+DEFAULT_JSON_DECODER: str = "auto"
+JSON_DECODERS: tuple = ("orjson", "msgspec", "json")
+
+# How CoT Events are emitted: stream (on every Stratux Message) or snapshot (every
+# live craft, every SNAPSHOT_INTERVAL seconds).
+DEFAULT_EMIT_MODE: str = "stream"
+EMIT_MODES: tuple = ("stream", "snapshot")
+
+# Seconds between snapshots in snapshot EMIT_MODE.
+DEFAULT_SNAPSHOT_INTERVAL: str = "5"
+
+# Seconds since its last position after which a craft is dropped from snapshots.
+DEFAULT_SNAPSHOT_MAX_AGE: str = "60"
+
+# Default address of the local Stratux capture replay WebSocket.
+DEFAULT_REPLAY_HOST: str = "127.0.0.1"
+DEFAULT_REPLAY_PORT: int = 8765
+
+# Upper bounds, in seconds, of the CoT conversion time histogram buckets.
+CONVERSION_BUCKETS: tuple = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.01,
+)
+
+# Default address of the metrics HTTP endpoint, if METRICS_PORT is set.
+DEFAULT_METRICS_HOST: str = "127.0.0.1"
+
+# Number of worker processes (or threads) CoT conversion is offloaded to. Set to 0 to
+# convert on the asyncio event loop.
+DEFAULT_CONVERSION_WORKERS: str = "0"
+
+# Conversion executor: process, thread or auto (thread on free-threaded Python builds).
+DEFAULT_CONVERSION_EXECUTOR: str = "auto"
+CONVERSION_EXECUTORS: tuple = ("auto", "process", "thread")
+
+# Traffic reports sent to the conversion executor at once, and the maximum seconds a
+# report waits for its batch to fill.
+DEFAULT_CONVERSION_BATCH_SIZE: str = "64"
+DEFAULT_CONVERSION_BATCH_WINDOW: str = "0.05"
+
+# What to do when the TX queue is full: block (wait for room), drop_oldest (drop the
+# oldest queued CoT Event) or coalesce (keep only the latest CoT Event of each craft
+# waiting for room).
+DEFAULT_TX_QUEUE_POLICY: str = "drop_oldest"
+TX_QUEUE_POLICIES: tuple = ("block", "drop_oldest", "coalesce")
+
+# Size, in degrees, of the grid cells GEOFENCE shapes are indexed on.
+DEFAULT_GEOFENCE_CELL: str = "0.25"
+
+# Meters per degree of latitude.
+METERS_PER_DEGREE: float = 111_319.49
+
+# Seconds after its last position fix a craft's position is extrapolated for, with
+# EXTRAPOLATE enabled.
+DEFAULT_EXTRAPOLATE_HORIZON: str = "30"
+
+# Meters per second per knot.
+KNOTS_TO_METERS_PER_SECOND: float = 0.514444
+
+# Address (host:port) to receive Stratux GDL90 on, instead of STRATUX_WS. Stratux
+# sends GDL90 to UDP port 4000.
+DEFAULT_STRATUX_GDL90: str = "0.0.0.0:4000"
+
+# GDL90 framing: flag byte, control-escape byte & the XOR applied to escaped bytes.
+GDL90_FLAG: int = 0x7E
+GDL90_ESCAPE: int = 0x7D
+GDL90_ESCAPE_XOR: int = 0x20
+
+# GDL90 message IDs.
+GDL90_HEARTBEAT: int = 0
+GDL90_OWNSHIP_REPORT: int = 10
+GDL90_TRAFFIC_REPORT: int = 20
+
+# GDL90 Traffic Report Address Type: Stratux TargetType.
+GDL90_TARGET_TYPES: dict = {0: 1, 1: 1, 2: 3, 3: 4}
+
+# Decoded GDL90 messages waiting to be processed, per STRATUX_GDL90 address.
+DEFAULT_GDL90_QUEUE_SIZE: str = "1024"
+
+# Stratux Messages converted at once by the convert command.
+DEFAULT_CONVERT_BATCH_SIZE: str = "10000"
+
+# Seconds of traffic reports kept in the TRACK_STORE, per craft.
+DEFAULT_TRACK_STORE_RETENTION: str = "600"
+
+# Seconds between batched writes to the TRACK_STORE.
+DEFAULT_TRACK_STORE_INTERVAL: str = "1"
+
+# Maximum traffic reports waiting to be written to the TRACK_STORE, further reports
+# aren't stored.
+DEFAULT_TRACK_STORE_MAX_PENDING: str = "10000"
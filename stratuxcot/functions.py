@@ -19,15 +19,32 @@
 """StratuxCOT Gateway Functions."""
 
 
+import array
+import datetime
+import fnmatch
+import hashlib
+import importlib
+import json
+import math
+import operator
+import os
+import re
+import struct
+import sys
+import threading
 import xml.etree.ElementTree as ET
 
 from configparser import ConfigParser
-from typing import Union, Set
+from typing import TYPE_CHECKING, Callable, Iterator, Tuple, Union, Set
 from urllib.parse import ParseResult, urlparse
 
 import aircot
 import pytak
 import stratuxcot
+import stratuxcot.constants
+
+if TYPE_CHECKING:
+    import numpy  # Optional, see `stratux_to_cot_batch()`.
 
 __author__ = "Greg Albrecht W2GMD <oss@undef.net>"
 __copyright__ = "Copyright 2022 Greg Albrecht"
@@ -52,6 +69,9 @@ def create_tasks(
     `set`
         Set of PyTAK Worker classes for this application.
     """
+    if config.get("STRATUX_GDL90"):
+        return set([stratuxcot.GDL90Worker(clitool.tx_queue, config)])
+
     stratux_ws: ParseResult = urlparse(config.get("STRATUX_WS"))
 
     message_worker = stratuxcot.StratuxWorker(clitool.tx_queue, config)
@@ -60,17 +80,562 @@ def create_tasks(
     return set([message_worker])
 
 
-def stratux_to_cot_xml(  # NOQA pylint: disable=too-many-locals,too-many-branches,too-many-statements
-    craft: dict, config: Union[dict, None] = None, known_craft: Union[dict, None] = None
-) -> Union[ET.Element, None]:
+def get_json_decoder(name: str = "auto") -> Callable[[Union[str, bytes]], dict]:
     """
-    Transforms Stratux Websocket Messages to a Cursor-on-Target PLI Events.
+    Returns a function that decodes a JSON Stratux Message.
+
+    Parameters
+    ----------
+    name : `str`
+        One of orjson, msgspec, json (stdlib) or auto, which picks the first of
+        these that's installed.
+
+    Returns
+    -------
+    `Callable`
+        Decoder accepting `str` or `bytes`.
     """
-    lat = craft.get("Lat")
-    lon = craft.get("Lng")
-    if lat is None or lon is None:
-        return None
+    name = (name or "auto").strip().lower()
+    if name == "auto":
+        candidates = stratuxcot.constants.JSON_DECODERS
+    elif name in stratuxcot.constants.JSON_DECODERS:
+        candidates = (name,)
+    else:
+        raise ValueError(f"Unknown JSON_DECODER: {name}")
+
+    for candidate in candidates:
+        try:
+            module = importlib.import_module(candidate)
+        except ImportError:
+            if name != "auto":
+                raise
+            continue
+        if candidate == "orjson":
+            return module.loads
+        if candidate == "msgspec":
+            return module.json.Decoder().decode
+    return json.loads
+
+
+# Stratux (Go encoding/json) output has no whitespace between keys & values.
+_INVALID_MESSAGE_MARKERS: tuple = ('"Position_valid":false', '"Icao_addr":0,')
+_INVALID_MESSAGE_MARKERS_B: tuple = tuple(
+    marker.encode() for marker in _INVALID_MESSAGE_MARKERS
+)
+
+
+def is_wanted_message(message: Union[str, bytes]) -> bool:
+    """
+    Cheap check of a raw JSON Stratux Message, before it's decoded.
+
+    Returns False for messages `StratuxWorker.handle_data()` would drop anyway:
+    those without a valid position or without an ICAO address. Messages
+    formatted differently than Stratux's own output pass, and are checked
+    again after decoding.
+    """
+    if isinstance(message, bytes):
+        markers = _INVALID_MESSAGE_MARKERS_B
+    else:
+        markers = _INVALID_MESSAGE_MARKERS
+    for marker in markers:
+        if marker in message:
+            return False
+    return True
+
+
+def open_capture(capture: str, mode: str = "rt"):
+    """Opens a Stratux capture file, gzip compressed if its name ends in `.gz`."""
+    if capture.endswith(".gz"):
+        import gzip  # pylint: disable=import-outside-toplevel
+
+        return gzip.open(capture, mode, encoding="UTF-8")
+    return open(capture, mode, encoding="UTF-8")  # pylint: disable=consider-using-with
+
+
+def read_capture(
+    capture: str, decode: Callable[[Union[str, bytes]], dict] = json.loads
+) -> Iterator[Tuple[float, str]]:
+    """
+    Reads a Stratux capture file, as written by `stratuxcot.classes.TrafficRecorder`.
+
+    Parameters
+    ----------
+    capture : `str`
+        Path to the JSONL capture, gzip compressed if its name ends in `.gz`.
+    decode : `Callable`
+        JSON decoder for the capture's lines, see `get_json_decoder()`.
+
+    Returns
+    -------
+    `Iterator`
+        (UNIX time received, raw Stratux Websocket Message) of each message.
+    """
+    with open_capture(capture) as capture_fd:
+        for line in capture_fd:
+            if line.strip():
+                entry = decode(line)
+                yield entry["time"], entry["message"]
+
+
+def known_craft_rows(known_craft_db: Union[dict, list, None]) -> list:
+    """
+    Returns the rows of Known Craft data read by `aircot.read_known_craft()`.
+
+    aircot 4 returns a `dict` of the rows and its own indexes, older versions a
+    `list` of rows.
+    """
+    if isinstance(known_craft_db, dict):
+        return known_craft_db.get("rows") or []
+    return known_craft_db or []
+
+
+def index_known_craft(
+    known_craft_db: Union[dict, list, None], key: str = "HEX"
+) -> dict:
+    """
+    Builds a lookup index of Known Craft rows, keyed on the normalized `key` column.
+
+    Parameters
+    ----------
+    known_craft_db : `list`
+        Known Craft rows, or the data returned by `aircot.read_known_craft()`.
+    key : `str`
+        Known Craft CSV column to index, one of HEX, REG or FLIGHT.
+
+    Returns
+    -------
+    `dict`
+        Known Craft rows keyed on the stripped & upper-cased `key` column. If more
+        than one row shares a key, the first row wins.
+    """
+    index: dict = {}
+    for row in known_craft_rows(known_craft_db):
+        value = row.get(key)
+        if value:
+            index.setdefault(value.strip().upper(), row)
+    return index
+
+
+def file_sha256(path: str) -> bytes:
+    """Returns the SHA-256 digest of the file at `path`."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_fd:
+        for chunk in iter(lambda: file_fd.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def compile_known_craft(
+    known_craft: str,
+    cache: str,
+    keys: tuple = stratuxcot.constants.KNOWN_CRAFT_CACHE_KEYS,
+) -> int:
+    """
+    Compiles a Known Craft CSV into a cache file, see `KnownCraftCache`.
+
+    Columns without a name (like the trailing `,,` of example-known_craft.csv)
+    are left out. The cache is written to a temporary file and renamed into place,
+    so a cache that's in use is never modified.
+
+    Parameters
+    ----------
+    known_craft : `str`
+        Path to the Known Craft CSV.
+    cache : `str`
+        Path to write the cache to.
+    keys : `tuple`
+        Columns to index, on their stripped & upper-cased values. If more than one
+        row shares a key, the first row wins, as with `index_known_craft()`.
+
+    Returns
+    -------
+    `int`
+        Number of rows compiled.
+    """
+    sha256: bytes = file_sha256(known_craft)
+    known_craft_db: list = known_craft_rows(aircot.read_known_craft(known_craft))
+
+    columns: list = []
+    for row in known_craft_db:
+        for column in row:
+            if column and column not in columns:
+                columns.append(column)
+
+    rows = bytearray()
+    row_offsets = array.array("I", [0])
+    for row in known_craft_db:
+        rows += stratuxcot.constants.KNOWN_CRAFT_CACHE_SEPARATOR.join(
+            (row.get(column) or "") for column in columns
+        ).encode("UTF-8")
+        row_offsets.append(len(rows))
+
+    sections: list = [bytes(rows), row_offsets.tobytes()]
+    indexes: dict = {}
+    for key in keys:
+        index: dict = {}
+        for row_number, row in enumerate(known_craft_db):
+            value = (row.get(key) or "").strip().upper()
+            if value:
+                index.setdefault(value.encode("UTF-8"), row_number)
+        key_blob = bytearray()
+        key_offsets = array.array("I", [0])
+        row_numbers = array.array("I")
+        for value in sorted(index):
+            key_blob += value
+            key_offsets.append(len(key_blob))
+            row_numbers.append(index[value])
+        indexes[key] = len(index)
+        sections.extend([bytes(key_blob), key_offsets.tobytes(), row_numbers.tobytes()])
 
+    # Sections are 4 byte aligned, so their arrays can be cast in place:
+    offsets: list = []
+    body = bytearray()
+    for section in sections:
+        body += b"\0" * (-len(body) % 4)
+        offsets.append((len(body), len(section)))
+        body += section
+
+    header: bytes = json.dumps(
+        {
+            "sha256": sha256.hex(),
+            "byteorder": sys.byteorder,
+            "columns": columns,
+            "rows": len(known_craft_db),
+            "indexes": indexes,
+            "sections": offsets,
+        }
+    ).encode("UTF-8")
+    header += b" " * (-len(header) % 4)
+
+    temp = f"{cache}.{os.getpid()}.tmp"
+    with open(temp, "wb") as cache_fd:
+        cache_fd.write(stratuxcot.constants.KNOWN_CRAFT_CACHE_MAGIC)
+        cache_fd.write(len(header).to_bytes(4, "little"))
+        cache_fd.write(header)
+        cache_fd.write(body)
+    os.replace(temp, cache)
+    return len(known_craft_db)
+
+
+def get_craft_key(
+    craft: "stratuxcot.classes.TrafficRecord", icao: str, key: str = "HEX"
+) -> str:
+    """
+    Returns the normalized value of a Stratux Message for a Known Craft key.
+
+    Parameters
+    ----------
+    craft : `stratuxcot.classes.TrafficRecord`
+        Parsed Stratux Websocket Message.
+    icao : `str`
+        ICAO HEX address of the craft, as converted from `Icao_addr`.
+    key : `str`
+        Known Craft CSV column, one of HEX, REG or FLIGHT.
+
+    Returns
+    -------
+    `str`
+        Stripped & upper-cased value, or an empty string if the craft has none.
+    """
+    if key == "HEX":
+        return icao
+    field = stratuxcot.constants.KNOWN_CRAFT_KEY_FIELDS.get(key)
+    if field is None:
+        return ""
+    return getattr(craft, field)
+
+
+def config_boolean(
+    config: Union[dict, None], option: str, default: bool = False
+) -> bool:
+    """
+    Returns a boolean config option, parsed like `ConfigParser.getboolean()`.
+
+    Works on plain `dict` configs too, which PyTAK uses for empty config sections.
+    """
+    value = (config or {}).get(option)
+    if value in (None, ""):
+        return default
+    return str(value).strip().lower() in ("1", "yes", "true", "on")
+
+
+def split_config_list(value: Union[str, None]) -> list:
+    """Splits a comma and/or whitespace separated config value into a list."""
+    return [item for item in re.split(r"[,\s]+", value or "") if item]
+
+
+def compile_filter_values(values: str) -> tuple:
+    """
+    Compiles a FILTER_CONFIG value list into a frozenset and a glob regex.
+
+    Parameters
+    ----------
+    values : `str`
+        Comma and/or whitespace separated values, which may contain glob patterns
+        (`*`, `?`, `[...]`), e.g. `AAF617, A1C1A0, N12*`.
+
+    Returns
+    -------
+    `tuple`
+        frozenset of the exact values, and a compiled regex matching any of the
+        glob patterns (or None if there are none). All are upper-cased.
+    """
+    exact = set()
+    patterns = []
+    for value in split_config_list(values):
+        value = value.upper()
+        if any(char in value for char in "*?["):
+            patterns.append(fnmatch.translate(value))
+        else:
+            exact.add(value)
+    pattern = re.compile("|".join(patterns)) if patterns else None
+    return frozenset(exact), pattern
+
+
+def read_filter_config(filter_config: str) -> list:
+    """
+    Reads a FILTER_CONFIG file into a list of `CraftFilter`.
+
+    Parameters
+    ----------
+    filter_config : `str`
+        Path to an INI file with [FLIGHT], [HEX] and/or [REG] sections, each with
+        optional `include` and `exclude` value lists. See example-filters.ini
+
+    Returns
+    -------
+    `list`
+        A `stratuxcot.classes.CraftFilter` per section with values set.
+    """
+    import stratuxcot.classes  # pylint: disable=import-outside-toplevel,cyclic-import
+
+    parser = ConfigParser()
+    with open(filter_config, encoding="UTF-8") as filter_fd:
+        parser.read_file(filter_fd)
+
+    filters: list = []
+    for section in parser.sections():
+        key = section.strip().upper()
+        if key not in stratuxcot.constants.FILTER_KEYS:
+            raise ValueError(f"Unknown FILTER_CONFIG section: [{section}]")
+        include, include_pattern = compile_filter_values(
+            parser.get(section, "include", fallback="")
+        )
+        exclude, exclude_pattern = compile_filter_values(
+            parser.get(section, "exclude", fallback="")
+        )
+        if include or include_pattern or exclude or exclude_pattern:
+            filters.append(
+                stratuxcot.classes.CraftFilter(
+                    key, include, exclude, include_pattern, exclude_pattern
+                )
+            )
+    return filters
+
+
+def _band_predicate(
+    field: str, minimum: Union[float, None], maximum: Union[float, None]
+) -> Callable:
+    """Returns a predicate of `field` being set and within `minimum`..`maximum`."""
+    getter = operator.attrgetter(field)
+    low: float = -math.inf if minimum is None else minimum
+    high: float = math.inf if maximum is None else maximum
+
+    def _predicate(craft) -> bool:
+        value = getter(craft)
+        return value is not None and low <= value <= high
+
+    return _predicate
+
+
+def compile_craft_predicates(config: Union[dict, None]) -> list:
+    """
+    Compiles the attribute filter options of `config` into a predicate chain.
+
+    Options: ALT_MIN & ALT_MAX (feet), SPEED_MIN & SPEED_MAX (knots), NACP_MIN,
+    INCLUDE_GROUND, EXCLUDE_CATEGORIES (Emitter_category values) & MAX_AGE
+    (seconds). Craft missing a field are dropped by that field's bounds.
+
+    Returns
+    -------
+    `list`
+        (drop reason, predicate) pairs, where each predicate takes a
+        `stratuxcot.classes.TrafficRecord` and returns False to drop it. Only set
+        options get a predicate, cheapest first.
+    """
+    config = config or {}
+    predicates: list = []
+
+    def _option(option: str) -> Union[float, None]:
+        value = config.get(option)
+        return float(value) if value not in (None, "") else None
+
+    if not config_boolean(config, "INCLUDE_GROUND", True):
+        predicates.append(("on_ground", lambda craft: not craft.on_ground))
+
+    exclude_categories: frozenset = frozenset(
+        int(category)
+        for category in split_config_list(config.get("EXCLUDE_CATEGORIES"))
+    )
+    if exclude_categories:
+        predicates.append(
+            (
+                "category",
+                lambda craft: craft.emitter_category not in exclude_categories,
+            )
+        )
+
+    for reason, field, minimum, maximum in (
+        ("alt", "alt", _option("ALT_MIN"), _option("ALT_MAX")),
+        ("speed", "speed", _option("SPEED_MIN"), _option("SPEED_MAX")),
+        ("nacp", "nacp", _option("NACP_MIN"), None),
+    ):
+        if minimum is not None or maximum is not None:
+            predicates.append((reason, _band_predicate(field, minimum, maximum)))
+
+    max_age = _option("MAX_AGE")
+    if max_age is not None:
+        predicates.append(
+            ("max_age", lambda craft: craft.age is None or craft.age <= max_age)
+        )
+
+    return predicates
+
+
+def _geojson_polygons(geojson: dict) -> Iterator[list]:
+    """Yields the rings of every Polygon in a GeoJSON object, as [(lon, lat)]."""
+    kind = geojson.get("type")
+    if kind == "FeatureCollection":
+        for feature in geojson.get("features", []):
+            yield from _geojson_polygons(feature)
+    elif kind == "Feature":
+        yield from _geojson_polygons(geojson.get("geometry") or {})
+    elif kind == "GeometryCollection":
+        for geometry in geojson.get("geometries", []):
+            yield from _geojson_polygons(geometry)
+    elif kind == "Polygon":
+        yield [[tuple(point[:2]) for point in ring] for ring in geojson["coordinates"]]
+    elif kind == "MultiPolygon":
+        for polygon in geojson["coordinates"]:
+            yield [[tuple(point[:2]) for point in ring] for ring in polygon]
+
+
+def _kml_ring(element: ET.Element) -> list:
+    """Returns the (lon, lat) points of a KML boundary's `coordinates`."""
+    for child in element.iter():
+        if child.tag.rsplit("}", 1)[-1] == "coordinates":
+            return [
+                tuple(float(value) for value in point.split(",")[:2])
+                for point in (child.text or "").split()
+            ]
+    return []
+
+
+def read_geofence(geofence: str) -> list:
+    """
+    Reads the polygons of a GeoJSON or KML geofence file.
+
+    Parameters
+    ----------
+    geofence : `str`
+        Path to a GeoJSON (Polygon & MultiPolygon geometries) or KML (Polygon
+        placemarks) file. KML is detected by the .kml extension.
+
+    Returns
+    -------
+    `list`
+        Polygons, each a list of rings of (lon, lat) points: the outer boundary,
+        followed by any holes.
+    """
+    if not geofence.lower().endswith(".kml"):
+        with open(geofence, encoding="UTF-8") as geofence_fd:
+            return list(_geojson_polygons(json.load(geofence_fd)))
+
+    polygons: list = []
+    for element in ET.parse(geofence).iter():
+        if element.tag.rsplit("}", 1)[-1] != "Polygon":
+            continue
+        outer: list = []
+        inner: list = []
+        for boundary in element:
+            tag = boundary.tag.rsplit("}", 1)[-1]
+            if tag == "outerBoundaryIs":
+                outer = _kml_ring(boundary)
+            elif tag == "innerBoundaryIs":
+                inner.append(_kml_ring(boundary))
+        if outer:
+            polygons.append([outer] + inner)
+    return polygons
+
+
+def read_geofence_circles(circles: str) -> list:
+    """
+    Parses a GEOFENCE_CIRCLE value into a list of (lat, lon, radius) tuples.
+
+    Parameters
+    ----------
+    circles : `str`
+        Semicolon separated circles, each `lat, lon, radius` with the radius in
+        meters, e.g. `37.46, -122.26, 20000; 38.1, -122.5, 5000`.
+    """
+    parsed: list = []
+    for circle in (circles or "").split(";"):
+        if not circle.strip():
+            continue
+        try:
+            lat, lon, radius = (float(value) for value in circle.split(","))
+        except ValueError as exc:
+            raise ValueError(f"Invalid GEOFENCE_CIRCLE: {circle.strip()}") from exc
+        parsed.append((lat, lon, radius))
+    return parsed
+
+
+def dead_reckon(
+    lat: float, lon: float, track: float, speed: float, seconds: float
+) -> Tuple[float, float]:
+    """
+    Projects a position forward along a constant track & speed.
+
+    Uses a flat earth approximation, which is accurate enough over the few
+    minutes a craft is extrapolated for.
+
+    Parameters
+    ----------
+    lat, lon : `float`
+        Position, in degrees.
+    track : `float`
+        True track, in degrees.
+    speed : `float`
+        Ground speed, in knots.
+    seconds : `float`
+        Time to project forward.
+
+    Returns
+    -------
+    `tuple`
+        Projected latitude & longitude, in degrees.
+    """
+    distance: float = speed * stratuxcot.constants.KNOTS_TO_METERS_PER_SECOND * seconds
+    track_rad: float = math.radians(track)
+    meters_per_degree: float = stratuxcot.constants.METERS_PER_DEGREE
+    new_lat: float = lat + distance * math.cos(track_rad) / meters_per_degree
+    new_lon: float = lon + distance * math.sin(track_rad) / (
+        meters_per_degree * max(math.cos(math.radians(lat)), 1e-6)
+    )
+    return max(-90.0, min(90.0, new_lat)), (new_lon + 180) % 360 - 180
+
+
+def stratux_to_cot_identity(  # NOQA pylint: disable=too-many-locals,too-many-branches,too-many-statements
+    craft: "stratuxcot.classes.TrafficRecord",
+    config: Union[dict, None] = None,
+    known_craft: Union[dict, None] = None,
+) -> Union[dict, None]:
+    """
+    Transforms a Stratux traffic report into the identity fields of a CoT Event.
+
+    These only depend on the `TrafficRecord.identity_key()` fields of the craft,
+    its Known Craft data and `config`, so can be cached between messages.
+    """
     remarks_fields = []
     known_craft: dict = known_craft or {}
     config: dict = config or {}
@@ -78,47 +643,45 @@ def stratux_to_cot_xml(  # NOQA pylint: disable=too-many-locals,too-many-branche
     tisb: bool = False
 
     uid_key = config.get("UID_KEY", "ICAO")
-    cot_stale = int(config.get("COT_STALE", pytak.DEFAULT_COT_STALE))
     cot_host_id = config.get("COT_HOST_ID", pytak.DEFAULT_HOST_ID)
 
-    aircotx = ET.Element("_aircot_")
-    aircotx.set("cot_host_id", cot_host_id)
+    aircot_attrs: list = [("cot_host_id", cot_host_id)]
 
-    icao_hex = aircot.icao_int_to_hex(craft.get("Icao_addr"))
-    flight: str = craft.get("Tail", "")
-    reg: str = craft.get("Reg", "")
-    cat: str = str(craft.get("Emitter_category", ""))
-    squawk: str = str(craft.get("Squawk", ""))
-    target_type: int = craft.get("TargetType")
+    icao_hex = craft.icao
+    flight: str = craft.tail
+    reg: str = craft.reg
+    cat: str = "" if craft.emitter_category is None else str(craft.emitter_category)
+    squawk: str = "" if craft.squawk is None else str(craft.squawk)
+    target_type: int = craft.target_type
 
     if flight:
         flight = flight.strip().upper()
         remarks_fields.append(flight)
-        aircotx.set("flight", flight)
+        aircot_attrs.append(("flight", flight))
 
     if reg:
         reg = reg.strip().upper()
         remarks_fields.append(reg)
-        aircotx.set("reg", reg)
+        aircot_attrs.append(("reg", reg))
 
     if squawk:
         squawk = squawk.strip().upper()
         remarks_fields.append(f"Squawk: {squawk}")
-        aircotx.set("squawk", squawk)
+        aircot_attrs.append(("squawk", squawk))
 
     if icao_hex:
         icao_hex = icao_hex.strip().upper()
         remarks_fields.append(icao_hex)
-        aircotx.set("icao", icao_hex)
+        aircot_attrs.append(("icao", icao_hex))
 
     if cat:
         cat = cat.strip().upper()
         category = aircot.set_category(cat, known_craft)
         remarks_fields.append(f"Cat.: {category}")
-        aircotx.set("cat", category)
+        aircot_attrs.append(("cat", category))
 
     if target_type:
-        aircotx.set("target_type", str(target_type))
+        aircot_attrs.append(("target_type", str(target_type)))
         target_type_name: Union[str, None] = None
         if target_type == 0:
             target_type_name = "Mode S"
@@ -134,7 +697,7 @@ def stratux_to_cot_xml(  # NOQA pylint: disable=too-many-locals,too-many-branche
             tisb = True
         if target_type_name:
             remarks_fields.append(f"ADS-B Type: {target_type_name}")
-            aircotx.set("target_type_name", target_type_name)
+            aircot_attrs.append(("target_type_name", target_type_name))
 
     if "REG" in uid_key and reg:
         cot_uid = f"REG-{reg}"
@@ -149,13 +712,6 @@ def stratux_to_cot_xml(  # NOQA pylint: disable=too-many-locals,too-many-branche
     else:
         return None
 
-    if flight:
-        callsign = flight
-    elif reg:
-        callsign = reg
-    else:
-        callsign = icao_hex
-
     _, callsign = aircot.set_name_callsign(icao_hex, reg, None, flight, known_craft)
 
     if tisb:
@@ -163,55 +719,148 @@ def stratux_to_cot_xml(  # NOQA pylint: disable=too-many-locals,too-many-branche
     else:
         cot_type = aircot.set_cot_type(icao_hex, category, flight, known_craft)
 
-    point = ET.Element("point")
-    point.set("lat", str(lat))
-    point.set("lon", str(lon))
+    remarks_fields.append(f"{cot_host_id}")
+
+    identity: dict = {
+        "type": cot_type,
+        "uid": cot_uid,
+        "callsign": str(callsign),
+        "icon": known_craft.get("ICON"),
+        "remarks": " ".join(list(filter(None, remarks_fields))),
+        "aircot": aircot_attrs,
+    }
+    identity["escaped"] = _escape_identity(identity)
+    cot_format: str = config.get("COT_FORMAT", stratuxcot.constants.DEFAULT_COT_FORMAT)
+    if cot_format.strip().lower() != "xml":
+        identity["takproto"] = takproto_identity(identity)
+    return identity
+
+
+def stratux_to_cot_fields(
+    craft: Union[dict, "stratuxcot.classes.TrafficRecord"],
+    config: Union[dict, None] = None,
+    known_craft: Union[dict, None] = None,
+    identity_cache=None,
+) -> Union[dict, None]:
+    """
+    Transforms a Stratux Websocket Message into the fields of a CoT PLI Event.
+
+    These are the (unescaped) attribute values shared by both the ElementTree
+    (`stratux_to_cot_xml`) and template (`stratux_to_cot`) serializers.
 
-    if craft.get("OnGround"):
-        point.set("ce", str(51.56 + int(craft.get("NACp"))))
-        point.set("le", str(12.5 + int(craft.get("NACp"))))
-        point.set("hae", "9999999.0")
+    If an `identity_cache` (`stratuxcot.classes.IdentityCache`) is given, the
+    identity fields are looked up in it, and only the position, track & time
+    fields are computed per message.
+    """
+    import stratuxcot.classes  # pylint: disable=import-outside-toplevel,cyclic-import
+
+    craft = stratuxcot.classes.TrafficRecord.parse(craft)
+    lat = craft.lat
+    lon = craft.lon
+    if lat is None or lon is None:
+        return None
+
+    if identity_cache is None:
+        identity = stratux_to_cot_identity(craft, config, known_craft)
+    else:
+        identity = identity_cache.get_identity(craft, config, known_craft)
+    if not identity:
+        return None
+
+    config: dict = config or {}
+    cot_stale = int(config.get("COT_STALE", pytak.DEFAULT_COT_STALE))
+
+    if craft.on_ground:
+        ce = str(51.56 + craft.nacp)
+        le = str(12.5 + craft.nacp)
+        hae = "9999999.0"
     else:
-        point.set("ce", str(56.57 + int(craft.get("NACp"))))
-        point.set("le", str(12.5 + int(craft.get("NACp"))))
-        point.set("hae", aircot.functions.get_hae(craft.get("Alt")))
+        ce = str(56.57 + craft.nacp)
+        le = str(12.5 + craft.nacp)
+        hae = aircot.functions.get_hae(craft.alt)
+
+    cot_time = pytak.cot_time()
+
+    fields: dict = dict(identity)
+    fields.update(
+        time=cot_time,
+        start=cot_time,
+        stale=pytak.cot_time(cot_stale),
+        lat=str(lat),
+        lon=str(lon),
+        ce=ce,
+        le=le,
+        hae=hae,
+        course="9999999.0" if craft.track is None else str(craft.track),
+        speed=aircot.functions.get_speed(craft.speed),
+        extrapolated=(
+            None if craft.extrapolated is None else f"{craft.extrapolated:.1f}"
+        ),
+    )
+    return fields
+
+
+def stratux_to_cot_xml(
+    craft: Union[dict, "stratuxcot.classes.TrafficRecord"],
+    config: Union[dict, None] = None,
+    known_craft: Union[dict, None] = None,
+    identity_cache=None,
+) -> Union[ET.Element, None]:
+    """
+    Transforms Stratux Websocket Messages to a Cursor-on-Target PLI Events.
+    """
+    fields: Union[dict, None] = stratux_to_cot_fields(
+        craft, config, known_craft, identity_cache
+    )
+    if not fields:
+        return None
+
+    point = ET.Element("point")
+    point.set("lat", fields["lat"])
+    point.set("lon", fields["lon"])
+    point.set("ce", fields["ce"])
+    point.set("le", fields["le"])
+    point.set("hae", fields["hae"])
 
     uid = ET.Element("UID")
-    uid.set("Droid", str(callsign))
+    uid.set("Droid", fields["callsign"])
 
     contact = ET.Element("contact")
-    contact.set("callsign", str(callsign))
+    contact.set("callsign", fields["callsign"])
 
     track = ET.Element("track")
-    track.set("course", str(craft.get("Track", "9999999.0")))
-    track.set("speed", aircot.functions.get_speed(craft.get("Speed")))
+    track.set("course", fields["course"])
+    track.set("speed", fields["speed"])
 
     detail = ET.Element("detail")
-    detail.set("uid", cot_uid)
+    detail.set("uid", fields["uid"])
     detail.append(uid)
     detail.append(contact)
     detail.append(track)
 
-    icon = known_craft.get("ICON")
-    if icon:
+    if fields["icon"]:
         usericon = ET.Element("usericon")
-        usericon.set("iconsetpath", icon)
+        usericon.set("iconsetpath", fields["icon"])
         detail.append(usericon)
 
     remarks = ET.Element("remarks")
-    remarks_fields.append(f"{cot_host_id}")
-    _remarks = " ".join(list(filter(None, remarks_fields)))
-    remarks.text = _remarks
+    remarks.text = fields["remarks"]
     detail.append(remarks)
 
+    aircotx = ET.Element("_aircot_")
+    for name, value in fields["aircot"]:
+        aircotx.set(name, value)
+    if fields.get("extrapolated"):
+        aircotx.set("extrapolated", fields["extrapolated"])
+
     root = ET.Element("event")
     root.set("version", "2.0")
-    root.set("type", cot_type)
-    root.set("uid", cot_uid)
+    root.set("type", fields["type"])
+    root.set("uid", fields["uid"])
     root.set("how", "m-g")
-    root.set("time", pytak.cot_time())
-    root.set("start", pytak.cot_time())
-    root.set("stale", pytak.cot_time(cot_stale))
+    root.set("time", fields["time"])
+    root.set("start", fields["start"])
+    root.set("stale", fields["stale"])
 
     root.append(point)
     root.append(detail)
@@ -220,11 +869,762 @@ def stratux_to_cot_xml(  # NOQA pylint: disable=too-many-locals,too-many-branche
     return root
 
 
+# Same escaping as ElementTree's serializer, for attribute values & text:
+_ATTRIB_ESCAPES: dict = str.maketrans(
+    {
+        "&": "&amp;",
+        "<": "&lt;",
+        ">": "&gt;",
+        '"': "&quot;",
+        "\r": "&#13;",
+        "\n": "&#10;",
+        "\t": "&#09;",
+    }
+)
+_ATTRIB_SPECIALS = re.compile('[&<>"\r\n\t]')
+_TEXT_ESCAPES: dict = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+_TEXT_SPECIALS = re.compile("[&<>]")
+
+
+def _escape_attrib(value: str) -> str:
+    """Escapes an XML attribute value, most values need no escaping at all."""
+    if _ATTRIB_SPECIALS.search(value) is None:
+        return value
+    return value.translate(_ATTRIB_ESCAPES)
+
+
+def _escape_text(value: str) -> str:
+    """Escapes XML element text."""
+    if _TEXT_SPECIALS.search(value) is None:
+        return value
+    return value.translate(_TEXT_ESCAPES)
+
+
+COT_TEMPLATE: str = (
+    '<event version="2.0" type="{type}" uid="{uid}" how="m-g" time="{time}" '
+    'start="{start}" stale="{stale}">'
+    '<point lat="{lat}" lon="{lon}" ce="{ce}" le="{le}" hae="{hae}" />'
+    '<detail uid="{uid}"><UID Droid="{callsign}" /><contact callsign="{callsign}" />'
+    '<track course="{course}" speed="{speed}" />{usericon}{remarks}</detail>'
+    "<_aircot_{aircot}{extrapolated} /></event>"
+)
+
+
+def _escape_identity(identity: dict) -> dict:
+    """Escapes & renders the identity fields of a CoT Event for `COT_TEMPLATE`."""
+    icon = identity["icon"]
+    remarks = identity["remarks"]
+    return {
+        "type": _escape_attrib(identity["type"]),
+        "uid": _escape_attrib(identity["uid"]),
+        "callsign": _escape_attrib(identity["callsign"]),
+        "usericon": (
+            f'<usericon iconsetpath="{_escape_attrib(icon)}" />' if icon else ""
+        ),
+        "remarks": (
+            f"<remarks>{_escape_text(remarks)}</remarks>" if remarks else "<remarks />"
+        ),
+        "aircot": "".join(
+            f' {name}="{_escape_attrib(value)}"' for name, value in identity["aircot"]
+        ),
+    }
+
+
+def cot_fields_to_xml(fields: dict) -> bytes:
+    """
+    Serializes CoT Event fields into XML by filling in `COT_TEMPLATE`.
+
+    Produces the same bytes as `ET.tostring()` of the Element built by
+    `stratux_to_cot_xml()`, without building the Element tree.
+    """
+    escaped: dict = fields.get("escaped") or _escape_identity(fields)
+    extrapolated: Union[str, None] = fields.get("extrapolated")
+    # ET.tostring() defaults to US-ASCII, with character references for the rest:
+    return COT_TEMPLATE.format(
+        time=_escape_attrib(fields["time"]),
+        start=_escape_attrib(fields["start"]),
+        stale=_escape_attrib(fields["stale"]),
+        lat=_escape_attrib(fields["lat"]),
+        lon=_escape_attrib(fields["lon"]),
+        ce=_escape_attrib(fields["ce"]),
+        le=_escape_attrib(fields["le"]),
+        hae=_escape_attrib(fields["hae"]),
+        course=_escape_attrib(fields["course"]),
+        speed=_escape_attrib(fields["speed"]),
+        extrapolated=(
+            f' extrapolated="{_escape_attrib(extrapolated)}"' if extrapolated else ""
+        ),
+        **escaped,
+    ).encode("ascii", "xmlcharrefreplace")
+
+
+# TAK Protocol Version 1 detail elements without a protobuf message of their own:
+TAKPROTO_XML_DETAIL_TEMPLATE: str = (
+    '<UID Droid="{callsign}" />{usericon}{remarks}<_aircot_{aircot}{extrapolated} />'
+)
+
+# cotevent.proto lat, lon, hae, ce & le (fields 10 to 14), and detail.proto track
+# speed & course (fields 1 & 2), all doubles:
+_TAKPROTO_POINT = struct.Struct("<BdBdBdBdBd")
+_TAKPROTO_TRACK = struct.Struct("<BdBd")
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _pb_varint(value: int) -> bytes:
+    """Encodes an unsigned protobuf varint."""
+    if value < 0x80:
+        return bytes((value,))
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def _pb_bytes(field: int, value: bytes) -> bytes:
+    """Encodes a length-delimited protobuf field, omitted if empty (proto3)."""
+    if not value:
+        return b""
+    return bytes((field << 3 | 2,)) + _pb_varint(len(value)) + value
+
+
+def _pb_string(field: int, value: Union[str, None]) -> bytes:
+    """Encodes a protobuf string field."""
+    return _pb_bytes(field, value.encode()) if value else b""
+
+
+def _cot_time_ms(value: str) -> int:
+    """Converts a CoT (W3C XML Schema dateTime, UTC) time to epoch milliseconds."""
+    return (datetime.datetime.fromisoformat(value.rstrip("Z")) - _EPOCH) // (
+        datetime.timedelta(milliseconds=1)
+    )
+
+
+def takproto_identity(identity: dict) -> dict:
+    """
+    Encodes the identity fields of a CoT Event for `cot_fields_to_takproto()`.
+
+    `stratux_to_cot_identity()` adds these to identities when COT_FORMAT is a TAK
+    Protocol format, so they're cached with them.
+    """
+    escaped: dict = identity.get("escaped") or _escape_identity(identity)
+    # detail.proto contact = 2 (callsign = 2):
+    contact: bytes = _pb_bytes(2, _pb_string(2, identity["callsign"]))
+    return {
+        # cotevent.proto type = 1, uid = 5 & how = 9:
+        "event": _pb_string(1, identity["type"])
+        + _pb_string(5, identity["uid"])
+        + _pb_string(9, "m-g"),
+        # detail.proto xmlDetail = 1, without extrapolation:
+        "detail": _pb_string(
+            1, TAKPROTO_XML_DETAIL_TEMPLATE.format(extrapolated="", **escaped)
+        )
+        + contact,
+        "contact": contact,
+    }
+
+
+def cot_fields_to_takproto(fields: dict) -> bytes:
+    """
+    Serializes CoT Event fields into a TAK Protocol Version 1 TakMessage.
+
+    Encodes the protobuf directly from the fields, without building the XML. The
+    contact & track details are sent as their protobuf messages, the other detail
+    elements (and `_aircot_`, which has no place in the protobuf event) as
+    `xmlDetail`. Frame with `serialize_cot()`.
+    """
+    encoded: dict = fields.get("takproto") or takproto_identity(fields)
+    extrapolated: Union[str, None] = fields.get("extrapolated")
+    if extrapolated:
+        escaped: dict = fields.get("escaped") or _escape_identity(fields)
+        detail: bytes = (
+            _pb_string(
+                1,
+                TAKPROTO_XML_DETAIL_TEMPLATE.format(
+                    extrapolated=f' extrapolated="{_escape_attrib(extrapolated)}"',
+                    **escaped,
+                ),
+            )
+            + encoded["contact"]
+        )
+    else:
+        detail = encoded["detail"]
+    # detail.proto track = 7:
+    detail += b"\x3a\x12" + _TAKPROTO_TRACK.pack(
+        0x09, float(fields["speed"]), 0x11, float(fields["course"])
+    )
+
+    send_time: int = _cot_time_ms(fields["time"])
+    start_time: int = (
+        send_time
+        if fields["start"] == fields["time"]
+        else _cot_time_ms(fields["start"])
+    )
+
+    # cotevent.proto sendTime = 6, startTime = 7, staleTime = 8 & detail = 15:
+    event: bytes = b"".join(
+        (
+            encoded["event"],
+            b"\x30",
+            _pb_varint(send_time),
+            b"\x38",
+            _pb_varint(start_time),
+            b"\x40",
+            _pb_varint(_cot_time_ms(fields["stale"])),
+            _TAKPROTO_POINT.pack(
+                0x51,
+                float(fields["lat"]),
+                0x59,
+                float(fields["lon"]),
+                0x61,
+                float(fields["hae"]),
+                0x69,
+                float(fields["ce"]),
+                0x71,
+                float(fields["le"]),
+            ),
+            _pb_bytes(15, detail),
+        )
+    )
+
+    # takmessage.proto cotEvent = 2:
+    return _pb_bytes(2, event)
+
+
+def serialize_cot(fields: dict, cot_format: str = "xml") -> bytes:
+    """
+    Serializes CoT Event fields in `cot_format`, one of `COT_FORMATS`.
+
+    xml events have an XML declaration, takproto-mesh & takproto-stream events
+    the TAK Protocol Version 1 mesh or stream header.
+    """
+    if cot_format == "xml":
+        return b"\n".join([pytak.DEFAULT_XML_DECLARATION, cot_fields_to_xml(fields)])
+
+    message: bytes = cot_fields_to_takproto(fields)
+    if cot_format == "takproto-mesh":
+        return stratuxcot.constants.TAKPROTO_MESH_HEADER + message
+    if cot_format == "takproto-stream":
+        return stratuxcot.constants.TAKPROTO_MAGIC + _pb_varint(len(message)) + message
+    raise ValueError(f"Unknown COT_FORMAT: {cot_format}")
+
+
 def stratux_to_cot(
-    craft: dict, config: Union[dict, None] = None, known_craft: Union[dict, None] = None
+    craft: Union[dict, "stratuxcot.classes.TrafficRecord"],
+    config: Union[dict, None] = None,
+    known_craft: Union[dict, None] = None,
+    identity_cache=None,
 ) -> Union[bytes, None]:
-    """Wrapper that returns COT as an XML string."""
-    cot: Union[ET.Element, None] = stratux_to_cot_xml(craft, config, known_craft)
+    """
+    Wrapper that returns COT as an XML string.
+
+    Serializes with `cot_fields_to_xml()`, use `stratux_to_cot_xml()` for an
+    `ET.Element` instead. With COT_FORMAT set to takproto-mesh or takproto-stream,
+    returns TAK Protocol Version 1 (protobuf) instead, see `serialize_cot()`.
+    """
+    fields: Union[dict, None] = stratux_to_cot_fields(
+        craft, config, known_craft, identity_cache
+    )
+    if not fields:
+        return None
+    cot_format: str = (config or {}).get(
+        "COT_FORMAT", stratuxcot.constants.DEFAULT_COT_FORMAT
+    )
+    return serialize_cot(fields, cot_format.strip().lower())
+
+
+# Stratux Websocket Message fields of `TrafficRecord.identity_key()`:
+_BATCH_IDENTITY_FIELDS: tuple = (
+    "Icao_addr",
+    "Tail",
+    "Reg",
+    "Emitter_category",
+    "TargetType",
+    "Squawk",
+)
+
+# COT_TEMPLATE split around its per-message fields, for `stratux_to_cot_batch()`:
+_BATCH_HEAD: str = '<event version="2.0" type="{type}" uid="{uid}" how="m-g" time="'
+_BATCH_DETAIL: str = (
+    '<detail uid="{uid}"><UID Droid="{callsign}" /><contact callsign="{callsign}" />'
+    '<track course="'
+)
+_BATCH_TAIL: str = '" />{usericon}{remarks}</detail><_aircot_{aircot} /></event>'
+
+
+def stratux_to_cot_batch(  # pylint: disable=too-many-locals
+    crafts: list,
+    config: Union[dict, None] = None,
+    known_craft_index: Union[dict, None] = None,
+    times: Union[list, None] = None,
+) -> list:
+    """
+    Converts a batch of Stratux Websocket Messages to CoT Events, in columns.
+
+    Positions, CE/LE, HAE, speed & times are converted for the whole batch at once
+    with NumPy, the identity fields once per craft, and the events are assembled
+    with NumPy string operations. Meant for converting captures, where it's an
+    order of magnitude faster than `stratux_to_cot()` in a loop.
+
+    Events are the same as `stratux_to_cot()`'s, except that numbers are always
+    formatted as floats (e.g. course="135.0" where Track is 135), and only the xml
+    COT_FORMAT is supported. As in `StratuxWorker`, messages with Position_valid
+    false or a zero Icao_addr are skipped, but no filters are applied.
+
+    Requires NumPy 2 or later, which is an optional dependency of StratuxCOT
+    (`python3 -m pip install "numpy>=2"`).
+
+    Parameters
+    ----------
+    crafts : `list`
+        Decoded Stratux Websocket Messages (`dict`).
+    config : `dict`
+        Configuration options & values, as for `stratux_to_cot()`.
+    known_craft_index : `dict`
+        Known Craft rows, indexed on KNOWN_CRAFT_KEY by `index_known_craft()`.
+    times : `list`
+        UNIX time each message was received, e.g. from `read_capture()`, used as
+        the CoT Event time. Defaults to now.
+
+    Returns
+    -------
+    `list`
+        The CoT Event of each message, in order, or None where it was skipped.
+    """
+    import numpy  # pylint: disable=import-outside-toplevel
+
+    if not hasattr(numpy, "strings"):
+        raise ImportError(
+            f"stratux_to_cot_batch() requires NumPy 2 or later, not {numpy.__version__}"
+        )
+
+    config: dict = config or {}
+    known_craft_index: dict = known_craft_index or {}
+    cot_format: str = config.get("COT_FORMAT", stratuxcot.constants.DEFAULT_COT_FORMAT)
+    if cot_format.strip().lower() != "xml":
+        raise ValueError(f"Unsupported COT_FORMAT for batches: {cot_format}")
+    known_craft_key: str = (
+        config.get("KNOWN_CRAFT_KEY", stratuxcot.constants.DEFAULT_KNOWN_CRAFT_KEY)
+        .strip()
+        .upper()
+    )
+    cot_stale = int(config.get("COT_STALE", pytak.DEFAULT_COT_STALE))
+    unknown = b"9999999.0"
+    events: list = [None] * len(crafts)
+
+    def column(field: str, selected: list) -> "numpy.ndarray":
+        try:
+            values: list = list(map(operator.itemgetter(field), selected))
+        except KeyError:
+            values = [craft.get(field) for craft in selected]
+        return numpy.array(values, dtype=float)
+
+    # Identity fields, once per craft:
+    identities: dict = {}
+    firsts: list = []
+    inverse: list = []
+    identity_key = operator.itemgetter(*_BATCH_IDENTITY_FIELDS)
+    for craft in crafts:
+        try:
+            key = identity_key(craft)
+        except KeyError:
+            key = tuple(map(craft.get, _BATCH_IDENTITY_FIELDS))
+        position = identities.get(key)
+        if position is None:
+            position = identities[key] = len(firsts)
+            firsts.append(craft)
+        inverse.append(position)
+
+    # ICAO int to hex, as aircot.icao_int_to_hex() does (without leading zeros):
+    icao_addr = numpy.nan_to_num(column("Icao_addr", firsts)).astype(numpy.int64)
+    nibbles = (icao_addr[:, None] >> numpy.arange(20, -1, -4)) & 0xF
+    icao_hex = numpy.strings.lstrip(
+        numpy.frombuffer(b"0123456789ABCDEF", dtype="S1")[nibbles].view("S6").ravel(),
+        b"0",
+    )
+    # Craft with a zero Icao_addr are skipped, as by `is_wanted_message()`:
+    segments: list = [
+        _batch_identity(craft, icao, config, known_craft_index, known_craft_key)
+        if icao
+        else None
+        for craft, icao in zip(firsts, icao_hex.astype(str).tolist())
+    ]
+
+    has_identity = numpy.array([segment is not None for segment in segments])
+    inverse = numpy.array(inverse, dtype=numpy.intp)
+    lat = column("Lat", crafts)
+    lon = column("Lng", crafts)
+    position_valid = numpy.array(
+        [craft.get("Position_valid") is not False for craft in crafts], dtype=bool
+    )
+    selected = numpy.flatnonzero(
+        ~numpy.isnan(lat) & ~numpy.isnan(lon) & position_valid & has_identity[inverse]
+    )
+    if not selected.size:
+        return events
+
+    rows: list = [crafts[index] for index in selected.tolist()]
+    inverse = inverse[selected]
+    lat = lat[selected]
+    lon = lon[selected]
+    on_ground = numpy.nan_to_num(column("OnGround", rows)).astype(bool)
+    nacp = numpy.nan_to_num(column("NACp", rows))
+    alt = column("Alt", rows)
+    track = column("Track", rows)
+    speed = column("Speed", rows)
+
+    # As stratux_to_cot_fields(), aircot.get_hae() & aircot.get_speed():
+    ce = numpy.where(on_ground, 51.56, 56.57) + nacp
+    le = 12.5 + nacp
+    hae = numpy.where(
+        on_ground | numpy.isnan(alt) | (alt == 0),
+        unknown,
+        _batch_format(alt * 0.3048),
+    )
+    course = numpy.where(numpy.isnan(track), unknown, _batch_format(track))
+    speed = numpy.where(
+        numpy.isnan(speed) | (speed == 0),
+        unknown,
+        _batch_format(speed * 0.514444),
+    )
+
+    if times is None:
+        cot_time = pytak.cot_time().encode()
+        cot_stale_time = pytak.cot_time(cot_stale).encode()
+    else:
+        cot_time, cot_stale_time = _batch_cot_times(
+            numpy.asarray(times, dtype=float)[selected], cot_stale
+        )
+
+    heads, details, tails = (
+        numpy.array(part, dtype="S")
+        for part in zip(*(segment or (b"", b"", b"") for segment in segments))
+    )
+    parts: list = [
+        heads[inverse],
+        cot_time,
+        b'" start="',
+        cot_time,
+        b'" stale="',
+        cot_stale_time,
+        b'"><point lat="',
+        _batch_format_fixed(lat, 7),
+        b'" lon="',
+        _batch_format_fixed(lon, 7),
+        b'" ce="',
+        _batch_format(ce),
+        b'" le="',
+        _batch_format(le),
+        b'" hae="',
+        hae,
+        b'" />',
+        details[inverse],
+        course,
+        b'" speed="',
+        speed,
+        tails[inverse],
+    ]
+    assembled = parts[0]
+    for part in parts[1:]:
+        assembled = numpy.strings.add(assembled, part)
+
+    for index, event in zip(selected.tolist(), assembled.tolist()):
+        events[index] = event
+    return events
+
+
+def _batch_identity(
+    craft: dict,
+    icao_hex: str,
+    config: dict,
+    known_craft_index: dict,
+    known_craft_key: str,
+) -> Union[Tuple[bytes, bytes, bytes], None]:
+    """Renders the identity segments of a craft for `stratux_to_cot_batch()`."""
+    import stratuxcot.classes  # pylint: disable=import-outside-toplevel,cyclic-import
+
+    record = stratuxcot.classes.TrafficRecord.from_dict(craft)
+    known_craft: Union[dict, None] = None
+    if known_craft_index:
+        known_craft = known_craft_index.get(
+            get_craft_key(record, icao_hex, known_craft_key)
+        )
+    identity = stratux_to_cot_identity(record, config, known_craft)
+    if not identity:
+        return None
+    escaped: dict = identity["escaped"]
     return (
-        b"\n".join([pytak.DEFAULT_XML_DECLARATION, ET.tostring(cot)]) if cot else None
-    )
\ No newline at end of file
+        b"\n".join(
+            [
+                pytak.DEFAULT_XML_DECLARATION,
+                _BATCH_HEAD.format(**escaped).encode("ascii", "xmlcharrefreplace"),
+            ]
+        ),
+        _BATCH_DETAIL.format(**escaped).encode("ascii", "xmlcharrefreplace"),
+        _BATCH_TAIL.format(**escaped).encode("ascii", "xmlcharrefreplace"),
+    )
+
+
+def _batch_digits(values, width: int) -> "numpy.ndarray":
+    """Formats non-negative integers as zero-padded, `width` digit strings."""
+    import numpy  # pylint: disable=import-outside-toplevel
+
+    powers = 10 ** numpy.arange(width - 1, -1, -1, dtype=numpy.int64)
+    digits = (values[:, None] // powers) % 10 + ord("0")
+    return digits.astype(numpy.uint8).view(f"S{width}").ravel()
+
+
+def _batch_format(values) -> "numpy.ndarray":
+    """
+    Formats numbers as `str()` does, once per distinct value, as most of the values
+    of a column (e.g. NACp or Alt) repeat.
+    """
+    import numpy  # pylint: disable=import-outside-toplevel
+
+    distinct, inverse = numpy.unique(values, return_inverse=True)
+    return numpy.array([str(value) for value in distinct.tolist()], dtype="S")[inverse]
+
+
+def _batch_format_fixed(values, decimals: int) -> "numpy.ndarray":
+    """
+    Formats floats rounded to `decimals`, without trailing zeros. The same as
+    `str()` for values with up to `decimals` decimals, like Stratux positions.
+    """
+    import numpy  # pylint: disable=import-outside-toplevel
+
+    scale: int = 10**decimals
+    scaled = numpy.round(numpy.abs(values) * scale).astype(numpy.int64)
+    whole = _batch_format(scaled // scale)
+    fraction = numpy.strings.rstrip(_batch_digits(scaled % scale, decimals), b"0")
+    fraction = numpy.where(fraction == b"", b"0", fraction)
+    formatted = numpy.strings.add(numpy.strings.add(whole, b"."), fraction)
+    return numpy.where(values < 0, numpy.strings.add(b"-", formatted), formatted)
+
+
+def _batch_cot_times(times, cot_stale: int) -> tuple:
+    """Formats UNIX times as CoT times, and as CoT stale times `cot_stale` later."""
+    import numpy  # pylint: disable=import-outside-toplevel
+
+    microseconds = numpy.round(times * 1e6).astype(numpy.int64)
+    seconds, fraction = numpy.divmod(microseconds, 1_000_000)
+    fraction = numpy.strings.add(
+        numpy.strings.add(b".", _batch_digits(fraction, 6)), b"Z"
+    )
+
+    def _format(offset: int) -> "numpy.ndarray":
+        distinct, inverse = numpy.unique(seconds + offset, return_inverse=True)
+        return numpy.strings.add(
+            numpy.datetime_as_string(distinct.astype("datetime64[s]")).astype("S")[
+                inverse
+            ],
+            fraction,
+        )
+
+    return _format(0), _format(cot_stale)
+
+
+# Per worker state of the conversion executor, see `init_conversion_worker()`:
+_CONVERSION_STATE = threading.local()
+
+
+def init_conversion_worker(
+    config: dict, known_craft_index: dict, identity_cache_size: int = 0
+) -> None:
+    """
+    Initializes a conversion executor worker, see `convert_batch()`.
+
+    Runs once in each worker process or thread, so the config & Known Craft index are
+    sent to workers once, not with every traffic report.
+    """
+    import stratuxcot.classes  # pylint: disable=import-outside-toplevel,cyclic-import
+
+    _CONVERSION_STATE.config = config
+    _CONVERSION_STATE.known_craft_index = known_craft_index
+    _CONVERSION_STATE.identity_cache = (
+        stratuxcot.classes.IdentityCache(identity_cache_size)
+        if identity_cache_size > 0
+        else None
+    )
+
+
+def convert_batch(items: list) -> list:
+    """
+    Converts a batch of traffic reports to CoT Events, in a conversion worker.
+
+    Parameters
+    ----------
+    items : `list`
+        (`TrafficRecord`, Known Craft key) pairs. The key is looked up in the
+        worker's Known Craft index, or is None for craft without a Known Craft row.
+
+    Returns
+    -------
+    `list`
+        The CoT Event of each item, in order, or None where it has no position.
+    """
+    config: dict = _CONVERSION_STATE.config
+    known_craft_index: dict = _CONVERSION_STATE.known_craft_index
+    identity_cache = _CONVERSION_STATE.identity_cache
+    return [
+        stratux_to_cot(
+            craft,
+            config,
+            known_craft_index.get(key) if key is not None else None,
+            identity_cache,
+        )
+        for craft, key in items
+    ]
+
+
+def _gdl90_crc_table() -> list:
+    """Computes the GDL90 CRC-16-CCITT lookup table."""
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+
+GDL90_CRC_TABLE: list = _gdl90_crc_table()
+
+
+def gdl90_crc(message: bytes) -> int:
+    """Computes the GDL90 Frame Check Sequence (CRC-16-CCITT) of a message."""
+    crc = 0
+    table = GDL90_CRC_TABLE
+    for byte in message:
+        crc = table[crc >> 8] ^ ((crc << 8) & 0xFFFF) ^ byte
+    return crc
+
+
+def gdl90_frame(message: bytes) -> bytes:
+    """
+    Frames a GDL90 message (message ID & data): appends its CRC, escapes flag &
+    control-escape bytes and adds the flag bytes.
+    """
+    crc = gdl90_crc(message)
+    escaped = bytearray([stratuxcot.constants.GDL90_FLAG])
+    for byte in message + bytes((crc & 0xFF, crc >> 8)):
+        if byte in (stratuxcot.constants.GDL90_FLAG, stratuxcot.constants.GDL90_ESCAPE):
+            escaped.append(stratuxcot.constants.GDL90_ESCAPE)
+            byte ^= stratuxcot.constants.GDL90_ESCAPE_XOR
+        escaped.append(byte)
+    escaped.append(stratuxcot.constants.GDL90_FLAG)
+    return bytes(escaped)
+
+
+def gdl90_messages(datagram: bytes) -> Iterator[Union[bytes, None]]:
+    """
+    Unframes the GDL90 messages in a UDP datagram.
+
+    Stratux sends one or more frames per datagram. Yields each message (message
+    ID & data, unescaped & without its CRC), or None for frames that fail their
+    CRC check.
+    """
+    escape = bytes((stratuxcot.constants.GDL90_ESCAPE,))
+    for frame in datagram.split(bytes((stratuxcot.constants.GDL90_FLAG,))):
+        if not frame:
+            continue
+        if escape in frame:
+            parts = frame.split(escape)
+            unescaped = bytearray(parts[0])
+            for part in parts[1:]:
+                if part:
+                    unescaped.append(part[0] ^ stratuxcot.constants.GDL90_ESCAPE_XOR)
+                    unescaped += part[1:]
+            frame = bytes(unescaped)
+        if len(frame) < 3:
+            yield None
+            continue
+        message = frame[:-2]
+        if gdl90_crc(message) != frame[-2] | frame[-1] << 8:
+            yield None
+            continue
+        yield message
+
+
+def _int24(data: bytes, offset: int) -> int:
+    """Reads a big-endian, two's complement 24-bit integer."""
+    value = data[offset] << 16 | data[offset + 1] << 8 | data[offset + 2]
+    return value - 0x1000000 if value & 0x800000 else value
+
+
+def gdl90_to_traffic_record(
+    message: bytes,
+) -> Union["stratuxcot.classes.TrafficRecord", None]:
+    """
+    Decodes a GDL90 Traffic Report (message ID 20) into a `TrafficRecord`.
+
+    Fields GDL90 doesn't carry (registration, squawk) are left empty. Returns None
+    for other messages.
+    """
+    import stratuxcot.classes  # pylint: disable=import-outside-toplevel,cyclic-import
+
+    if len(message) < 28 or message[0] != stratuxcot.constants.GDL90_TRAFFIC_REPORT:
+        return None
+
+    nic = message[13] >> 4
+    lat = _int24(message, 5) * 180 / 0x800000
+    lon = _int24(message, 8) * 180 / 0x800000
+    altitude = message[11] << 4 | message[12] >> 4
+    misc = message[12] & 0x0F
+    speed = message[14] << 4 | message[15] >> 4
+    vvel = (message[15] & 0x0F) << 8 | message[16]
+
+    return stratuxcot.classes.TrafficRecord(
+        icao_addr=message[2] << 16 | message[3] << 8 | message[4],
+        tail=message[19:27].decode("ascii", "replace").strip().upper(),
+        emitter_category=message[18],
+        target_type=stratuxcot.constants.GDL90_TARGET_TYPES.get(message[1] & 0x0F, 1),
+        # No valid position is sent as 0 lat, lon & NIC:
+        position_valid=bool(nic or lat or lon),
+        lat=round(lat, 7),
+        lon=round(lon, 7),
+        alt=None if altitude == 0xFFF else altitude * 25 - 1000,
+        nacp=message[13] & 0x0F,
+        # Misc. bit 3 is set for airborne craft:
+        on_ground=not misc & 0x08,
+        # Misc. bits 0-1 are the Track/Heading type, 0 when invalid:
+        track=round(message[17] * 360 / 256, 1) if misc & 0x03 else None,
+        speed=None if speed == 0xFFF else speed,
+        # Vertical velocity, in units of 64 feet per minute:
+        vvel=None if vvel == 0x800 else (vvel - 0x1000 if vvel & 0x800 else vvel) * 64,
+        age=0,
+    )
+
+
+def traffic_record_to_gdl90(craft: "stratuxcot.classes.TrafficRecord") -> bytes:
+    """
+    Encodes a `TrafficRecord` as a GDL90 Traffic Report (message ID 20), without
+    framing. The inverse of `gdl90_to_traffic_record()`, for tests & replays.
+    """
+    address_type = {1: 0, 2: 0, 3: 2, 4: 3}.get(craft.target_type or 1, 0)
+    lat = round((craft.lat or 0) * 0x800000 / 180) & 0xFFFFFF
+    lon = round((craft.lon or 0) * 0x800000 / 180) & 0xFFFFFF
+    altitude = 0xFFF if craft.alt is None else int((craft.alt + 1000) // 25) & 0xFFF
+    misc = (0 if craft.on_ground else 0x08) | (0 if craft.track is None else 0x01)
+    speed = 0xFFF if craft.speed is None else min(int(craft.speed), 0xFFE)
+    vvel = 0x800 if craft.vvel is None else int(craft.vvel // 64) & 0xFFF
+    track = 0 if craft.track is None else round(craft.track * 256 / 360) & 0xFF
+    return bytes(
+        (
+            stratuxcot.constants.GDL90_TRAFFIC_REPORT,
+            address_type,
+            *(craft.icao_addr or 0).to_bytes(3, "big"),
+            *lat.to_bytes(3, "big"),
+            *lon.to_bytes(3, "big"),
+            altitude >> 4,
+            (altitude & 0x0F) << 4 | misc,
+            (8 if craft.position_valid else 0) << 4 | craft.nacp & 0x0F,
+            speed >> 4,
+            (speed & 0x0F) << 4 | vvel >> 8,
+            vvel & 0xFF,
+            track,
+            craft.emitter_category or 0,
+            *craft.tail.encode("ascii", "replace")[:8].ljust(8),
+            0,
+        )
+    )
@@ -0,0 +1,991 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022 Greg Albrecht <oss@undef.net>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# Author:: Greg Albrecht W2GMD <oss@undef.net>
+#
+
+"""StratuxCOT Class Tests."""
+
+import asyncio
+import json
+import os
+import pickle
+import time
+
+from configparser import ConfigParser
+
+import pytest
+
+import aircot
+
+import stratuxcot.classes
+import stratuxcot.functions
+
+
+__author__ = "Greg Albrecht W2GMD <oss@undef.net>"
+__copyright__ = "Copyright 2022 Greg Albrecht"
+__license__ = "Apache License, Version 2.0"
+
+
+@pytest.fixture
+def sample_craft():
+    return {
+        "Icao_addr": 10698088,
+        "Reg": "N308DU",
+        "Tail": "DAL1352",
+        "Emitter_category": 3,
+        "OnGround": False,
+        "TargetType": 1,
+        "SignalLevel": -35.5129368009492,
+        "Squawk": 3105,
+        "Position_valid": True,
+        "Lat": 37.46306,
+        "Lng": -122.264626,
+        "Alt": 7325,
+        "NIC": 8,
+        "NACp": 10,
+        "Track": 135,
+        "Speed": 262,
+        "Vvel": -1600,
+        "Timestamp": "2021-05-19T23:13:18.484Z",
+        "Age": 29.85,
+    }
+
+
+@pytest.fixture
+def sample_known_craft():
+    return [
+        {"REG": "N481DF", "CALLSIGN": "C_104", "HEX": "", "COT": "a-f-A-C-H"},
+        {"REG": "N308DU", "CALLSIGN": "TACO_02", "HEX": "", "COT": "a-f-A-T-A-C-O"},
+    ]
+
+
+def make_worker(**options):
+    config = ConfigParser()
+    config.add_section("stratuxcot")
+    for key, value in options.items():
+        config.set("stratuxcot", key, value)
+    return stratuxcot.classes.StratuxWorker(asyncio.Queue(), config["stratuxcot"])
+
+
+@pytest.mark.asyncio
+async def test_handle_data_known_craft_key(sample_craft, sample_known_craft):
+    worker = make_worker(KNOWN_CRAFT_KEY="reg", INCLUDE_ALL_CRAFT="False")
+    worker.known_craft_db = sample_known_craft
+    worker.known_craft_index = stratuxcot.functions.index_known_craft(
+        sample_known_craft, worker.known_craft_key
+    )
+
+    await worker.handle_data(sample_craft)
+    event = worker.queue.get_nowait()
+    assert b"TACO_02" in event
+    assert b"a-f-A-T-A-C-O" in event
+
+    # Unknown craft are dropped unless INCLUDE_ALL_CRAFT is set:
+    await worker.handle_data(dict(sample_craft, Reg="N12345"))
+    assert worker.queue.empty()
+
+
+EXAMPLE_KNOWN_CRAFT = os.path.join(
+    os.path.dirname(__file__), os.pardir, "example-known_craft.csv"
+)
+
+
+@pytest.mark.asyncio
+async def test_load_known_craft(sample_craft):
+    worker = make_worker(KNOWN_CRAFT_KEY="REG", INCLUDE_ALL_CRAFT="False")
+    # With the installed aircot's reader, not a stand-in:
+    worker.known_craft_db, worker.known_craft_index = worker.load_known_craft(
+        EXAMPLE_KNOWN_CRAFT
+    )
+    assert isinstance(worker.known_craft_db, list)
+    assert worker.known_craft_index["N832CS"]["CALLSIGN"] == "CALSTAR7"
+
+    await worker.handle_data(dict(sample_craft, Reg="N832CS"))
+    await worker.handle_data(sample_craft)
+    assert worker.queue.qsize() == 1
+    assert b"CALSTAR7" in worker.queue.get_nowait()
+
+
+@pytest.mark.asyncio
+async def test_reload_known_craft(tmp_path):
+    known_craft = tmp_path / "known_craft.csv"
+    known_craft.write_text("REG,CALLSIGN\nN308DU,TACO_02\n")
+
+    worker = make_worker(KNOWN_CRAFT_KEY="REG")
+    worker.known_craft_db, worker.known_craft_index = worker.load_known_craft(
+        str(known_craft)
+    )
+    index = worker.known_craft_index
+    assert list(index) == ["N308DU"]
+    assert index["N308DU"]["CALLSIGN"] == "TACO_02"
+
+    known_craft.write_text("REG,CALLSIGN\nN308DU,TACO_03\nN481DF,C_104\n")
+    assert await worker.reload_known_craft(str(known_craft))
+    assert worker.known_craft_index is not index
+    assert list(worker.known_craft_index) == ["N308DU", "N481DF"]
+    assert worker.known_craft_index["N308DU"]["CALLSIGN"] == "TACO_03"
+    assert len(worker.known_craft_db) == 2
+
+    # A file that can't be read keeps the previous Known Craft data:
+    index = worker.known_craft_index
+    known_craft.unlink()
+    assert not await worker.reload_known_craft(str(known_craft))
+    assert worker.known_craft_index is index
+    assert worker.known_craft_index["N481DF"]["CALLSIGN"] == "C_104"
+
+
+@pytest.mark.asyncio
+async def test_watch_known_craft(tmp_path):
+    known_craft = tmp_path / "known_craft.csv"
+    known_craft.write_text("REG,CALLSIGN\nN308DU,TACO_02\n")
+
+    worker = make_worker(KNOWN_CRAFT_KEY="REG")
+    watcher = asyncio.ensure_future(worker.watch_known_craft(str(known_craft), 0.01))
+    await asyncio.sleep(0.05)
+    known_craft.write_text("REG,CALLSIGN\nN481DF,C_104\n")
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if worker.known_craft_index:
+            break
+    watcher.cancel()
+
+    assert list(worker.known_craft_index) == ["N481DF"]
+
+
+@pytest.mark.asyncio
+async def test_handle_data_filters(sample_craft):
+    worker = make_worker()
+    include, include_pattern = stratuxcot.functions.compile_filter_values("DAL*")
+    worker.filters = [
+        stratuxcot.classes.CraftFilter("FLIGHT", include, frozenset(), include_pattern)
+    ]
+
+    await worker.handle_data(sample_craft)
+    assert worker.queue.qsize() == 1
+
+    await worker.handle_data(dict(sample_craft, Tail="UAL1"))
+    assert worker.queue.qsize() == 1
+
+
+def test_emit_throttle_deadbands(sample_craft):
+    record = stratuxcot.classes.TrafficRecord.from_dict
+    throttle = stratuxcot.classes.EmitThrottle(
+        min_interval=1, refresh=60, position=50, alt=100, track=5, speed=10
+    )
+    assert throttle.should_emit("A33D68", record(sample_craft), now=0)
+    # Too soon:
+    assert not throttle.should_emit(
+        "A33D68", record(dict(sample_craft, Alt=9000)), now=0.5
+    )
+    # Not a visible change:
+    moved = dict(sample_craft, Lat=sample_craft["Lat"] + 0.0001, Alt=7400, Track=138)
+    assert not throttle.should_emit("A33D68", record(moved), now=2)
+    # Turned:
+    assert throttle.should_emit("A33D68", record(dict(sample_craft, Track=145)), now=3)
+    # Moved ~111m:
+    moved = dict(sample_craft, Lat=sample_craft["Lat"] + 0.001, Track=145)
+    assert throttle.should_emit("A33D68", record(moved), now=4)
+    # Forced refresh:
+    assert throttle.should_emit("A33D68", record(moved), now=64)
+    assert throttle.suppressed == 2
+
+
+def test_emit_throttle_from_config():
+    assert stratuxcot.classes.EmitThrottle.from_config(make_worker().config) is None
+
+    config = make_worker(COT_MIN_INTERVAL="2", COT_STALE="60").config
+    throttle = stratuxcot.classes.EmitThrottle.from_config(config)
+    assert throttle.refresh == 30
+    assert not throttle.has_deadbands
+    craft = stratuxcot.classes.TrafficRecord()
+    assert throttle.should_emit("A33D68", craft, now=0)
+    assert not throttle.should_emit("A33D68", craft, now=1)
+    assert throttle.should_emit("A33D68", craft, now=2)
+
+
+def test_identity_cache(sample_craft, sample_known_craft):
+    identity_cache = stratuxcot.classes.IdentityCache(maxsize=2)
+    known_craft = sample_known_craft[1]
+
+    cot = stratuxcot.functions.stratux_to_cot_fields(
+        sample_craft, known_craft=known_craft, identity_cache=identity_cache
+    )
+    assert cot["type"] == "a-f-A-T-A-C-O"
+    moved = dict(sample_craft, Lat=38.0, Alt=9000)
+    cot_moved = stratuxcot.functions.stratux_to_cot_fields(
+        moved, known_craft=known_craft, identity_cache=identity_cache
+    )
+    assert (identity_cache.hits, identity_cache.misses) == (1, 1)
+    assert cot_moved["callsign"] == cot["callsign"]
+    assert cot_moved["lat"] == "38.0"
+    uncached = stratuxcot.functions.stratux_to_cot_fields(
+        moved, known_craft=known_craft
+    )
+    for field in ("time", "start", "stale"):
+        del uncached[field], cot_moved[field]
+    assert cot_moved == uncached
+
+    # A changed identity field is a miss:
+    stratuxcot.functions.stratux_to_cot_fields(
+        dict(sample_craft, Squawk=7700), identity_cache=identity_cache
+    )
+    stratuxcot.functions.stratux_to_cot_fields(
+        dict(sample_craft, Tail="DAL1353"), identity_cache=identity_cache
+    )
+    assert identity_cache.misses == 3
+    assert len(identity_cache) == 2
+
+    identity_cache.clear()
+    assert len(identity_cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_handle_data_batching(sample_craft):
+    worker = make_worker(COT_BATCH_WINDOW="10", COT_BATCH_SIZE="3")
+
+    for icao_addr in range(1, 5):
+        await worker.handle_data(dict(sample_craft, Icao_addr=icao_addr))
+
+    # First three events are flushed as one payload, the fourth waits:
+    assert worker.queue.qsize() == 1
+    batch = worker.queue.get_nowait()
+    assert batch.count(b"<event ") == 3
+    assert batch.count(stratuxcot.functions.pytak.DEFAULT_XML_DECLARATION) == 3
+
+    await worker.flush_batch()
+    assert worker.queue.get_nowait().count(b"<event ") == 1
+    await worker.flush_batch()
+    assert worker.queue.empty()
+
+
+def test_traffic_record(sample_craft):
+    record = stratuxcot.classes.TrafficRecord.from_dict(
+        dict(sample_craft, Tail=" dal1352 ", OnGround=0)
+    )
+    assert record.icao == "A33D68"
+    assert record.tail == "DAL1352"
+    assert record.on_ground is False
+    assert record.nacp == 10
+    assert stratuxcot.classes.TrafficRecord.parse(record) is record
+    assert stratuxcot.classes.TrafficRecord.from_dict(record.to_dict()) == record
+    assert pickle.loads(pickle.dumps(record)) == record
+
+    # Missing NACp no longer raises inside the conversion:
+    del sample_craft["NACp"]
+    record = stratuxcot.classes.TrafficRecord.from_dict(sample_craft)
+    assert record.nacp == 0
+    assert stratuxcot.functions.stratux_to_cot(record)
+
+
+@pytest.mark.asyncio
+async def test_handle_data_traffic_record(sample_craft):
+    worker = make_worker()
+    await worker.handle_data(stratuxcot.classes.TrafficRecord.from_dict(sample_craft))
+    assert b"ICAO-A33D68" in worker.queue.get_nowait()
+
+    await worker.handle_data(dict(sample_craft, Position_valid=False))
+    await worker.handle_data(dict(sample_craft, NACp="taco"))
+    await worker.handle_data("taco")
+    assert worker.queue.empty()
+
+
+def test_aircraft_table(sample_craft):
+    aircraft = stratuxcot.classes.AircraftTable(max_age=60)
+    record = stratuxcot.classes.TrafficRecord.from_dict(sample_craft)
+    aircraft.update("A33D68", record, now=0)
+    aircraft.update("A33D69", record, now=20)
+    assert aircraft.age("A33D68", now=10) == pytest.approx(39.85)
+
+    assert aircraft.expire(now=31) == 1
+    assert "A33D68" not in aircraft
+    assert "A33D69" in aircraft
+
+
+@pytest.mark.asyncio
+async def test_handle_data_snapshot(sample_craft):
+    worker = make_worker(EMIT_MODE="snapshot", SNAPSHOT_MAX_AGE="60")
+
+    for _ in range(5):
+        await worker.handle_data(sample_craft)
+    await worker.handle_data(dict(sample_craft, Icao_addr=1, Age=120))
+    assert worker.queue.empty()
+    assert len(worker.aircraft) == 2
+
+    await worker.emit_snapshot()
+    assert worker.queue.qsize() == 1
+    assert b"ICAO-A33D68" in worker.queue.get_nowait()
+    assert len(worker.aircraft) == 1
+
+
+@pytest.mark.asyncio
+async def test_run_snapshot(tmp_path, sample_craft):
+    capture = str(tmp_path / "capture.jsonl")
+    recorder = stratuxcot.classes.TrafficRecorder(capture)
+    recorder.write(json.dumps(sample_craft), now=0)
+    recorder.close()
+
+    server = stratuxcot.classes.ReplayServer(capture, port=0, speed=0)
+    await server.start()
+    worker = make_worker(
+        STRATUX_WS=server.url, EMIT_MODE="snapshot", SNAPSHOT_INTERVAL="0.02"
+    )
+    worker_task = asyncio.ensure_future(worker.run())
+    try:
+        for _ in range(200):
+            if worker.queue.qsize() >= 2:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+        await server.close()
+
+    # The one report received is sent again in every snapshot:
+    assert worker.metrics.counters["messages_received"] == 1
+    assert worker.queue.qsize() >= 2
+    assert b"ICAO-A33D68" in worker.queue.get_nowait()
+
+
+@pytest.mark.parametrize("capture", ["capture.jsonl", "capture.jsonl.gz"])
+def test_traffic_recorder(tmp_path, sample_craft, capture):
+    capture = str(tmp_path / capture)
+    message = json.dumps(sample_craft)
+
+    recorder = stratuxcot.classes.TrafficRecorder(capture)
+    recorder.write(message, now=1.5)
+    recorder.write(message.encode(), now=2.5)
+    recorder.close()
+
+    assert list(stratuxcot.functions.read_capture(capture)) == [
+        (1.5, message),
+        (2.5, message),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_replay_to_worker(tmp_path, sample_craft):
+    capture = str(tmp_path / "capture.jsonl.gz")
+    recorder = stratuxcot.classes.TrafficRecorder(capture)
+    for i in range(10):
+        recorder.write(json.dumps(dict(sample_craft, Icao_addr=i + 1)), now=i / 100)
+    recorder.close()
+
+    server = stratuxcot.classes.ReplayServer(capture, port=0, speed=10)
+    await server.start()
+    worker = make_worker(STRATUX_WS=server.url)
+    worker_task = asyncio.ensure_future(worker.run())
+    try:
+        await asyncio.wait_for(server.done.wait(), 5)
+        for _ in range(100):
+            if worker.queue.qsize() >= 10:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+        await server.close()
+
+    assert server.sent >= 10
+    assert b"ICAO-1" in worker.queue.get_nowait()
+
+
+def test_histogram():
+    histogram = stratuxcot.classes.Histogram((0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.buckets == [1, 2, 1]
+    assert histogram.count == 4
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(1) == float("inf")
+
+
+@pytest.mark.asyncio
+async def test_handle_data_metrics(sample_craft):
+    worker = make_worker()
+    await worker.handle_data(sample_craft)
+    await worker.handle_data(dict(sample_craft, Position_valid=False))
+    await worker.handle_data({})
+
+    metrics = worker.metrics
+    assert metrics.counters["events"] == 1
+    assert metrics.dropped == {"no_position": 1, "invalid": 1}
+    assert metrics.histograms["conversion_seconds"].count == 1
+
+    rendered = metrics.render()
+    assert "stratuxcot_events_total 1\n" in rendered
+    assert 'stratuxcot_messages_dropped_total{reason="no_position"} 1\n' in rendered
+    assert 'stratuxcot_conversion_seconds_bucket{le="+Inf"} 1\n' in rendered
+    assert "stratuxcot_queue_depth 1\n" in rendered
+
+
+@pytest.mark.asyncio
+async def test_metrics_http():
+    metrics = stratuxcot.classes.Metrics()
+    metrics.inc("messages_received", 3)
+    server = await metrics.serve(port=0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"stratuxcot_messages_received_total 3\n" in response
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("executor", ["thread", "process"])
+async def test_conversion_pool(sample_craft, sample_known_craft, executor):
+    worker = make_worker(
+        CONVERSION_WORKERS="2",
+        CONVERSION_EXECUTOR=executor,
+        CONVERSION_BATCH_SIZE="3",
+        KNOWN_CRAFT_KEY="REG",
+    )
+    worker.known_craft_db = sample_known_craft
+    worker.known_craft_index = stratuxcot.functions.index_known_craft(
+        sample_known_craft, "REG"
+    )
+    worker.conversion_pool.start(worker.known_craft_index)
+    emitter = asyncio.ensure_future(worker.emit_conversions())
+    try:
+        for i in range(10):
+            await worker.handle_data(dict(sample_craft, Alt=i * 100))
+        await worker.conversion_pool.dispatch()
+        for _ in range(500):
+            if worker.queue.qsize() >= 10:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        emitter.cancel()
+        worker.conversion_pool.close()
+
+    assert worker.metrics.counters["events"] == 10
+    events = [worker.queue.get_nowait() for _ in range(10)]
+    # In order, with the Known Craft row looked up in the workers:
+    for i, event in enumerate(events):
+        fields = stratuxcot.functions.stratux_to_cot_fields(
+            dict(sample_craft, Alt=i * 100)
+        )
+        assert f'hae="{fields["hae"]}"'.encode() in event
+        assert b"TACO_02" in event
+
+
+@pytest.mark.parametrize("version_info", [(3, 8, 0), (3, 9, 0)])
+def test_conversion_pool_close(monkeypatch, version_info):
+    monkeypatch.setattr(stratuxcot.classes.sys, "version_info", version_info)
+    pool = stratuxcot.classes.ConversionPool(1, {}, executor="thread")
+    pool.start({})
+    calls = []
+    shutdown = pool._pool.shutdown
+    monkeypatch.setattr(
+        pool._pool,
+        "shutdown",
+        lambda **kwargs: calls.append(kwargs) or shutdown(**kwargs),
+    )
+    pool.close()
+    # cancel_futures is only passed where it's supported (Python 3.9+):
+    assert calls == [
+        {"wait": False, "cancel_futures": True}
+        if version_info >= (3, 9)
+        else {"wait": False}
+    ]
+
+
+def test_deduplicator(sample_craft):
+    dedup = stratuxcot.classes.Deduplicator(window=1)
+    craft = stratuxcot.classes.TrafficRecord.from_dict(sample_craft)
+    weaker = stratuxcot.classes.TrafficRecord.from_dict(
+        dict(sample_craft, SignalLevel=-40)
+    )
+    stronger = stratuxcot.classes.TrafficRecord.from_dict(
+        dict(sample_craft, SignalLevel=-30)
+    )
+    older = stratuxcot.classes.TrafficRecord.from_dict(
+        dict(sample_craft, Timestamp="2021-05-19T23:13:17.000Z")
+    )
+
+    assert dedup.accept("A", craft, "ws://a", now=0)
+    # The same report heard by another receiver is a duplicate:
+    assert not dedup.accept("A", craft, "ws://b", now=0.1)
+    assert not dedup.accept("A", weaker, "ws://b", now=0.2)
+    # The followed receiver's reports are accepted, unless older:
+    assert dedup.accept("A", craft, "ws://a", now=0.3)
+    assert not dedup.accept("A", older, "ws://a", now=0.4)
+    # A more accurate receiver takes over:
+    assert dedup.accept("A", stronger, "ws://b", now=0.5)
+    assert not dedup.accept("A", craft, "ws://a", now=0.6)
+    # Another receiver is accepted once the followed one goes quiet:
+    assert dedup.accept("A", weaker, "ws://a", now=2)
+    assert dedup.duplicates == 4
+
+
+@pytest.mark.asyncio
+async def test_multiple_receivers(tmp_path, sample_craft):
+    servers = []
+    for receiver in ("a", "b"):
+        capture = str(tmp_path / f"{receiver}.jsonl")
+        recorder = stratuxcot.classes.TrafficRecorder(capture)
+        for i in range(5):
+            recorder.write(
+                json.dumps(dict(sample_craft, Icao_addr=i + 1)),
+                now=0,
+            )
+        recorder.close()
+        servers.append(stratuxcot.classes.ReplayServer(capture, port=0, speed=0))
+
+    for server in servers:
+        await server.start()
+    worker = make_worker(
+        STRATUX_WS=", ".join(server.url for server in servers), DEDUP_WINDOW="60"
+    )
+    worker_task = asyncio.ensure_future(worker.run())
+    try:
+        for server in servers:
+            await asyncio.wait_for(server.done.wait(), 5)
+        for _ in range(100):
+            if worker.metrics.counters["messages_received"] >= 10:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+    finally:
+        worker_task.cancel()
+        for server in servers:
+            await server.close()
+
+    received = worker.metrics.counters["messages_received"]
+    assert received >= 10
+    # Every report is either emitted or dropped as a duplicate:
+    assert worker.metrics.dropped["duplicate"] >= 5
+    assert worker.queue.qsize() + worker.metrics.dropped["duplicate"] == received
+
+
+@pytest.mark.asyncio
+async def test_tx_buffer_drop_oldest():
+    tx = stratuxcot.classes.TxBuffer(asyncio.Queue(2), "drop_oldest")
+    for event in (b"1", b"2", b"3"):
+        await tx.put(event, "A")
+    assert [tx.queue.get_nowait() for _ in range(2)] == [b"2", b"3"]
+    assert tx.metrics.counters["tx_dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_tx_buffer_coalesce():
+    tx = stratuxcot.classes.TxBuffer(asyncio.Queue(1), "coalesce")
+    await tx.put(b"A1", "A")
+    await tx.put(b"B1", "B")
+    await tx.put(b"A2", "A")
+    await tx.put(b"B2", "B")
+    await tx.put(b"batch")
+    assert len(tx) == 3
+    assert tx.metrics.counters["tx_coalesced"] == 1
+
+    pump = asyncio.ensure_future(tx.pump())
+    sent = []
+    try:
+        for _ in range(4):
+            sent.append(await asyncio.wait_for(tx.queue.get(), 1))
+    finally:
+        pump.cancel()
+    # Only the latest held back CoT Event of each craft is sent, in order:
+    assert sent == [b"A1", b"B2", b"A2", b"batch"]
+    assert not tx.pending
+
+
+@pytest.mark.asyncio
+async def test_tx_buffer_coalesce_pumping():
+    tx = stratuxcot.classes.TxBuffer(asyncio.Queue(1), "coalesce")
+    await tx.put(b"X", "X")
+    await tx.put(b"A1", "A")
+    pump = asyncio.ensure_future(tx.pump())
+    sent = []
+    try:
+        # The pump takes A1 and waits for room on the full queue:
+        await asyncio.sleep(0)
+        assert not tx.pending
+        sent.append(tx.queue.get_nowait())
+        # A newer CoT Event of the craft must not overtake the pumped one:
+        await tx.put(b"A2", "A")
+        for _ in range(2):
+            sent.append(await asyncio.wait_for(tx.queue.get(), 1))
+    finally:
+        pump.cancel()
+    assert sent == [b"X", b"A1", b"A2"]
+
+
+@pytest.mark.asyncio
+async def test_tx_buffer_coalesce_batches():
+    tx = stratuxcot.classes.TxBuffer(asyncio.Queue(2), "coalesce")
+    for i in range(6):
+        await tx.put(b"batch%d" % i)
+    # Batches can't be coalesced, so only a queue's worth is held back:
+    assert len(tx) == 2
+    assert tx.metrics.counters["tx_dropped"] == 2
+
+    pump = asyncio.ensure_future(tx.pump())
+    sent = []
+    try:
+        for _ in range(4):
+            sent.append(await asyncio.wait_for(tx.queue.get(), 1))
+    finally:
+        pump.cancel()
+    assert sent == [b"batch0", b"batch1", b"batch4", b"batch5"]
+    assert not tx.pending
+
+
+def test_geofence():
+    outer = [(-123, 37), (-122, 37), (-122, 38), (-123, 38)]
+    hole = [(-122.6, 37.4), (-122.4, 37.4), (-122.4, 37.6), (-122.6, 37.6)]
+    geofence = stratuxcot.classes.Geofence(
+        polygons=[[outer, hole]], circles=[(40, -100, 50_000)], cell=0.25
+    )
+    assert geofence.contains(37.2, -122.8)
+    assert not geofence.contains(37.5, -122.5)
+    assert not geofence.contains(36.9, -122.5)
+    assert geofence.contains(40, -100)
+    assert geofence.contains(40.4, -100)
+    assert not geofence.contains(40.5, -100)
+    # Cells well inside the circle need no test:
+    assert geofence.grid[(160, -400)] is True
+
+
+@pytest.mark.asyncio
+async def test_handle_data_geofence(sample_craft):
+    worker = make_worker(GEOFENCE_CIRCLE="37.46, -122.26, 10000")
+    worker.geofence = stratuxcot.classes.Geofence.from_config(worker.config)
+
+    await worker.handle_data(sample_craft)
+    await worker.handle_data(dict(sample_craft, Lat=38.5))
+    assert worker.queue.qsize() == 1
+    assert worker.metrics.dropped["geofence"] == 1
+
+
+@pytest.mark.asyncio
+async def test_handle_data_predicates(sample_craft):
+    worker = make_worker(ALT_MAX="10000", EXCLUDE_CATEGORIES="1")
+    await worker.handle_data(sample_craft)
+    await worker.handle_data(dict(sample_craft, Alt=12000))
+    await worker.handle_data(dict(sample_craft, Emitter_category=1))
+    assert worker.queue.qsize() == 1
+    assert worker.metrics.dropped == {"alt": 1, "category": 1}
+
+
+def test_known_craft_cache(tmp_path, monkeypatch):
+    known_craft = tmp_path / "known_craft.csv"
+    known_craft.write_text(
+        "DOMAIN,REG,CALLSIGN,HEX,TYPE,,\n"
+        "EMS,N832CS,CALSTAR7,,HELICOPTER,,\n"
+        "FED, n308du ,TACO_02,a33d68,FIXED WING,,\n"
+        "FED,N308DU,TACO_03,,FIXED WING,,\n"
+    )
+    path = str(tmp_path / "known_craft.csv.cache")
+    cache = stratuxcot.classes.KnownCraftCache.load(str(known_craft), path)
+
+    assert len(cache) == 3
+    assert cache.columns == ("DOMAIN", "REG", "CALLSIGN", "HEX", "TYPE")
+    index = cache.index("REG")
+    assert len(index) == 2
+    # Keys are normalized, and the first row of a key wins:
+    assert index.get("N308DU")["CALLSIGN"] == "TACO_02"
+    assert cache.index("HEX")["A33D68"] is index["N308DU"]
+    assert index.get("N12345") is None
+    assert "N832CS" in index
+    with pytest.raises(ValueError):
+        cache.index("ICAO")
+
+    unpickled = pickle.loads(pickle.dumps(index))
+    assert unpickled.get("N832CS") == index.get("N832CS")
+
+    # An unchanged CSV isn't recompiled, a changed one is:
+    monkeypatch.setattr(aircot, "read_known_craft", None)
+    assert stratuxcot.classes.KnownCraftCache.load(str(known_craft), path)
+    monkeypatch.undo()
+    known_craft.write_text("REG,CALLSIGN\nN481DF,C_104\n")
+    cache = stratuxcot.classes.KnownCraftCache.load(str(known_craft), path)
+    assert list(cache) == [{"REG": "N481DF", "CALLSIGN": "C_104"}]
+
+    assert stratuxcot.functions.compile_known_craft(EXAMPLE_KNOWN_CRAFT, path) == 6
+    cache = stratuxcot.classes.KnownCraftCache(path)
+    assert cache.index("REG")["N832CS"]["CALLSIGN"] == "CALSTAR7"
+
+
+@pytest.mark.asyncio
+async def test_handle_data_known_craft_cache(tmp_path, sample_craft):
+    known_craft = tmp_path / "known_craft.csv"
+    known_craft.write_text("REG,CALLSIGN,COT\nN308DU,TACO_02,a-f-A-T-A-C-O\n")
+
+    worker = make_worker(
+        KNOWN_CRAFT_KEY="REG",
+        KNOWN_CRAFT_CACHE=str(tmp_path / "known_craft.cache"),
+        INCLUDE_ALL_CRAFT="False",
+    )
+    worker.known_craft_db, worker.known_craft_index = worker.load_known_craft(
+        str(known_craft)
+    )
+    await worker.handle_data(sample_craft)
+    await worker.handle_data(dict(sample_craft, Reg="N12345"))
+    assert worker.queue.qsize() == 1
+    assert b"TACO_02" in worker.queue.get_nowait()
+
+
+@pytest.mark.asyncio
+async def test_emit_snapshot_extrapolated(sample_craft):
+    worker = make_worker(
+        EMIT_MODE="snapshot", EXTRAPOLATE="True", EXTRAPOLATE_HORIZON="30"
+    )
+    craft = stratuxcot.classes.TrafficRecord.from_dict(dict(sample_craft, Age=0))
+    worker.aircraft.update(craft.icao, craft, now=100)
+
+    await worker.emit_snapshot(now=110)
+    event = worker.queue.get_nowait()
+    assert b'extrapolated="10.0"' in event
+    assert b'lat="37.46306"' not in event
+
+    # Past the horizon, the last known position is sent:
+    await worker.emit_snapshot(now=140)
+    event = worker.queue.get_nowait()
+    assert b"extrapolated" not in event
+    assert b'lat="37.46306"' in event
+    assert worker.metrics.counters["extrapolated"] == 1
+
+
+def test_backoff(monkeypatch):
+    monkeypatch.setattr(stratuxcot.classes.random, "uniform", lambda a, b: b)
+    backoff = stratuxcot.classes.Backoff(0.5, 4)
+    assert [backoff.delay() for _ in range(6)] == [0.5, 1, 2, 4, 4, 4]
+    backoff.reset()
+    assert backoff.delay() == 0.5
+
+
+@pytest.mark.asyncio
+async def test_receive_reconnects(tmp_path, sample_craft):
+    capture = str(tmp_path / "capture.jsonl")
+    recorder = stratuxcot.classes.TrafficRecorder(capture)
+    recorder.write(json.dumps(sample_craft), now=0)
+    recorder.close()
+
+    # Find a free port, and start the worker before anything listens on it:
+    server = stratuxcot.classes.ReplayServer(capture, port=0, speed=0)
+    await server.start()
+    await server.close()
+    worker = make_worker(
+        STRATUX_WS=server.url, WS_BACKOFF_MIN="0.01", WS_BACKOFF_MAX="0.05"
+    )
+    worker_task = asyncio.ensure_future(worker.run())
+    try:
+        for _ in range(100):
+            if worker.metrics.counters["reconnects"] >= 2:
+                break
+            await asyncio.sleep(0.01)
+        await server.start()
+        for _ in range(200):
+            if worker.metrics.counters["messages_received"]:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+        await server.close()
+
+    assert worker.metrics.counters["reconnects"] >= 2
+    assert worker.metrics.counters["messages_received"] >= 1
+    assert worker._recovery_time.count == 1
+
+
+@pytest.mark.asyncio
+async def test_receive_idle_timeout():
+    import websockets  # pylint: disable=import-outside-toplevel
+
+    async def silent(websocket):
+        await asyncio.sleep(60)
+
+    server = await websockets.serve(silent, "127.0.0.1", 0)
+    port = list(server.sockets)[0].getsockname()[1]
+    worker = make_worker(
+        STRATUX_WS=f"ws://127.0.0.1:{port}/traffic", WS_IDLE_TIMEOUT="0.05"
+    )
+    worker_task = asyncio.ensure_future(worker.run())
+    try:
+        for _ in range(200):
+            if worker.metrics.counters["idle_timeouts"] >= 2:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+        server.close()
+
+    assert worker.metrics.counters["idle_timeouts"] >= 2
+    assert worker.metrics.counters["reconnects"] >= 2
+    assert worker._connect_time.count >= 2
+
+
+@pytest.mark.asyncio
+async def test_receive_invalid_message(sample_craft):
+    import websockets  # pylint: disable=import-outside-toplevel
+
+    async def truncated(websocket):
+        await websocket.send('{"Icao_addr":10698088,"Lat":')
+        await websocket.send(json.dumps(sample_craft))
+        await asyncio.sleep(60)
+
+    server = await websockets.serve(truncated, "127.0.0.1", 0)
+    port = list(server.sockets)[0].getsockname()[1]
+    worker = make_worker(STRATUX_WS=f"ws://127.0.0.1:{port}/traffic")
+    worker_task = asyncio.ensure_future(worker.run())
+    try:
+        for _ in range(200):
+            if worker.queue.qsize():
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+        server.close()
+
+    # The bad message is dropped, and the worker carries on with the next one:
+    assert worker.metrics.dropped["invalid"] == 1
+    assert worker.metrics.counters["reconnects"] == 0
+    assert b"ICAO-A33D68" in worker.queue.get_nowait()
+
+
+@pytest.mark.asyncio
+async def test_gdl90_worker(sample_craft):
+    import socket  # pylint: disable=import-outside-toplevel
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    worker = stratuxcot.classes.GDL90Worker(
+        asyncio.Queue(), {"STRATUX_GDL90": f"127.0.0.1:{port}"}
+    )
+    worker_task = asyncio.ensure_future(worker.run())
+    frames = [
+        stratuxcot.functions.gdl90_frame(bytes.fromhex("008141dbd00802")),
+        *(
+            stratuxcot.functions.gdl90_frame(
+                stratuxcot.functions.traffic_record_to_gdl90(
+                    stratuxcot.classes.TrafficRecord.from_dict(
+                        dict(sample_craft, Icao_addr=0xA00001 + i)
+                    )
+                )
+            )
+            for i in range(3)
+        ),
+    ]
+    try:
+        for _ in range(100):
+            if worker.connected:
+                break
+            await asyncio.sleep(0.01)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            # Several frames per datagram, like Stratux:
+            sock.sendto(b"".join(frames[:2]), ("127.0.0.1", port))
+            sock.sendto(b"".join(frames[2:]), ("127.0.0.1", port))
+            sock.sendto(b"\x7e\x14\x00\x7e", ("127.0.0.1", port))
+        for _ in range(100):
+            if worker.queue.qsize() >= 3 and worker.metrics.dropped["crc"]:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+
+    assert worker.queue.qsize() == 3
+    assert worker.metrics.dropped["precheck"] == 1
+    assert worker.metrics.dropped["crc"] == 1
+    event = worker.queue.get_nowait()
+    assert b'uid="ICAO-A00001"' in event
+
+
+@pytest.mark.asyncio
+async def test_track_store(tmp_path, sample_craft):
+    path = str(tmp_path / "tracks.db")
+    now = time.time()
+    store = stratuxcot.classes.TrackStore(path, retention=60, max_pending=3)
+    await store.open()
+    for i, (icao_addr, lat) in enumerate(((1, 10.0), (1, 11.0), (2, 20.0), (2, 21.0))):
+        craft = stratuxcot.classes.TrafficRecord.from_dict(
+            dict(sample_craft, Icao_addr=icao_addr, Lat=lat)
+        )
+        store.add(craft.icao, craft, now=now - 100 + i)
+    assert len(store) == 3 and store.dropped == 1
+    assert await store.flush(now=now - 90) == 3
+
+    latest = {icao: craft.lat for icao, _, craft in await store.latest(0)}
+    assert latest == {"1": 11.0, "2": 20.0}
+    history = await store.history("1")
+    assert [received for received, _ in history] == [now - 100, now - 99]
+    assert await store.latest(now - 97) == []
+
+    # Reports older than the retention are evicted on flush:
+    store.add("2", craft, now=now - 2)
+    await store.flush(now=now - 2)
+    assert [icao for icao, _, _ in await store.latest(0)] == ["2"]
+    store.add("2", craft, now=now - 1)
+    store.close()
+
+    store = stratuxcot.classes.TrackStore(path)
+    await store.open()
+    assert [received for received, _ in await store.history("2")] == [now - 2, now - 1]
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_worker_track_store(tmp_path, sample_craft):
+    path = str(tmp_path / "tracks.db")
+    worker = make_worker(TRACK_STORE=path)
+    await worker.track_store.open()
+    await worker.handle_data(sample_craft)
+    await worker.handle_data(dict(sample_craft, Icao_addr=1234))
+    assert worker.queue.qsize() == 2
+    old = stratuxcot.classes.TrafficRecord.from_dict(dict(sample_craft, Icao_addr=1))
+    worker.track_store.add(old.icao, old, now=time.time() - 45)
+    worker.track_store.close()
+
+    # A restarted worker restores its aircraft table, and replays the latest
+    # position of each craft that isn't stale yet:
+    worker = make_worker(TRACK_STORE=path, EMIT_MODE="snapshot", COT_STALE="30")
+    await worker.track_store.open()
+    assert await worker.warm_aircraft() == 3
+    assert sorted(icao for icao, _ in worker.aircraft.items()) == [
+        "1",
+        "4D2",
+        "A33D68",
+    ]
+    assert worker.aircraft.age("A33D68") < sample_craft["Age"] + 5
+
+    assert await worker.replay_latest() == 2
+    assert worker.queue.qsize() == 2
+    assert b"ICAO-1" not in worker.queue.get_nowait() + worker.queue.get_nowait()
+    assert worker.metrics.counters["replayed"] == 2
+    worker.track_store.close()
+
+    # Outside of snapshot mode, there's no aircraft table to restore:
+    worker = make_worker(
+        STRATUX_WS="ws://127.0.0.1:1/traffic",
+        TRACK_STORE=path,
+        TRACK_STORE_REPLAY="False",
+    )
+    worker_task = asyncio.ensure_future(worker.run())
+    try:
+        for _ in range(100):
+            if worker.metrics.counters["reconnects"]:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+    assert worker.metrics.counters["reconnects"]
+    assert len(worker.aircraft) == 0
@@ -21,12 +21,17 @@
 import asyncio
 import csv
 import io
+import json
+import struct
+import subprocess
+import sys
 import urllib
 import xml.etree.ElementTree as ET
 
 import pytest
 
 import stratuxcot
+import stratuxcot.classes
 import stratuxcot.functions
 
 
@@ -195,6 +200,20 @@ FOOD,EL FAROLITO,DAL1352,TACO_02,FIXED WING,,,a-f-A-T-A-C-O,FIXED WING,,
     return all_rows
 
 
+def test_lazy_import():
+    """Importing the package doesn't load aircot or websockets."""
+    code = (
+        "import sys, stratuxcot; "
+        "print(sorted(m for m in ('aircot', 'websockets') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    )
+    assert result.stdout.strip() == "[]"
+    assert stratuxcot.create_tasks is stratuxcot.functions.create_tasks
+    assert stratuxcot.TrafficRecord is stratuxcot.classes.TrafficRecord
+
+
 def test_stratux_to_cot_xml(sample_craft):
     print(sample_craft)
     cot = stratuxcot.functions.stratux_to_cot_xml(sample_craft)
@@ -271,3 +290,406 @@ def test_negative_stratux_to_cot():
     sample_craft = {"taco": "burrito"}
     cot = stratuxcot.stratux_to_cot(sample_craft)
     assert cot == None
+
+
+def test_index_known_craft(sample_known_craft):
+    index = stratuxcot.functions.index_known_craft(sample_known_craft, "REG")
+    assert index["DAL1352"]["CALLSIGN"] == "TACO_02"
+    assert index["N481DF"]["AGENCY"] == "CAL FIRE"
+    assert len(index) == len(sample_known_craft)
+
+    # Rows with an empty key column aren't indexed:
+    assert stratuxcot.functions.index_known_craft(sample_known_craft, "HEX") == {}
+
+    # As read by aircot 4, with its own indexes:
+    known_craft_db = {"rows": sample_known_craft, "hex_index": {}, "reg_index": {}}
+    assert stratuxcot.functions.index_known_craft(known_craft_db, "REG") == index
+
+
+def test_get_craft_key(sample_craft):
+    sample_craft = stratuxcot.classes.TrafficRecord.from_dict(sample_craft)
+    assert stratuxcot.functions.get_craft_key(sample_craft, "A33D68") == "A33D68"
+    assert stratuxcot.functions.get_craft_key(sample_craft, "A33D68", "REG") == "N308DU"
+    assert (
+        stratuxcot.functions.get_craft_key(sample_craft, "A33D68", "FLIGHT")
+        == "DAL1352"
+    )
+    assert (
+        stratuxcot.functions.get_craft_key(
+            stratuxcot.classes.TrafficRecord(), "A33D68", "REG"
+        )
+        == ""
+    )
+
+
+def test_read_filter_config(tmp_path):
+    filter_config = tmp_path / "filters.ini"
+    filter_config.write_text(
+        "[HEX]\ninclude = aaf617, A1C1A0 A2A3AF\n\n"
+        "[REG]\nexclude = N123PD, N9*\n\n"
+        "[FLIGHT]\ninclude =\n"
+    )
+    filters = stratuxcot.functions.read_filter_config(str(filter_config))
+    assert [craft_filter.key for craft_filter in filters] == ["HEX", "REG"]
+
+    hex_filter, reg_filter = filters
+    assert hex_filter.include == frozenset(["AAF617", "A1C1A0", "A2A3AF"])
+    assert hex_filter.allows("AAF617")
+    assert not hex_filter.allows("A33D68")
+    assert not hex_filter.allows("")
+
+    assert reg_filter.allows("N308DU")
+    assert not reg_filter.allows("N123PD")
+    assert not reg_filter.allows("N912AB")
+
+
+def test_read_filter_config_unknown_section(tmp_path):
+    filter_config = tmp_path / "filters.ini"
+    filter_config.write_text("[TACO]\ninclude = burrito\n")
+    with pytest.raises(ValueError):
+        stratuxcot.functions.read_filter_config(str(filter_config))
+
+
+@pytest.mark.parametrize(
+    "overrides,known_craft",
+    [
+        ({}, None),
+        ({"OnGround": True, "TargetType": 4, "Squawk": 0}, None),
+        ({"Tail": ' A&B<"C>\t', "Reg": "Néñ\n"}, {"ICON": "x/y&z.png"}),
+        ({"Tail": "", "Reg": "", "TargetType": 0}, {"CALLSIGN": "TACO_02"}),
+    ],
+)
+def test_stratux_to_cot_matches_xml(sample_craft, monkeypatch, overrides, known_craft):
+    monkeypatch.setattr(
+        stratuxcot.functions.pytak,
+        "cot_time",
+        lambda cot_stale=None: f"2022-01-01T00:00:{cot_stale or 0:02d}.000000Z",
+    )
+    craft = dict(sample_craft, **overrides)
+    config = {"COT_STALE": "30", "COT_HOST_ID": "stratuxcot&co"}
+
+    cot_xml = stratuxcot.functions.stratux_to_cot_xml(craft, config, known_craft)
+    cot = stratuxcot.functions.stratux_to_cot(craft, config, known_craft)
+
+    assert cot == b"\n".join(
+        [stratuxcot.functions.pytak.DEFAULT_XML_DECLARATION, ET.tostring(cot_xml)]
+    )
+    assert ET.fromstring(cot.split(b"\n", 1)[1]).attrib == cot_xml.attrib
+
+
+def test_dead_reckon():
+    # One minute north at 60 knots is one nautical mile, 1852 meters:
+    lat, lon = stratuxcot.functions.dead_reckon(37.0, -122.0, 0, 60, 60)
+    assert lat == pytest.approx(37.0 + 1852 / 111_319.49, rel=1e-4)
+    assert lon == pytest.approx(-122.0)
+
+    lat, lon = stratuxcot.functions.dead_reckon(0.0, 179.99, 90, 600, 60)
+    assert lat == pytest.approx(0.0)
+    assert -180 < lon < -179.8
+
+
+def test_stratux_to_cot_extrapolated(sample_craft, monkeypatch):
+    monkeypatch.setattr(
+        stratuxcot.functions.pytak,
+        "cot_time",
+        lambda cot_stale=None: f"2022-01-01T00:00:{cot_stale or 0:02d}.000000Z",
+    )
+    craft = stratuxcot.classes.TrafficRecord.from_dict(sample_craft).extrapolate(10)
+    assert craft.extrapolated == 10
+    assert craft.alt == sample_craft["Alt"] - 267
+
+    cot_xml = stratuxcot.functions.stratux_to_cot_xml(craft)
+    cot = stratuxcot.functions.stratux_to_cot(craft)
+    assert cot_xml.find("_aircot_").attrib["extrapolated"] == "10.0"
+    assert cot.endswith(ET.tostring(cot_xml))
+    assert float(cot_xml.find("point").attrib["lat"]) < sample_craft["Lat"]
+
+
+def test_stratux_to_cot_negative_fields():
+    assert stratuxcot.functions.stratux_to_cot_fields({"taco": "burrito"}) is None
+    assert stratuxcot.functions.stratux_to_cot({"taco": "burrito"}) is None
+
+
+@pytest.mark.parametrize("decoder", ["auto", "json"])
+def test_get_json_decoder(sample_craft, decoder):
+    message = json.dumps(sample_craft, separators=(",", ":"))
+    decode = stratuxcot.functions.get_json_decoder(decoder)
+    assert decode(message) == sample_craft
+    assert decode(message.encode()) == sample_craft
+
+
+def test_get_json_decoder_unknown():
+    with pytest.raises(ValueError):
+        stratuxcot.functions.get_json_decoder("taco")
+
+
+def test_is_wanted_message(sample_craft):
+    message = json.dumps(sample_craft, separators=(",", ":"))
+    assert stratuxcot.functions.is_wanted_message(message)
+    assert stratuxcot.functions.is_wanted_message(message.encode())
+
+    no_position = message.replace('"Position_valid":true', '"Position_valid":false')
+    assert not stratuxcot.functions.is_wanted_message(no_position)
+    assert not stratuxcot.functions.is_wanted_message(no_position.encode())
+
+    no_icao = message.replace('"Icao_addr":10698088', '"Icao_addr":0')
+    assert not stratuxcot.functions.is_wanted_message(no_icao)
+
+
+def test_read_geofence(tmp_path):
+    square = [[-123, 37], [-122, 37], [-122, 38], [-123, 38], [-123, 37]]
+    geojson = tmp_path / "fence.geojson"
+    geojson.write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {
+                        "type": "Feature",
+                        "geometry": {"type": "Polygon", "coordinates": [square]},
+                    },
+                    {
+                        "type": "Feature",
+                        "geometry": {"type": "Point", "coordinates": [0, 0]},
+                    },
+                ],
+            }
+        )
+    )
+    assert stratuxcot.functions.read_geofence(str(geojson)) == [
+        [[tuple(point) for point in square]]
+    ]
+
+    kml = tmp_path / "fence.kml"
+    kml.write_text(
+        '<kml xmlns="http://www.opengis.net/kml/2.2"><Placemark><Polygon>'
+        "<outerBoundaryIs><LinearRing><coordinates>"
+        "-123,37,0 -122,37,0 -122,38,0 -123,38,0 -123,37,0"
+        "</coordinates></LinearRing></outerBoundaryIs>"
+        "</Polygon></Placemark></kml>"
+    )
+    assert stratuxcot.functions.read_geofence(str(kml)) == [
+        [[tuple(float(value) for value in point) for point in square]]
+    ]
+
+
+def test_read_geofence_circles():
+    assert stratuxcot.functions.read_geofence_circles(
+        "37.46, -122.26, 20000; 38.1,-122.5,5000;"
+    ) == [(37.46, -122.26, 20000), (38.1, -122.5, 5000)]
+    with pytest.raises(ValueError):
+        stratuxcot.functions.read_geofence_circles("37.46, -122.26")
+
+
+def test_compile_craft_predicates(sample_craft):
+    craft = stratuxcot.classes.TrafficRecord.from_dict(sample_craft)
+    assert stratuxcot.functions.compile_craft_predicates({}) == []
+
+    predicates = dict(
+        stratuxcot.functions.compile_craft_predicates(
+            {
+                "ALT_MIN": "500",
+                "ALT_MAX": "7000",
+                "NACP_MIN": "8",
+                "INCLUDE_GROUND": "False",
+                "EXCLUDE_CATEGORIES": "10, 14",
+                "MAX_AGE": "10",
+            }
+        )
+    )
+    assert sorted(predicates) == [
+        "alt",
+        "category",
+        "max_age",
+        "nacp",
+        "on_ground",
+    ]
+    assert not predicates["alt"](craft)
+    assert predicates["alt"](
+        stratuxcot.classes.TrafficRecord.from_dict(dict(sample_craft, Alt=6000))
+    )
+    assert predicates["nacp"](craft)
+    assert predicates["on_ground"](craft)
+    assert predicates["category"](craft)
+    assert not predicates["max_age"](craft)
+
+
+def decode_protobuf(data: bytes) -> dict:
+    """Decodes a protobuf message into {field: [values]}, without a schema."""
+    fields: dict = {}
+    pos = 0
+    while pos < len(data):
+        key, pos = decode_varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = decode_varint(data, pos)
+        elif wire_type == 1:
+            value = struct.unpack_from("<d", data, pos)[0]
+            pos += 8
+        elif wire_type == 2:
+            length, pos = decode_varint(data, pos)
+            value = data[pos : pos + length]
+            pos += length
+        else:
+            raise ValueError(f"Unexpected wire type: {wire_type}")
+        fields.setdefault(field, []).append(value)
+    return fields
+
+
+def decode_varint(data: bytes, pos: int) -> tuple:
+    value = shift = 0
+    while 1:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+@pytest.mark.parametrize("cot_format", ["takproto-mesh", "takproto-stream"])
+def test_stratux_to_cot_takproto(sample_craft, monkeypatch, cot_format):
+    monkeypatch.setattr(
+        stratuxcot.functions.pytak,
+        "cot_time",
+        lambda cot_stale=None: f"2022-01-01T00:00:{cot_stale or 0:02d}.250000Z",
+    )
+    craft = stratuxcot.classes.TrafficRecord.from_dict(sample_craft).extrapolate(1)
+    config = {"COT_STALE": "30", "COT_HOST_ID": "stratuxcot&co"}
+
+    cot_xml = stratuxcot.functions.stratux_to_cot_xml(craft, config)
+    cot = stratuxcot.functions.stratux_to_cot(
+        craft, dict(config, COT_FORMAT=cot_format)
+    )
+
+    if cot_format == "takproto-mesh":
+        assert cot[:3] == b"\xbf\x01\xbf"
+        message = cot[3:]
+    else:
+        assert cot[:1] == b"\xbf"
+        length, pos = decode_varint(cot, 1)
+        message = cot[pos:]
+        assert len(message) == length
+    assert len(cot) < len(ET.tostring(cot_xml))
+
+    event = decode_protobuf(decode_protobuf(message)[2][0])
+    assert event[1][0].decode() == cot_xml.attrib["type"]
+    assert event[5][0].decode() == cot_xml.attrib["uid"]
+    assert event[9][0] == b"m-g"
+    assert event[6] == event[7] == [1640995200250]
+    assert event[8] == [1640995230250]
+
+    point = cot_xml.find("point").attrib
+    for field, name in ((10, "lat"), (11, "lon"), (12, "hae"), (13, "ce"), (14, "le")):
+        assert event[field] == [float(point[name])]
+
+    detail = decode_protobuf(event[15][0])
+    contact = decode_protobuf(detail[2][0])
+    assert contact[2][0].decode() == cot_xml.find("detail/contact").attrib["callsign"]
+    track = decode_protobuf(detail[7][0])
+    assert track[1] == [float(cot_xml.find("detail/track").attrib["speed"])]
+    assert track[2] == [float(cot_xml.find("detail/track").attrib["course"])]
+
+    xml_detail = ET.fromstring(b"<detail>" + detail[1][0] + b"</detail>")
+    assert xml_detail.find("remarks").text == cot_xml.find("detail/remarks").text
+    assert xml_detail.find("UID").attrib == cot_xml.find("detail/UID").attrib
+    assert xml_detail.find("_aircot_").attrib == cot_xml.find("_aircot_").attrib
+
+
+def test_stratux_to_cot_unknown_format(sample_craft):
+    with pytest.raises(ValueError):
+        stratuxcot.functions.stratux_to_cot(sample_craft, {"COT_FORMAT": "json"})
+
+
+def test_gdl90_frame():
+    # Heartbeat example of the GDL90 ICD:
+    heartbeat = bytes.fromhex("008141dbd00802")
+    assert stratuxcot.functions.gdl90_crc(heartbeat) == 0x8BB3
+    frame = stratuxcot.functions.gdl90_frame(heartbeat)
+    assert frame == bytes.fromhex("7e008141dbd00802b38b7e")
+    assert list(stratuxcot.functions.gdl90_messages(frame)) == [heartbeat]
+
+    corrupt = frame[:3] + b"\x00" + frame[4:]
+    assert list(stratuxcot.functions.gdl90_messages(corrupt + frame)) == [
+        None,
+        heartbeat,
+    ]
+
+
+def test_gdl90_traffic_report(sample_craft):
+    # An address with flag & control-escape bytes, to be escaped:
+    craft = stratuxcot.classes.TrafficRecord.from_dict(
+        dict(sample_craft, Icao_addr=0x7E7D01)
+    )
+    message = stratuxcot.functions.traffic_record_to_gdl90(craft)
+    frame = stratuxcot.functions.gdl90_frame(message)
+    assert len(frame) > len(message) + 4
+    assert frame.count(b"\x7e") == 2
+
+    (unframed,) = stratuxcot.functions.gdl90_messages(frame)
+    assert unframed == message
+    record = stratuxcot.functions.gdl90_to_traffic_record(unframed)
+    assert record.icao == "7E7D01"
+    assert record.tail == "DAL1352"
+    assert record.lat == pytest.approx(sample_craft["Lat"], abs=1e-4)
+    assert record.lon == pytest.approx(sample_craft["Lng"], abs=1e-4)
+    assert record.alt == 7325
+    assert record.speed == 262
+    assert record.vvel == -1600
+    assert record.track == pytest.approx(135, abs=1)
+    assert record.nacp == 10
+    assert record.target_type == 1
+    assert record.emitter_category == 3
+    assert not record.on_ground
+    assert record.position_valid
+
+    cot_xml = stratuxcot.functions.stratux_to_cot_xml(record)
+    assert cot_xml.attrib["uid"] == "ICAO-7E7D01"
+
+    assert stratuxcot.functions.gdl90_to_traffic_record(bytes(28)) is None
+
+
+def test_stratux_to_cot_batch(sample_craft, monkeypatch):
+    pytest.importorskip("numpy", minversion="2")
+    monkeypatch.setattr(
+        stratuxcot.functions.pytak,
+        "cot_time",
+        lambda cot_stale=None: f"2022-01-01T00:00:{cot_stale or 0:02d}.000000Z",
+    )
+    craft = dict(sample_craft, Track=135.0)
+    crafts = [
+        craft,
+        dict(craft, Lat=None),
+        dict(craft, OnGround=True, Icao_addr=0x00AB12, Tail="A&B <1>"),
+        dict(craft, Alt=None, Speed=0, Track=None, NACp=None),
+        dict(craft, Icao_addr=0, Tail="", Reg=""),
+        {"Lat": 1.0, "Lng": 2.0, "Icao_addr": 1},
+        craft,
+    ]
+    config = {"COT_STALE": "30", "COT_HOST_ID": "stratuxcot&co"}
+    events = stratuxcot.functions.stratux_to_cot_batch(
+        crafts + [dict(craft, Position_valid=False), dict(craft, Icao_addr=0)], config
+    )
+    assert events[: len(crafts)] == [
+        stratuxcot.functions.stratux_to_cot(craft, config) for craft in crafts
+    ]
+    assert events[1] is None and events[4] is None
+    # Skipped, as StratuxWorker does:
+    assert events[len(crafts) :] == [None, None]
+
+
+def test_stratux_to_cot_batch_times(sample_craft):
+    pytest.importorskip("numpy", minversion="2")
+    events = stratuxcot.functions.stratux_to_cot_batch(
+        [sample_craft, sample_craft], {"COT_STALE": "90"}, times=[1640995200.25, 0]
+    )
+    event = ET.fromstring(events[0].split(b"\n", 1)[1])
+    assert event.attrib["time"] == "2022-01-01T00:00:00.250000Z"
+    assert event.attrib["start"] == "2022-01-01T00:00:00.250000Z"
+    assert event.attrib["stale"] == "2022-01-01T00:01:30.250000Z"
+    assert b'time="1970-01-01T00:00:00.000000Z"' in events[1]
+
+    with pytest.raises(ValueError):
+        stratuxcot.functions.stratux_to_cot_batch(
+            [sample_craft], {"COT_FORMAT": "takproto-mesh"}
+        )